@@ -2,19 +2,33 @@ import streamlit as st
 import pandas as pd
 from pydrive2.auth import GoogleAuth
 from pydrive2.drive import GoogleDrive
-import io, os, datetime, tempfile, re, json, time, uuid, html
+import io, os, datetime, tempfile, re, json, time, uuid, html, hashlib, threading, heapq, difflib, unicodedata, mimetypes
+from collections import Counter, defaultdict
+from contextlib import contextmanager, nullcontext
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import numpy as np
 import smtplib
 from email.message import EmailMessage
 from email.utils import make_msgid
 import streamlit.components.v1 as components
-import matplotlib.pyplot as plt
 
 st.set_page_config(page_title="ŞEKEROĞLU İHRACAT CRM", layout="wide")
 
 EMBED_IMAGES = True
 
-CURRENCY_SYMBOLS = ["USD", "$", "€", "EUR", "₺", "TL", "tl", "Tl"]
+# Sembol/kod → ISO kodu; hem tutar ayrıştırma (sembol silme) hem para birimi tespiti buradan beslenir.
+PARA_BIRIMI_KODLARI = {
+    "EUR": "EUR", "EURO": "EUR", "€": "EUR",
+    "TL": "TRY", "TRY": "TRY", "₺": "TRY",
+    "RUB": "RUB", "RUBLE": "RUB", "₽": "RUB",
+    "USD": "USD", "$": "USD", "DOLAR": "USD",
+}
+
+# Uzun olan önce: "EURO" → "EUR"+"O", "RUBLE" → "RUB"+"LE" artığı kalmasın.
+CURRENCY_SYMBOLS = sorted(PARA_BIRIMI_KODLARI, key=len, reverse=True)
+_CURRENCY_PATTERN = re.compile(
+    "|".join(re.escape(symbol) for symbol in CURRENCY_SYMBOLS), re.IGNORECASE
+)
 
 ETA_COLUMNS = ["Müşteri Adı", "Proforma No", "Sevk Tarihi", "ETA Tarihi", "Açıklama"]
 
@@ -63,9 +77,7 @@ def smart_to_num(value):
     if pd.isna(value):
         return 0.0
 
-    sanitized = str(value).strip()
-    for symbol in CURRENCY_SYMBOLS:
-        sanitized = sanitized.replace(symbol, "")
+    sanitized = _CURRENCY_PATTERN.sub("", str(value).strip())
 
     sanitized = sanitized.replace("\u00A0", "").replace(" ", "")
 
@@ -83,16 +95,557 @@ def smart_to_num(value):
     return 0.0
 
 
-def güvenli_sil(path, tekrar=5, bekle=1):
-    for _ in range(tekrar):
-        try:
-            os.remove(path)
-            return True
-        except PermissionError:
-            time.sleep(bekle)
-        except FileNotFoundError:
-            return True
-    return False
+def smart_to_num_series(values) -> pd.Series:
+    """smart_to_num'un vektörel karşılığı; satır satır apply yerine kullanılır."""
+    seri = values if isinstance(values, pd.Series) else pd.Series(values, dtype=object)
+    if pd.api.types.is_numeric_dtype(seri) and not pd.api.types.is_bool_dtype(seri):
+        return pd.to_numeric(seri, errors="coerce").astype(float).fillna(0.0)
+
+    bos = seri.isna()
+    metin = (
+        seri.astype(str)
+        .str.strip()
+        .str.replace(_CURRENCY_PATTERN, "", regex=True)
+        .str.replace("\u00A0", "", regex=False)
+        .str.replace(" ", "", regex=False)
+    )
+    sonuc = pd.to_numeric(metin, errors="coerce")
+
+    virgullu = sonuc.isna() & metin.str.contains(",", regex=False)
+    if virgullu.any():
+        duzeltilmis = pd.to_numeric(
+            metin[virgullu].str.replace(".", "", regex=False).str.replace(",", ".", regex=False),
+            errors="coerce",
+        )
+        sonuc = sonuc.where(~virgullu, duzeltilmis)
+
+    return sonuc.where(~bos, 0.0).fillna(0.0).astype(float)
+
+
+# Excel içeriğinin özeti; önbellekler bu anahtarla geçersiz kılınır.
+DATA_VERSION = ""
+
+
+def _set_data_version(raw_bytes: bytes):
+    global DATA_VERSION
+    DATA_VERSION = hashlib.md5(raw_bytes or b"").hexdigest()
+
+
+# ---- Para birimi / kur katmanı ----
+# Kurlar sayfası: 1 birim "Para Birimi" = "Kur" × RAPOR_PARA_BIRIMI (tarih bazlı).
+RAPOR_PARA_BIRIMI = "USD"
+KUR_KOLONLARI = ["Tarih", "Para Birimi", "Kur"]
+df_kurlar = pd.DataFrame(columns=KUR_KOLONLARI)
+
+# Tutar metni içindeki sembol/kod; harf komşuluğu olmayan eşleşmeler ("1000TL" dahil)
+def _para_sembol_deseni(semboller) -> str:
+    parcalar = []
+    for sembol in sorted(semboller, key=len, reverse=True):
+        if sembol.isalpha():
+            parcalar.append(rf"(?<![A-Za-z]){re.escape(sembol)}(?![A-Za-z])")
+        else:
+            parcalar.append(re.escape(sembol))
+    return "|".join(parcalar)
+
+
+_PARA_SEMBOL_DESENLERI = [
+    (kod, _para_sembol_deseni([s for s, k in PARA_BIRIMI_KODLARI.items() if k == kod]))
+    for kod in dict.fromkeys(PARA_BIRIMI_KODLARI.values())
+]
+
+
+def normalize_currency_codes(values) -> pd.Series:
+    seri = values if isinstance(values, pd.Series) else pd.Series(values, dtype=object)
+    metin = seri.astype(object).where(seri.notna(), "").astype(str).str.strip().str.upper()
+    return metin.map(PARA_BIRIMI_KODLARI)
+
+
+def detect_currency_series(tutar: pd.Series, mevcut=None, musteri_para=None,
+                           varsayilan: str = RAPOR_PARA_BIRIMI) -> pd.Series:
+    """Para birimini sırasıyla tutar metnindeki sembolden, satırdaki Para Birimi'nden,
+    müşterinin Para Birimi'nden belirler; hiçbiri yoksa varsayılanı kullanır."""
+    metin = tutar.astype(object).where(tutar.notna(), "").astype(str)
+    sonuc = pd.Series(np.nan, index=tutar.index, dtype=object)
+    for kod, desen in _PARA_SEMBOL_DESENLERI:
+        bulunan = metin.str.contains(desen, regex=True, flags=re.IGNORECASE)
+        sonuc = sonuc.where(sonuc.notna() | ~bulunan, kod)
+    for yedek in (mevcut, musteri_para):
+        if yedek is not None:
+            sonuc = sonuc.fillna(normalize_currency_codes(yedek))
+    return sonuc.fillna(varsayilan)
+
+
+def ensure_currency_column(df: pd.DataFrame, df_musteri: pd.DataFrame) -> pd.DataFrame:
+    """Tutar kolonu olan tabloya tespit edilen 'Para Birimi' kolonunu yazar."""
+    if not isinstance(df, pd.DataFrame) or "Tutar" not in df.columns:
+        return df
+    musteri_para = None
+    if (
+        isinstance(df_musteri, pd.DataFrame)
+        and {"Müşteri Adı", "Para Birimi"}.issubset(df_musteri.columns)
+        and "Müşteri Adı" in df.columns
+    ):
+        kart = (
+            df_musteri.assign(_ad=df_musteri["Müşteri Adı"].astype(str).str.strip())
+            .drop_duplicates("_ad")
+            .set_index("_ad")["Para Birimi"]
+        )
+        musteri_para = df["Müşteri Adı"].astype(str).str.strip().map(kart)
+    df["Para Birimi"] = detect_currency_series(df["Tutar"], df.get("Para Birimi"), musteri_para)
+    return df
+
+
+def _kur_tablosu(kurlar: pd.DataFrame) -> pd.DataFrame:
+    if not isinstance(kurlar, pd.DataFrame) or kurlar.empty:
+        return pd.DataFrame(columns=KUR_KOLONLARI)
+    kurlar = kurlar.reindex(columns=KUR_KOLONLARI)
+    tablo = pd.DataFrame({
+        "Tarih": pd.to_datetime(kurlar["Tarih"], errors="coerce"),
+        "Para Birimi": normalize_currency_codes(kurlar["Para Birimi"]),
+        "Kur": smart_to_num_series(kurlar["Kur"]),
+    })
+    tablo = tablo.dropna(subset=["Tarih", "Para Birimi"])
+    tablo = tablo[tablo["Kur"] > 0]
+    tablo["Tarih"] = tablo["Tarih"].astype("datetime64[ns]")
+    return tablo.sort_values("Tarih", kind="stable").reset_index(drop=True)
+
+
+def fx_factor(para_birimi: pd.Series, tarih: pd.Series, kurlar: pd.DataFrame = None) -> pd.Series:
+    """Satır başına raporlama para birimine çevirme katsayısı.
+
+    Kurlar tablosuna para birimi bazında geriye dönük as-of join yapılır; tarihten önce kur yoksa
+    ilk kur kullanılır. Kuru hiç olmayan satırlar 1 kabul edilir ve attrs["kur_eksik"] ile sayılır.
+    """
+    kurlar = df_kurlar if kurlar is None else kurlar
+    kod = normalize_currency_codes(para_birimi).fillna(RAPOR_PARA_BIRIMI)
+    faktor = pd.Series(1.0, index=kod.index)
+    faktor.attrs["kur_eksik"] = 0
+    yabanci = (kod != RAPOR_PARA_BIRIMI).to_numpy()
+    if not yabanci.any():
+        return faktor
+
+    tarihler = pd.to_datetime(pd.Series(tarih), errors="coerce").to_numpy()
+    sol = pd.DataFrame({
+        "_konum": np.flatnonzero(yabanci),
+        "Para Birimi": kod.to_numpy()[yabanci],
+        "Tarih": tarihler[yabanci],
+    })
+    sol["Tarih"] = sol["Tarih"].fillna(pd.Timestamp.today().normalize()).astype("datetime64[ns]")
+    sol = sol.sort_values("Tarih", kind="stable")
+
+    sag = _kur_tablosu(kurlar)
+    if sag.empty:
+        faktor.attrs["kur_eksik"] = int(yabanci.sum())
+        return faktor
+    geri = pd.merge_asof(sol, sag, on="Tarih", by="Para Birimi", direction="backward")
+    ileri = pd.merge_asof(sol, sag, on="Tarih", by="Para Birimi", direction="forward")
+    kur = geri["Kur"].fillna(ileri["Kur"])
+    faktor.iloc[geri["_konum"].to_numpy()] = kur.fillna(1.0).to_numpy()
+    faktor.attrs["kur_eksik"] = int(kur.isna().sum())
+    return faktor
+
+
+def amount_in_reporting(df: pd.DataFrame, tarih_kolon: str = "Tarih", tutar_kolon: str = "Tutar") -> pd.Series:
+    """Tutar kolonunu raporlama para birimine çevrilmiş sayısal seri olarak döndürür."""
+    if df.empty or tutar_kolon not in df.columns:
+        return pd.Series(0.0, index=df.index)
+    para = df["Para Birimi"] if "Para Birimi" in df.columns else detect_currency_series(df[tutar_kolon])
+    tarih = df[tarih_kolon] if tarih_kolon in df.columns else pd.Series(pd.NaT, index=df.index)
+    return smart_to_num_series(df[tutar_kolon]) * fx_factor(para, tarih)
+
+
+# ==== KAYIT İNDEKSLERİ (ID → SATIR KONUMU) ====
+# Tablolar her çalıştırmada yeniden yüklendiği için indeksler ilk erişimde kurulur.
+# Ekleme/silme yardımcıları indeksi günceller; tablo nesnesi, uzunluğu veya veri
+# sürümü değişmişse indeks yeniden kurulur.
+
+ID_TABLOLARI = {
+    "musteri": "df_musteri",
+    "kayit": "df_kayit",
+    "teklif": "df_teklif",
+    "proforma": "df_proforma",
+    "evrak": "df_evrak",
+}
+ID_CAKISMALARI = {}
+_ID_INDEKSLERI = {}
+
+
+def _id_metinleri(frame: pd.DataFrame) -> pd.Series:
+    if "ID" not in frame.columns:
+        return pd.Series("", index=frame.index, dtype=object)
+    seri = frame["ID"].astype(object).where(frame["ID"].notna(), "").astype(str).str.strip()
+    return seri.where(seri != "nan", "")
+
+
+class IdIndex:
+    """Tek tablo için ID → satır konumu eşlemesi; yinelenen ID'lerde ilk satır geçerlidir."""
+
+    def __init__(self, frame: pd.DataFrame):
+        self.frame = frame
+        self.uzunluk = len(frame)
+        self.surum = DATA_VERSION
+        ids = _id_metinleri(frame)
+        yinelenen = ids.duplicated(keep="first") & ids.ne("")
+        gecerli = (ids.ne("") & ~yinelenen).to_numpy()
+        self.konumlar = dict(zip(ids.to_numpy()[gecerli], np.flatnonzero(gecerli)))
+        self.cakismalar = sorted(set(ids[yinelenen]))
+
+    def gecerli_mi(self, frame: pd.DataFrame) -> bool:
+        return frame is self.frame and len(frame) == self.uzunluk and self.surum == DATA_VERSION
+
+    def konum(self, kayit_id):
+        return self.konumlar.get(str(kayit_id).strip())
+
+    def etiket(self, kayit_id):
+        konum = self.konum(kayit_id)
+        return None if konum is None else self.frame.index[konum]
+
+
+def id_index(tablo: str) -> IdIndex:
+    frame = globals()[ID_TABLOLARI[tablo]]
+    indeks = _ID_INDEKSLERI.get(tablo)
+    if indeks is None or not indeks.gecerli_mi(frame):
+        indeks = _ID_INDEKSLERI[tablo] = IdIndex(frame)
+    return indeks
+
+
+def record_label(tablo: str, kayit_id):
+    """ID'nin tablodaki index etiketini (df.at/df.loc için) döndürür; yoksa None."""
+    return id_index(tablo).etiket(kayit_id)
+
+
+def record_get(tablo: str, kayit_id):
+    indeks = id_index(tablo)
+    konum = indeks.konum(kayit_id)
+    return None if konum is None else indeks.frame.iloc[konum]
+
+
+def record_update(tablo: str, kayit_id, degerler: dict) -> bool:
+    """ID'li satır(lar)ı günceller; yinelenen ID'de eşleşen tüm satırlar yazılır."""
+    indeks = id_index(tablo)
+    etiket = indeks.etiket(kayit_id)
+    if etiket is None:
+        return False
+    frame = indeks.frame
+    kayit_id = str(kayit_id).strip()
+    hedef = _id_metinleri(frame).eq(kayit_id) if kayit_id in indeks.cakismalar else [etiket]
+    for kolon, deger in degerler.items():
+        frame.loc[hedef, kolon] = deger
+    return True
+
+
+def record_insert(tablo: str, satir: dict) -> str:
+    """Satırı tablonun sonuna ekler (ID yoksa üretir) ve indeksi günceller."""
+    ad = ID_TABLOLARI[tablo]
+    indeks = id_index(tablo)
+    satir = dict(satir)
+    kayit_id = str(satir.get("ID") or uuid.uuid4()).strip()
+    satir["ID"] = kayit_id
+    yeni = pd.concat([globals()[ad], pd.DataFrame([satir])], ignore_index=True)
+    globals()[ad] = yeni
+    if kayit_id in indeks.konumlar:
+        indeks.cakismalar = sorted(set(indeks.cakismalar) | {kayit_id})
+    else:
+        indeks.konumlar[kayit_id] = len(yeni) - 1
+    indeks.frame, indeks.uzunluk = yeni, len(yeni)
+    return kayit_id
+
+
+def record_delete(tablo: str, kayit_id) -> bool:
+    """ID'li satırı siler; sonraki satırların konumları bir kaydırılır."""
+    ad = ID_TABLOLARI[tablo]
+    indeks = id_index(tablo)
+    konum = indeks.konum(kayit_id)
+    if konum is None:
+        return False
+    yeni = indeks.frame.drop(indeks.frame.index[konum]).reset_index(drop=True)
+    globals()[ad] = yeni
+    _ID_INDEKSLERI[tablo] = IdIndex(yeni)
+    return True
+
+
+def check_duplicate_ids() -> dict:
+    """Yüklemede tüm tabloların ID indekslerini kurar ve yinelenen ID'leri toplar."""
+    ID_CAKISMALARI.clear()
+    _ID_INDEKSLERI.clear()
+    for tablo in ID_TABLOLARI:
+        cakisma = id_index(tablo).cakismalar
+        if cakisma:
+            ID_CAKISMALARI[tablo] = cakisma
+    return ID_CAKISMALARI
+
+
+# ==== SİPARİŞ ANAHTARI İNDEKSİ (MÜŞTERİ, PROFORMA NO) ====
+# Proforma, ETA ve evrak satırları normalize edilmiş (kırpılmış, casefold)
+# (müşteri, proforma no) anahtarıyla tek bir indekste tutulur; tablolar arası
+# eşleştirmeler maske yerine sözlük erişimiyle yapılır.
+
+SIPARIS_ANAHTAR_TABLOLARI = {
+    "proforma": "df_proforma",
+    "eta": "df_eta",
+    "evrak": "df_evrak",
+}
+_SIPARIS_INDEKSI = None
+
+
+def _anahtar_metni(seri) -> pd.Series:
+    seri = pd.Series(seri, dtype=object) if not isinstance(seri, pd.Series) else seri
+    return seri.astype(object).where(seri.notna(), "").astype(str).str.strip().str.casefold()
+
+
+def siparis_anahtari(musteri, proforma_no) -> tuple:
+    return tuple(_anahtar_metni([musteri, proforma_no]).tolist())
+
+
+def siparis_anahtarlari(frame: pd.DataFrame) -> pd.Series:
+    """Tablonun her satırı için (müşteri, proforma no) anahtarı."""
+    musteri = _anahtar_metni(frame["Müşteri Adı"]) if "Müşteri Adı" in frame.columns else pd.Series("", index=frame.index)
+    proforma = _anahtar_metni(frame["Proforma No"]) if "Proforma No" in frame.columns else pd.Series("", index=frame.index)
+    return pd.Series(list(zip(musteri, proforma)), index=frame.index, dtype=object)
+
+
+class OrderKeyIndex:
+    """(müşteri, proforma no) → proforma / ETA / evrak satır etiketleri."""
+
+    def __init__(self):
+        self.frameler = {}
+        self.konumlar = {}
+        self.surum = DATA_VERSION
+        for tablo, ad in SIPARIS_ANAHTAR_TABLOLARI.items():
+            frame = globals()[ad]
+            anahtarlar = siparis_anahtarlari(frame)
+            self.frameler[tablo] = (frame, len(frame))
+            self.konumlar[tablo] = (
+                pd.DataFrame(anahtarlar.tolist(), columns=["m", "p"]).groupby(["m", "p"], sort=False).indices
+                if len(frame) else {}
+            )
+
+    def gecerli_mi(self) -> bool:
+        if self.surum != DATA_VERSION:
+            return False
+        for tablo, ad in SIPARIS_ANAHTAR_TABLOLARI.items():
+            frame, uzunluk = self.frameler[tablo]
+            if globals()[ad] is not frame or len(frame) != uzunluk:
+                return False
+        return True
+
+    def rows(self, tablo: str, musteri, proforma_no) -> list:
+        konumlar = self.konumlar[tablo].get(siparis_anahtari(musteri, proforma_no))
+        if konumlar is None:
+            return []
+        return list(self.frameler[tablo][0].index[konumlar])
+
+    def first(self, tablo: str, musteri, proforma_no):
+        etiketler = self.rows(tablo, musteri, proforma_no)
+        return etiketler[0] if etiketler else None
+
+    def keys(self, tablo: str) -> set:
+        return set(self.konumlar[tablo])
+
+
+def order_index() -> OrderKeyIndex:
+    global _SIPARIS_INDEKSI
+    if _SIPARIS_INDEKSI is None or not _SIPARIS_INDEKSI.gecerli_mi():
+        _SIPARIS_INDEKSI = OrderKeyIndex()
+    return _SIPARIS_INDEKSI
+
+
+def orders_missing_downstream(orders: pd.DataFrame, downstream: pd.DataFrame,
+                              anahtarlar=("Müşteri Adı", "Proforma No")) -> pd.DataFrame:
+    """orders satırlarından, normalize anahtarı downstream tablosunda bulunmayanlar (anti-join).
+
+    Ör. faturası kesilmemiş siparişler: orders_missing_downstream(siparisler, df_evrak).
+    """
+    if orders.empty or not isinstance(downstream, pd.DataFrame) or downstream.empty:
+        return orders
+
+    def _anahtar_tablosu(frame):
+        return pd.DataFrame({
+            f"_k{i}": (_anahtar_metni(frame[kolon]) if kolon in frame.columns else pd.Series("", index=frame.index)).to_numpy()
+            for i, kolon in enumerate(anahtarlar)
+        })
+
+    sol = _anahtar_tablosu(orders)
+    sag = _anahtar_tablosu(downstream).drop_duplicates()
+    eslesme = sol.merge(sag, on=list(sol.columns), how="left", indicator=True)
+    return orders[(eslesme["_merge"] == "left_only").to_numpy()]
+
+
+def shipped_orders_without_invoice(df_proforma: pd.DataFrame, df_evrak: pd.DataFrame) -> pd.DataFrame:
+    """Sevkedildi durumundaki, faturası kesilmemiş siparişler (termin ve tarihe göre sıralı)."""
+    pf = df_proforma.reindex(columns=list(dict.fromkeys([*df_proforma.columns, "ID", "Durum", "Sevk Durumu", "Proforma No"])))
+    metin = {k: pf[k].astype(object).where(pf[k].notna(), "").astype(str).str.strip() for k in ["ID", "Durum", "Sevk Durumu", "Proforma No"]}
+    sevkli = (
+        metin["Sevk Durumu"].eq("Sevkedildi")
+        & metin["Durum"].eq("Siparişe Dönüştü")
+        & metin["ID"].ne("")
+        & metin["Proforma No"].ne("")
+    )
+    bekleyen = orders_missing_downstream(pf[sevkli], df_evrak)
+    sira = pd.DataFrame({
+        "termin": pd.to_datetime(bekleyen.get("Termin Tarihi"), errors="coerce"),
+        "tarih": pd.to_datetime(bekleyen.get("Tarih"), errors="coerce"),
+    }, index=bekleyen.index).sort_values(["termin", "tarih"], kind="stable")
+    return bekleyen.loc[sira.index]
+
+
+def order_option_labels(orders: pd.DataFrame) -> pd.Series:
+    """ID → "Müşteri - Proforma | Termin: .. | Tutar: .. PB" etiketleri (vektörel)."""
+    if orders.empty:
+        return pd.Series(dtype=object)
+
+    def metin(kolon):
+        return orders.get(kolon, pd.Series("", index=orders.index)).astype(object).fillna("").astype(str)
+
+    termin = pd.to_datetime(orders.get("Termin Tarihi"), errors="coerce").dt.strftime("%d/%m/%Y")
+    tutar_ham = metin("Tutar").str.strip()
+    tutar = smart_to_num_series(tutar_ham).map("{:,.2f}".format)
+    para = metin("Para Birimi").replace("", RAPOR_PARA_BIRIMI) if "Para Birimi" in orders.columns else RAPOR_PARA_BIRIMI
+    etiket = (
+        metin("Müşteri Adı") + " - " + metin("Proforma No")
+        + (" | Termin: " + termin).where(termin.notna(), "")
+        + (" | Tutar: " + tutar + " " + para).where(tutar_ham != "", "")
+    )
+    return pd.Series(etiket.to_numpy(), index=metin("ID").to_numpy())
+
+
+# ==== ID SEÇİCİLER (ETİKET HARİTALARI) ====
+# Selectbox etiketleri veri sürümü başına bir kez ID → etiket sözlüğü olarak kurulur;
+# format_func sözlükten okur. Uzun listeler arama + sayfalama ile daraltılır.
+
+ID_SECICI_SAYFA = 200
+
+
+def build_label_map(frame: pd.DataFrame, bicim: str, tarih_kolonlari=(), id_kolon: str = "ID") -> dict:
+    """bicim: kolon adlarıyla şablon, ör. "{Müşteri Adı} | {Proforma No}"."""
+    if frame.empty or id_kolon not in frame.columns:
+        return {}
+    kolonlar = re.findall(r"{([^{}]+)}", bicim)
+    degerler = {}
+    for kolon in dict.fromkeys(kolonlar):
+        seri = frame[kolon] if kolon in frame.columns else pd.Series("", index=frame.index)
+        if kolon in tarih_kolonlari:
+            seri = pd.to_datetime(seri, errors="coerce").dt.strftime("%d/%m/%Y")
+        degerler[kolon] = seri.astype(object).where(seri.notna(), "").astype(str).tolist()
+    anahtarlar = list(degerler)
+    etiketler = [bicim.format(**dict(zip(anahtarlar, satir))) for satir in zip(*degerler.values())]
+    return dict(zip(frame[id_kolon].tolist(), etiketler))
+
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def _cached_label_map(data_version: str, tablo: str, bicim: str, tarih_kolonlari: tuple, _frame: pd.DataFrame) -> dict:
+    return build_label_map(_frame, bicim, tarih_kolonlari)
+
+
+def label_map(tablo: str, bicim: str, tarih_kolonlari=()) -> dict:
+    """ID_TABLOLARI içindeki bir tablo için önbellekli ID → etiket sözlüğü."""
+    return _cached_label_map(DATA_VERSION, tablo, bicim, tuple(tarih_kolonlari), globals()[ID_TABLOLARI[tablo]])
+
+
+def id_picker(label: str, ids, etiketler: dict, key: str, sayfa_boyutu: int = ID_SECICI_SAYFA):
+    """ID listesinden seçim; sayfa_boyutu'ndan uzun listelerde arama kutusu ve sayfa seçimi gösterir."""
+    ids = list(ids)
+    if len(ids) > sayfa_boyutu:
+        ara_col, sayfa_col = st.columns([3, 1])
+        arama = ara_col.text_input(f"{label} — ara", key=f"{key}_ara").strip().lower()
+        if arama:
+            metinler = pd.Series([etiketler.get(i, str(i)) for i in ids], dtype=object)
+            ids = [i for i, uygun in zip(ids, metinler.str.lower().str.contains(arama, regex=False)) if uygun]
+        sayfa_sayisi = max(1, -(-len(ids) // sayfa_boyutu))
+        sayfa = sayfa_col.number_input(
+            f"Sayfa (1-{sayfa_sayisi})", min_value=1, max_value=sayfa_sayisi, value=1, step=1, key=f"{key}_sayfa"
+        )
+        ids = ids[(int(sayfa) - 1) * sayfa_boyutu: int(sayfa) * sayfa_boyutu]
+        if not ids:
+            st.caption("Aramaya uyan kayıt yok.")
+            return None
+    return st.selectbox(label, options=ids, format_func=lambda _id: etiketler.get(_id, str(_id)), key=key)
+
+
+TABLO_SAYFA_BOYUTLARI = (25, 50, 100, 200)
+VARSAYILAN_SIRA = "(Varsayılan)"
+
+
+def _tablo_durumu(key: str, filtre) -> dict:
+    """Sayfalı tablonun session_state'teki durumu; filtre değişince ilk sayfaya döner."""
+    durum = st.session_state.setdefault(f"{key}_durum", {"filtre": filtre})
+    if durum.get("filtre") != filtre:
+        durum["filtre"] = filtre
+        st.session_state[f"{key}_sayfa"] = 1
+    return durum
+
+
+_SAYI_METNI = r"[-+]?(?:\d{1,3}(?:[.,\s]\d{3})+|\d+)(?:[.,]\d+)?"
+
+
+def _siralama_anahtari(seri: pd.Series) -> pd.Series:
+    """Karışık tipli (str / date / Timestamp) kolonlar için karşılaştırılabilir sıralama anahtarı.
+
+    Dolu değerlerin tamamı sayıysa sayı, tarihse tarih, aksi halde küçük harfli metin döner;
+    boş hücreler NaN olur (sona dizilir).
+    """
+    if pd.api.types.is_numeric_dtype(seri) or pd.api.types.is_datetime64_any_dtype(seri):
+        return seri
+    metin = seri.astype(object).where(seri.notna(), "").astype(str).str.strip()
+    dolu = metin != ""
+    if not dolu.any():
+        return metin.where(dolu)
+    sade = metin[dolu].str.replace(_CURRENCY_PATTERN, "", regex=True).str.strip()
+    if sade.str.fullmatch(_SAYI_METNI).all():
+        return smart_to_num_series(seri).where(dolu)
+    tarih = pd.to_datetime(seri.where(dolu), errors="coerce", format="mixed", dayfirst=True)
+    if tarih[dolu].notna().all():
+        return tarih
+    return metin.str.casefold().where(dolu)
+
+
+def paged_table(kaynak, key: str, toplam: int = None, siralama=(), bicim=None, filtre=None,
+                editor: bool = False, sayfa_boyutlari=TABLO_SAYFA_BOYUTLARI, **secenekler):
+    """Yalnızca görünen sayfayı dilimleyip gösteren tablo.
+
+    kaynak: DataFrame ya da (baslangic, bitis) -> DataFrame döndüren fonksiyon (toplam zorunlu).
+    siralama: kullanıcının seçebileceği sıralama kolonları (yalnızca DataFrame kaynakta).
+    bicim: sayfa dilimine uygulanan görüntü dönüşümü. editor=True ise st.data_editor kullanılır
+    ve düzenlenen sayfa döner; aksi halde görüntülenen sayfa döner.
+    """
+    if toplam is None:
+        toplam = len(kaynak)
+    _tablo_durumu(key, filtre)
+    siralama = [k for k in siralama if isinstance(kaynak, pd.DataFrame) and k in kaynak.columns]
+
+    kolonlar = st.columns([2, 1, 1, 1]) if siralama else st.columns([1, 1, 2])
+    if siralama:
+        sira_kolon = kolonlar[0].selectbox("Sırala", [VARSAYILAN_SIRA, *siralama], key=f"{key}_sirala")
+        azalan = kolonlar[1].checkbox("Azalan", key=f"{key}_azalan")
+        kolonlar = kolonlar[2:]
+    else:
+        sira_kolon, azalan = VARSAYILAN_SIRA, False
+    boyut = int(kolonlar[0].selectbox("Satır / sayfa", list(sayfa_boyutlari), index=min(1, len(sayfa_boyutlari) - 1),
+                                      key=f"{key}_boyut"))
+    sayfa_sayisi = max(1, -(-toplam // boyut))
+    if st.session_state.get(f"{key}_sayfa", 1) > sayfa_sayisi:
+        st.session_state[f"{key}_sayfa"] = sayfa_sayisi
+    sayfa = int(kolonlar[1].number_input(f"Sayfa (1-{sayfa_sayisi})", min_value=1, max_value=sayfa_sayisi,
+                                         step=1, key=f"{key}_sayfa"))
+    bas, bit = (sayfa - 1) * boyut, min(sayfa * boyut, toplam)
+    st.caption(f"{bas + 1 if toplam else 0}–{bit} / {toplam} kayıt")
+
+    if callable(kaynak):
+        dilim = kaynak(bas, bit)
+    elif sira_kolon != VARSAYILAN_SIRA:
+        # Tüm tablo değil, yalnızca sıralama kolonu sıralanır; satırlar sayfa için alınır
+        sira = _siralama_anahtari(kaynak[sira_kolon].reset_index(drop=True)).sort_values(
+            ascending=not azalan, kind="stable", na_position="last")
+        dilim = kaynak.iloc[sira.index[bas:bit]]
+    else:
+        dilim = kaynak.iloc[bas:bit]
+    if bicim is not None:
+        dilim = bicim(dilim)
+
+    if editor:
+        return st.data_editor(dilim, key=f"{key}_editor_{sayfa}_{boyut}_{sira_kolon}_{azalan}", **secenekler)
+    st.dataframe(dilim, **secenekler)
+    return dilim
 
 # ==== KULLANICI GİRİŞİ SİSTEMİ ====
 USERS = {
@@ -530,22 +1083,314 @@ with col2:
         </div>
     """, unsafe_allow_html=True)
 
+# ===========================
+# ==== DEPOLAMA ARKA UCU (GOOGLE DRIVE / YEREL)
+# ===========================
+# CRM_DRIVE_BACKEND=local ile Google Drive yerine yerel bir dizin kullanılır.
+# LocalDrive, uygulamanın kullandığı PyDrive2 işlemlerini (CreateFile, ListFile,
+# Upload, GetContentFile, FetchMetadata, md5Checksum, modifiedDate) taklit eder;
+# eklenebilir gecikme ve hata oranıyla senkron, yükleme ve önbellek katmanları
+# canlı kimlik bilgisi olmadan ölçülebilir.
+#
+#   CRM_DRIVE_BACKEND            google (varsayılan) | local
+#   CRM_LOCAL_DRIVE_DIR          yerel depo dizini (varsayılan .local_drive)
+#   CRM_LOCAL_DRIVE_LATENCY_MS   istek başına gecikme: "80" ya da "50-200"
+#   CRM_LOCAL_DRIVE_FAIL_RATE    0-1 arası rastgele hata olasılığı (açılıştaki Excel indirmesi muaf)
+#   CRM_LOCAL_DRIVE_SEED         tekrarlanabilir gecikme/hata dizisi için tohum
+
+DRIVE_BACKEND = os.environ.get("CRM_DRIVE_BACKEND", "google").strip().lower()
+
+
+class LocalDriveError(Exception):
+    """LocalDrive'ın enjekte ettiği ya da bulunamayan dosya hatası."""
+
+
+def _rfc3339_simdi() -> str:
+    return datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+
+
+_YEREL_SORGU_DIZESI = r"'((?:[^'\\]|\\.)*)'"
+_YEREL_SORGU_KALIPLARI = [
+    (re.compile(rf"^(title|mimeType)\s*=\s*{_YEREL_SORGU_DIZESI}$"), "esit"),
+    (re.compile(rf"^{_YEREL_SORGU_DIZESI}\s+in\s+parents$"), "ebeveyn"),
+    (re.compile(r"^trashed\s*=\s*(true|false)$"), "cop"),
+    (re.compile(rf"^modifiedDate\s*(>=|<=|>|<|=)\s*{_YEREL_SORGU_DIZESI}$"), "tarih"),
+]
+# Dize sabitleri (kaçışlı \' dahil) tek parça okunur; yalnızca dize dışındaki "and" koşulları ayırır.
+_YEREL_SORGU_PARCASI = re.compile(rf"{_YEREL_SORGU_DIZESI}|(\s+and\s+)|[^'\s]+|\s+|.")
+
+
+def _yerel_sorgu_parcalari(q: str) -> list:
+    parcalar, simdiki = [], ""
+    for m in _YEREL_SORGU_PARCASI.finditer(q.strip()):
+        if m.group(2):
+            parcalar.append(simdiki)
+            simdiki = ""
+        else:
+            simdiki += m.group(0)
+    parcalar.append(simdiki)
+    return [p.strip() for p in parcalar if p.strip()]
+
+
+def _yerel_sorgu_kosullari(q: str) -> list:
+    """Drive v2 sorgusunun uygulamada kullanılan alt kümesini (and ile bağlı) koşul fonksiyonlarına çevirir."""
+    parcalar = _yerel_sorgu_parcalari(q)
+    kosullar = []
+    coz = lambda s: re.sub(r"\\(.)", r"\1", s)
+    for parca in parcalar:
+        for kalip, tur in _YEREL_SORGU_KALIPLARI:
+            m = kalip.match(parca)
+            if not m:
+                continue
+            if tur == "esit":
+                alan, deger = m.group(1), coz(m.group(2))
+                kosullar.append(lambda f, a=alan, d=deger: f.get(a) == d)
+            elif tur == "ebeveyn":
+                ebeveyn = coz(m.group(1))
+                kosullar.append(lambda f, e=ebeveyn: e in [p["id"] for p in f.get("parents", [])])
+            elif tur == "cop":
+                cop = m.group(1) == "true"
+                kosullar.append(lambda f, c=cop: bool(f.get("labels", {}).get("trashed")) == c)
+            else:
+                islem, deger = m.group(1), coz(m.group(2))
+                karsilastir = {">": str.__gt__, ">=": str.__ge__, "<": str.__lt__, "<=": str.__le__, "=": str.__eq__}[islem]
+                kosullar.append(lambda f, k=karsilastir, d=deger: k(f.get("modifiedDate", ""), d))
+            break
+        else:
+            raise LocalDriveError(f"Desteklenmeyen sorgu: {parca}")
+    return kosullar
+
+
+class LocalDriveFile(dict):
+    """GoogleDriveFile benzeri: sözlük metadata + content / Upload / GetContentFile."""
+
+    def __init__(self, depo, metadata=None):
+        super().__init__(metadata or {})
+        self.depo = depo
+        self.content = None
+
+    def SetContentFile(self, filename):
+        with open(filename, "rb") as f:
+            self.content = io.BytesIO(f.read())
+        self.setdefault("title", os.path.basename(filename))
+        self.setdefault("mimeType", mimetypes.guess_type(filename)[0])
+
+    def SetContentString(self, content, encoding="utf-8"):
+        self.content = io.BytesIO(content.encode(encoding))
+        self.setdefault("mimeType", "text/plain")
+
+    def Upload(self, param=None):
+        self.depo._yukle(self)
+
+    def FetchMetadata(self, fields=None, fetch_all=False):
+        self.update(self.depo._metadata(self["id"]))
+
+    def GetContentFile(self, filename, mimetype=None):
+        self.depo._gecikme_ve_hata()
+        with open(self.depo._blob(self["id"]), "rb") as kaynak, open(filename, "wb") as hedef:
+            hedef.write(kaynak.read())
+
+
+class LocalFileList:
+    """GoogleDriveFileList benzeri: sayfa sayfa yinelenir, GetList() hepsini döndürür."""
+
+    def __init__(self, depo, param: dict):
+        self.depo = depo
+        self.param = dict(param or {})
+        self._sonuc = None
+        self._konum = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        ilk = self._sonuc is None
+        if ilk:
+            self._sonuc = self.depo._sorgula(self.param.get("q", ""))
+        if not ilk and self._konum >= len(self._sonuc):
+            raise StopIteration
+        if not ilk:
+            self.depo._gecikme_ve_hata()
+        boyut = int(self.param.get("maxResults") or 100)
+        sayfa = self._sonuc[self._konum:self._konum + boyut]
+        self._konum += boyut
+        return sayfa
+
+    def GetList(self):
+        return [f for sayfa in self for f in sayfa]
+
+
+class _LocalHttp:
+    """drive.auth.Get_Http_Object().request(url) çağrıları için (küçük resim bağlantıları)."""
+
+    def __init__(self, depo):
+        self.depo = depo
+
+    def request(self, url, *args, **kwargs):
+        self.depo._gecikme_ve_hata()
+        file_id = str(url).rsplit("/", 1)[-1]
+        yol = self.depo._blob(file_id)
+        yanit = type("Yanit", (), {"status": 200 if os.path.exists(yol) else 404})()
+        if yanit.status != 200:
+            return yanit, b""
+        with open(yol, "rb") as f:
+            return yanit, f.read()
+
+
+class _LocalAuth:
+    def __init__(self, depo):
+        self.depo = depo
+
+    def Get_Http_Object(self):
+        return _LocalHttp(self.depo)
+
+
+class LocalDrive:
+    """Yerel dizinde Drive taklidi: metadata.json + blobs/<id>; gecikme ve hata enjeksiyonu."""
+
+    def __init__(self, dizin: str = None, gecikme_ms=None, hata_orani: float = None, tohum=None):
+        self.dizin = dizin or os.environ.get("CRM_LOCAL_DRIVE_DIR", ".local_drive")
+        gecikme = str(gecikme_ms if gecikme_ms is not None else os.environ.get("CRM_LOCAL_DRIVE_LATENCY_MS", "0"))
+        alt, _, ust = gecikme.partition("-")
+        self.gecikme = (float(alt or 0) / 1000, float(ust or alt or 0) / 1000)
+        self.hata_orani = float(hata_orani if hata_orani is not None else os.environ.get("CRM_LOCAL_DRIVE_FAIL_RATE", 0))
+        tohum = tohum if tohum is not None else os.environ.get("CRM_LOCAL_DRIVE_SEED")
+        self._rastgele = np.random.default_rng(int(tohum) if tohum not in (None, "") else None)
+        self._lock = threading.Lock()
+        self._muaf = threading.local()
+        self.auth = _LocalAuth(self)
+        self.path = os.path.join(self.dizin, "metadata.json")
+        os.makedirs(os.path.join(self.dizin, "blobs"), exist_ok=True)
+        self.dosyalar = {}
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as f:
+                self.dosyalar = json.load(f)
+
+    # ---- PyDrive2 yüzeyi ----
+    def CreateFile(self, metadata=None):
+        return LocalDriveFile(self, metadata)
+
+    def ListFile(self, param=None):
+        return LocalFileList(self, param)
+
+    # ---- Yardımcılar ----
+    @contextmanager
+    def enjeksiyonsuz(self):
+        """Bu iş parçacığındaki istekleri gecikme/hata enjeksiyonundan muaf tutar (açılış I/O'su için)."""
+        onceki = getattr(self._muaf, "aktif", False)
+        self._muaf.aktif = True
+        try:
+            yield self
+        finally:
+            self._muaf.aktif = onceki
+
+    def _gecikme_ve_hata(self):
+        if getattr(self._muaf, "aktif", False):
+            return
+        with self._lock:
+            bekle = self._rastgele.uniform(*self.gecikme) if self.gecikme[1] > 0 else 0.0
+            hata = self.hata_orani > 0 and self._rastgele.random() < self.hata_orani
+        if bekle:
+            time.sleep(bekle)
+        if hata:
+            raise LocalDriveError("Enjekte edilmiş LocalDrive hatası")
+
+    def _blob(self, file_id: str) -> str:
+        return os.path.join(self.dizin, "blobs", re.sub(r"[^\w\-]", "_", str(file_id)))
+
+    def file_link(self, file_id: str) -> str:
+        return f"file://{os.path.abspath(self._blob(file_id))}"
+
+    def _yaz(self):
+        with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=self.dizin, delete=False, suffix=".tmp") as f:
+            json.dump(self.dosyalar, f, ensure_ascii=False)
+            gecici = f.name
+        os.replace(gecici, self.path)
+
+    def _metadata(self, file_id: str) -> dict:
+        self._gecikme_ve_hata()
+        with self._lock:
+            if file_id not in self.dosyalar:
+                raise LocalDriveError(f"Dosya bulunamadı: {file_id}")
+            return json.loads(json.dumps(self.dosyalar[file_id]))
+
+    def _sorgula(self, q: str) -> list:
+        self._gecikme_ve_hata()
+        kosullar = _yerel_sorgu_kosullari(q)
+        with self._lock:
+            kayitlar = [dict(m) for m in self.dosyalar.values() if all(k(m) for k in kosullar)]
+        return [LocalDriveFile(self, m) for m in sorted(kayitlar, key=lambda m: m["title"])]
+
+    def _yukle(self, dosya: LocalDriveFile):
+        self._gecikme_ve_hata()
+        veri = None
+        if dosya.content is not None:
+            dosya.content.seek(0)
+            veri = dosya.content.read()
+        with self._lock:
+            file_id = dosya.get("id") or uuid.uuid4().hex
+            kayit = dict(self.dosyalar.get(file_id, {}))
+            kayit.update({k: v for k, v in dosya.items() if k in ("title", "mimeType", "parents")})
+            kayit.setdefault("title", "")
+            kayit.setdefault("parents", [])
+            kayit.setdefault("labels", {"trashed": False})
+            kayit["id"] = file_id
+            kayit["modifiedDate"] = _rfc3339_simdi()
+            if veri is not None:
+                with open(self._blob(file_id), "wb") as f:
+                    f.write(veri)
+                kayit["md5Checksum"] = hashlib.md5(veri).hexdigest()
+                kayit["fileSize"] = str(len(veri))
+                kayit["thumbnailLink"] = f"local://thumbnail/{file_id}" if str(kayit.get("mimeType") or "").startswith("image/") else ""
+            kayit["alternateLink"] = self.file_link(file_id)
+            self.dosyalar[file_id] = kayit
+            self._yaz()
+        dosya.update(kayit)
+        dosya.content = None
+
+    def ensure_file(self, file_id: str, title: str, kaynak: str = None) -> None:
+        """Sabit ID'li bir dosyayı (ör. EXCEL_FILE_ID) yoksa oluşturur; varsa dokunmaz."""
+        if file_id in self.dosyalar:
+            return
+        dosya = self.CreateFile({"id": file_id, "title": title, "mimeType": mimetypes.guess_type(title)[0]})
+        veri = b""
+        if kaynak and os.path.exists(kaynak):
+            with open(kaynak, "rb") as f:
+                veri = f.read()
+        dosya.content = io.BytesIO(veri)
+        with self.enjeksiyonsuz():
+            self._yukle(dosya)
+
+
 @st.cache_resource
 def get_drive():
+    if DRIVE_BACKEND == "local":
+        yerel = LocalDrive()
+        yerel.ensure_file(EXCEL_FILE_ID, "crm.xlsx", kaynak="temp.xlsx")
+        return yerel
     gauth = GoogleAuth()
     gauth.LocalWebserverAuth()
     return GoogleDrive(gauth)
 drive = get_drive()
 
-downloaded = drive.CreateFile({'id': EXCEL_FILE_ID})
-downloaded.FetchMetadata(fetch_all=True)
-downloaded.GetContentFile("temp.xlsx")
+
+def drive_bootstrap():
+    """Açılıştaki zorunlu Excel indirmesi; yerel arka uçta enjekte edilen gecikme/hatadan muaftır."""
+    return drive.enjeksiyonsuz() if isinstance(drive, LocalDrive) else nullcontext()
+
+
+with drive_bootstrap():
+    downloaded = drive.CreateFile({'id': EXCEL_FILE_ID})
+    downloaded.FetchMetadata(fetch_all=True)
+    downloaded.GetContentFile("temp.xlsx")
 
 
 def load_dataframes_from_excel(path: str = "temp.xlsx"):
-    global df_musteri, df_kayit, df_teklif, df_proforma, df_evrak, df_eta, df_fuar_musteri, df_temsilciler
+    global df_musteri, df_kayit, df_teklif, df_proforma, df_evrak, df_eta, df_fuar_musteri, df_temsilciler, df_kurlar
 
     if os.path.exists(path):
+        with open(path, "rb") as f:
+            _set_data_version(f.read())
         try:
             df_musteri = pd.read_excel(path, sheet_name=0)
         except Exception:
@@ -603,7 +1448,12 @@ def load_dataframes_from_excel(path: str = "temp.xlsx"):
             df_temsilciler = pd.DataFrame(columns=[
                 "Temsilci Adı", "Bölgeler", "Ülkeler", "Notlar"
             ])
+        try:
+            df_kurlar = pd.read_excel(path, sheet_name="Kurlar")
+        except Exception:
+            df_kurlar = pd.DataFrame(columns=KUR_KOLONLARI)
     else:
+        _set_data_version(b"")
         df_musteri = pd.DataFrame(columns=[
             "Müşteri Adı", "Telefon", "E-posta", "Adres", "Ülke", "Satış Temsilcisi", "Kategori", "Durum", "Vade (Gün)", "Ödeme Şekli"
         ])
@@ -627,13 +1477,21 @@ def load_dataframes_from_excel(path: str = "temp.xlsx"):
         df_temsilciler = pd.DataFrame(columns=[
             "Temsilci Adı", "Bölgeler", "Ülkeler", "Notlar"
         ])
+        df_kurlar = pd.DataFrame(columns=KUR_KOLONLARI)
 
+    # Tutarların para birimi ayrı kolonda tutulur (sembol > kayıt > müşteri kartı)
+    for tablo in (df_teklif, df_proforma, df_evrak):
+        ensure_currency_column(tablo, df_musteri)
+
+    check_duplicate_ids()
     refresh_temsilci_listesi()
 
 load_dataframes_from_excel()
+for _tablo, _ids in ID_CAKISMALARI.items():
+    st.sidebar.warning(f"{ID_TABLOLARI[_tablo]} tablosunda yinelenen ID: {', '.join(_ids[:5])}" + (" ..." if len(_ids) > 5 else ""))
 
 def update_excel():
-    global df_musteri, df_kayit, df_teklif, df_proforma, df_evrak, df_eta, df_fuar_musteri, df_temsilciler
+    global df_musteri, df_kayit, df_teklif, df_proforma, df_evrak, df_eta, df_fuar_musteri, df_temsilciler, df_kurlar
     
     buffer = io.BytesIO()
     with pd.ExcelWriter(buffer, engine="openpyxl") as writer:
@@ -645,10 +1503,13 @@ def update_excel():
         df_eta.to_excel(writer, sheet_name="ETA", index=False)
         df_fuar_musteri.to_excel(writer, sheet_name="FuarMusteri", index=False)
         df_temsilciler.to_excel(writer, sheet_name="Temsilciler", index=False)
-    buffer.seek(0)
+        df_kurlar.to_excel(writer, sheet_name="Kurlar", index=False)
+    raw = buffer.getvalue()
     with open("temp.xlsx", "wb") as f:
-        f.write(buffer.read())
-    downloaded.SetContentFile("temp.xlsx")
+        f.write(raw)
+    _set_data_version(raw)
+    refresh_dashboard_store()
+    downloaded.content = io.BytesIO(raw)
     downloaded.Upload()
 
 def sync_excel_bidirectional():
@@ -694,8 +1555,2315 @@ def sync_excel_bidirectional():
         st.session_state.sync_status = ("info", "Dosyalar zaten senkron görünüyor.")
 
 
-if st.session_state.pop("_sync_requested", False):
-    sync_excel_bidirectional()
+if st.session_state.pop("_sync_requested", False):
+    sync_excel_bidirectional()
+
+
+# ===========================
+# ==== ÖZET EKRAN: ARTIMLI ÖZET DEPOSU
+# ===========================
+# Her tablo satırı, ilgili kolonlarının parmak iziyle (hash) tutulur. Senkron
+# sırasında yalnızca eklenen / silinen / değişen satırların katkısı toplamlara
+# eklenip çıkarılır; Özet Ekran okumaları hazır toplamlardan yapılır.
+
+DASHBOARD_KAYNAKLARI = {
+    "teklif": ["Müşteri Adı", "Tarih", "Teklif No", "Tutar", "Para Birimi", "Ürün/Hizmet", "Açıklama", "Durum"],
+    "proforma": [
+        "Müşteri Adı", "Ülke", "Proforma No", "Tarih", "Tutar", "Para Birimi", "Vade (gün)", "Açıklama",
+        "Durum", "Sevk Durumu", "Termin Tarihi", "Sevk Tarihi", "Ulaşma Tarihi",
+    ],
+    "evrak": ["Müşteri Adı", "Ülke", "Fatura No", "Fatura Tarihi", "Vade Tarihi", "Tutar", "Para Birimi", "Ödenen Tutar"],
+    "eta": ["Proforma No", "ETA Tarihi"],
+}
+
+
+def _dashboard_frame(tablo: str, df: pd.DataFrame) -> pd.DataFrame:
+    kolonlar = DASHBOARD_KAYNAKLARI[tablo]
+    if not isinstance(df, pd.DataFrame):
+        df = pd.DataFrame()
+    frame = df.reindex(columns=kolonlar)
+    if tablo == "evrak" and "Fatura Tarihi" not in df.columns and "Tarih" in df.columns:
+        frame["Fatura Tarihi"] = df["Tarih"]
+    return frame.reset_index(drop=True)
+
+
+def _ts_or_none(value):
+    return None if pd.isna(value) else pd.Timestamp(value)
+
+
+def _dashboard_records(tablo: str, frame: pd.DataFrame, kurlar: pd.DataFrame = None) -> list:
+    """Satırları özet katkılarına (kayıt sözlüklerine) vektörel olarak çevirir.
+
+    Tutarlar kayıt tarihindeki kurla raporlama para birimine çevrilir.
+    """
+    if frame.empty:
+        return []
+    metin = frame.astype(object).where(frame.notna(), "").astype(str)
+    kur = None
+    tutar = None
+    if "Tutar" in frame.columns:
+        tarih_kolon = "Fatura Tarihi" if tablo == "evrak" else "Tarih"
+        kur = fx_factor(frame["Para Birimi"], frame[tarih_kolon], kurlar)
+        tutar = smart_to_num_series(frame["Tutar"]) * kur
+    kayitlar = []
+
+    if tablo == "teklif":
+        for i in range(len(frame)):
+            kayitlar.append({
+                "acik": metin.at[i, "Durum"] == "Açık",
+                "tutar": float(tutar.iat[i]),
+                "satir": {k: frame.at[i, k] for k in ["Müşteri Adı", "Tarih", "Teklif No", "Tutar", "Ürün/Hizmet", "Açıklama"]},
+            })
+
+    elif tablo == "proforma":
+        tarih = pd.to_datetime(frame["Tarih"], errors="coerce")
+        termin = pd.to_datetime(frame["Termin Tarihi"], errors="coerce")
+        sevk = pd.to_datetime(frame["Sevk Tarihi"], errors="coerce")
+        ulasma = pd.to_datetime(frame["Ulaşma Tarihi"], errors="coerce")
+        for i in range(len(frame)):
+            durum = metin.at[i, "Durum"]
+            sevk_durumu = metin.at[i, "Sevk Durumu"]
+            kayitlar.append({
+                "beklemede": durum == "Beklemede",
+                "sevk_bekliyor": durum == "Siparişe Dönüştü" and sevk_durumu not in ("Sevkedildi", "Ulaşıldı"),
+                "yolda": sevk_durumu == "Sevkedildi",
+                "teslim": sevk_durumu == "Ulaşıldı",
+                "tutar": float(tutar.iat[i]),
+                "proforma_no": metin.at[i, "Proforma No"].strip(),
+                "tarih": _ts_or_none(tarih.iat[i]),
+                "termin": _ts_or_none(termin.iat[i]),
+                "sevk": _ts_or_none(sevk.iat[i]),
+                "ulasma": _ts_or_none(ulasma.iat[i]),
+                "satir": {k: frame.at[i, k] for k in ["Müşteri Adı", "Ülke", "Proforma No", "Tarih", "Tutar", "Vade (gün)", "Açıklama"]},
+            })
+
+    elif tablo == "evrak":
+        fatura_tarihi = pd.to_datetime(frame["Fatura Tarihi"], errors="coerce")
+        vade = pd.to_datetime(frame["Vade Tarihi"], errors="coerce")
+        odenen = pd.to_numeric(frame["Ödenen Tutar"], errors="coerce").fillna(0.0) * kur
+        kalan = (tutar - odenen).clip(lower=0.0)
+        for i in range(len(frame)):
+            ham_musteri = frame.at[i, "Müşteri Adı"]
+            musteri = "" if pd.isna(ham_musteri) else str(ham_musteri).strip()
+            gun = fatura_tarihi.iat[i]
+            kayitlar.append({
+                "tutar": float(tutar.iat[i]),
+                "kalan": float(kalan.iat[i]),
+                "gun": None if pd.isna(gun) else gun.normalize(),
+                "vade": _ts_or_none(vade.iat[i]),
+                "musteri": musteri,
+                "ciro_musteri": "Bilinmeyen Müşteri" if pd.isna(ham_musteri) else musteri,
+                "satir": {k: frame.at[i, k] for k in ["Müşteri Adı", "Ülke", "Fatura No", "Tutar"]},
+            })
+
+    elif tablo == "eta":
+        eta = pd.to_datetime(frame["ETA Tarihi"], errors="coerce")
+        for i in range(len(frame)):
+            kayitlar.append({
+                "proforma_no": metin.at[i, "Proforma No"].strip(),
+                "eta": _ts_or_none(eta.iat[i]),
+            })
+
+    return kayitlar
+
+
+class DashboardSummaryStore:
+    """Özet Ekran için materyalize edilmiş, artımlı güncellenen toplamlar."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.version = None
+        self._kurlar, self._kur_imzasi = None, None
+        self._reset()
+
+    def _reset(self):
+        self._adet = {tablo: Counter() for tablo in DASHBOARD_KAYNAKLARI}
+        self._kayit = {tablo: {} for tablo in DASHBOARD_KAYNAKLARI}
+        # Liste görünümleri: hash -> kayıt (kopya sayısı self._adet içinde)
+        self.acik_teklifler, self.bekleyen_proformalar = {}, {}
+        self.sevk_bekleyenler, self.yoldakiler, self.teslim_edilenler = {}, {}, {}
+        self.acik_faturalar = {}
+        # Skaler toplamlar
+        self.toplamlar = defaultdict(float)
+        self.gunluk_ciro = defaultdict(lambda: [0.0, 0])
+        self.yillik_ciro = defaultdict(lambda: [0.0, 0])
+        self.musteri_fatura_adedi = Counter()
+        self.musteri_ciro = defaultdict(float)
+        self.eta_tarihleri = defaultdict(Counter)
+
+    # ---- Değişiklik yakalama ----
+    def _sync_table(self, tablo: str, df: pd.DataFrame) -> int:
+        frame = _dashboard_frame(tablo, df)
+        eski = self._adet[tablo]
+        if frame.empty:
+            hashler = pd.Series([], dtype="uint64")
+        else:
+            hashler = pd.util.hash_pandas_object(frame.astype(object).where(frame.notna(), "").astype(str), index=False)
+        yeni = Counter(hashler.tolist())
+        eklenen, silinen = yeni - eski, eski - yeni
+
+        for h, n in silinen.items():
+            kayit = self._kayit[tablo][h]
+            eski[h] -= n
+            if eski[h] <= 0:
+                del eski[h], self._kayit[tablo][h]
+            self._apply(tablo, h, kayit, -n)
+
+        if eklenen:
+            # Her yeni parmak izinin ilk satırı katkıyı hesaplamak için yeterli
+            secim = (~hashler.duplicated()) & hashler.isin(list(eklenen))
+            konumlar = np.flatnonzero(secim.to_numpy())
+            kayitlar = _dashboard_records(tablo, frame.iloc[konumlar].reset_index(drop=True), self._kurlar)
+            for h, kayit in zip(hashler.iloc[konumlar].tolist(), kayitlar):
+                n = eklenen[h]
+                self._kayit[tablo][h] = kayit
+                eski[h] += n
+                self._apply(tablo, h, kayit, n)
+
+        return sum(silinen.values()) + sum(eklenen.values())
+
+    def _apply(self, tablo: str, h, kayit: dict, n: int):
+        var = h in self._adet[tablo]
+
+        def _liste(hedef: dict, kosul: bool):
+            if not kosul:
+                return
+            if var:
+                hedef[h] = kayit
+            else:
+                hedef.pop(h, None)
+
+        if tablo == "teklif":
+            _liste(self.acik_teklifler, kayit["acik"])
+            if kayit["acik"]:
+                self.toplamlar["teklif"] += n * kayit["tutar"]
+
+        elif tablo == "proforma":
+            _liste(self.bekleyen_proformalar, kayit["beklemede"])
+            _liste(self.sevk_bekleyenler, kayit["sevk_bekliyor"])
+            _liste(self.yoldakiler, kayit["yolda"])
+            _liste(self.teslim_edilenler, kayit["teslim"])
+            if kayit["beklemede"]:
+                self.toplamlar["proforma"] += n * kayit["tutar"]
+            if kayit["sevk_bekliyor"]:
+                self.toplamlar["siparis"] += n * kayit["tutar"]
+
+        elif tablo == "evrak":
+            self.toplamlar["fatura"] += n * kayit["tutar"]
+            if kayit["gun"] is not None:
+                for kova, anahtar in ((self.gunluk_ciro, kayit["gun"]), (self.yillik_ciro, kayit["gun"].year)):
+                    kova[anahtar][0] += n * kayit["tutar"]
+                    kova[anahtar][1] += n
+                    if kova[anahtar][1] <= 0:
+                        del kova[anahtar]
+            if kayit["musteri"]:
+                self.musteri_fatura_adedi[kayit["musteri"]] += n
+                if self.musteri_fatura_adedi[kayit["musteri"]] <= 0:
+                    del self.musteri_fatura_adedi[kayit["musteri"]]
+            if kayit["tutar"] > 0:
+                ad = kayit["ciro_musteri"]
+                self.musteri_ciro[ad] += n * kayit["tutar"]
+                if abs(self.musteri_ciro[ad]) < 1e-6:
+                    del self.musteri_ciro[ad]
+            _liste(self.acik_faturalar, kayit["kalan"] > 0.01 and kayit["vade"] is not None)
+
+        elif tablo == "eta":
+            if kayit["eta"] is not None:
+                sayac = self.eta_tarihleri[kayit["proforma_no"]]
+                sayac[kayit["eta"]] += n
+                if sayac[kayit["eta"]] <= 0:
+                    del sayac[kayit["eta"]]
+                if not sayac:
+                    del self.eta_tarihleri[kayit["proforma_no"]]
+
+    # ---- Dış API ----
+    def sync(self, frames: dict, version: str) -> int:
+        """Yalnızca değişen satırları uygular; işlenen satır sayısını döndürür.
+
+        Kur tablosu değiştiyse tüm katkılar yeni kurlarla baştan hesaplanır.
+        """
+        kurlar = frames.get("kurlar")
+        if kurlar is None:
+            kurlar = pd.DataFrame(columns=KUR_KOLONLARI)
+        kur_imzasi = _kur_tablosu(kurlar).to_csv(index=False)
+        with self._lock:
+            if kur_imzasi != self._kur_imzasi:
+                self._reset()
+                self._kurlar, self._kur_imzasi = kurlar, kur_imzasi
+            islenen = sum(self._sync_table(tablo, frames.get(tablo)) for tablo in DASHBOARD_KAYNAKLARI)
+            self.version = version
+            return islenen
+
+    def rebuild(self, frames: dict, version: str):
+        """Depoyu sıfırdan kurar (doğrulama ve kurtarma için)."""
+        with self._lock:
+            self._reset()
+            self.version = None
+        return self.sync(frames, version)
+
+    def _ozet_degerleri(self) -> dict:
+        def _yuvarla(kova):
+            return {k: (round(v[0], 2), v[1]) for k, v in kova.items()}
+
+        return {
+            "toplamlar": {k: round(v, 2) for k, v in self.toplamlar.items() if abs(v) >= 0.005},
+            "gunluk_ciro": _yuvarla(self.gunluk_ciro),
+            "yillik_ciro": _yuvarla(self.yillik_ciro),
+            "musteri_fatura_adedi": dict(self.musteri_fatura_adedi),
+            "musteri_ciro": {k: round(v, 2) for k, v in self.musteri_ciro.items() if abs(v) >= 0.005},
+            "eta_tarihleri": {k: dict(v) for k, v in self.eta_tarihleri.items()},
+            "listeler": {
+                ad: sorted(getattr(self, ad))
+                for ad in ["acik_teklifler", "bekleyen_proformalar", "sevk_bekleyenler",
+                           "yoldakiler", "teslim_edilenler", "acik_faturalar"]
+            },
+        }
+
+    def verify(self, frames: dict) -> list:
+        """Artımlı durumu sıfırdan kurulan bir depoyla karşılaştırır; farklı alanları döndürür."""
+        referans = DashboardSummaryStore()
+        referans.sync(frames, self.version)
+        with self._lock:
+            mevcut = self._ozet_degerleri()
+        beklenen = referans._ozet_degerleri()
+        return [alan for alan, deger in beklenen.items() if mevcut.get(alan) != deger]
+
+    def _satirlar(self, tablo: str, hedef: dict) -> list:
+        adet = self._adet[tablo]
+        return [kayit for h, kayit in hedef.items() for _ in range(adet[h])]
+
+    def snapshot(self, today: pd.Timestamp) -> dict:
+        """Bugüne göre kovalanmış, ekrana hazır özet değerleri döndürür."""
+        with self._lock:
+            gun_30 = [today - pd.Timedelta(days=i) for i in range(30)]
+            son_30 = [self.gunluk_ciro[g] for g in gun_30 if g in self.gunluk_ciro]
+            yil = self.yillik_ciro.get(today.year, [0.0, 0])
+
+            vade_kovalari = {"gelmemis": [0.0, 0], "bugun": [0.0, 0], "gecikmis": [0.0, 0]}
+            for kayit in self._satirlar("evrak", self.acik_faturalar):
+                vade_gun = kayit["vade"].normalize()
+                kova = "gelmemis" if vade_gun > today else ("bugun" if vade_gun == today else "gecikmis")
+                vade_kovalari[kova][0] += kayit["kalan"]
+                vade_kovalari[kova][1] += 1
+
+            eta_son = {
+                no: max(sayac) for no, sayac in self.eta_tarihleri.items()
+            }
+            return {
+                "toplam_teklif": self.toplamlar["teklif"],
+                "toplam_proforma": self.toplamlar["proforma"],
+                "toplam_siparis": self.toplamlar["siparis"],
+                "toplam_fatura": self.toplamlar["fatura"],
+                "acik_teklifler": self._satirlar("teklif", self.acik_teklifler),
+                "bekleyen_proformalar": self._satirlar("proforma", self.bekleyen_proformalar),
+                "sevk_bekleyenler": self._satirlar("proforma", self.sevk_bekleyenler),
+                "yoldakiler": self._satirlar("proforma", self.yoldakiler),
+                "teslim_edilenler": self._satirlar("proforma", self.teslim_edilenler),
+                "acik_faturalar": self._satirlar("evrak", self.acik_faturalar),
+                "eta_son": eta_son,
+                "son_30": (sum(v[0] for v in son_30), sum(v[1] for v in son_30)),
+                "yil": (yil[0], yil[1]),
+                "vade_kovalari": vade_kovalari,
+                "aktif_musteri": len(self.musteri_fatura_adedi),
+                "ilk_5_musteri": heapq.nlargest(5, self.musteri_ciro.items(), key=lambda x: x[1]),
+            }
+
+
+@st.cache_resource
+def get_dashboard_store() -> DashboardSummaryStore:
+    return DashboardSummaryStore()
+
+
+def _dashboard_frames() -> dict:
+    return {"teklif": df_teklif, "proforma": df_proforma, "evrak": df_evrak, "eta": df_eta, "kurlar": df_kurlar}
+
+
+def refresh_dashboard_store(force: bool = False) -> DashboardSummaryStore:
+    """Depo güncel veri sürümünde değilse değişen satırları uygular."""
+    store = get_dashboard_store()
+    if force or store.version != DATA_VERSION:
+        store.sync(_dashboard_frames(), DATA_VERSION)
+    return store
+
+
+# ===========================
+# ==== NUMARA SERİLERİ (TEKLİF / PROFORMA)
+# ===========================
+# Son verilen numaralar Excel'in yanında küçük bir JSON dosyasında tutulur.
+# Seri ilk kez kullanıldığında tablodaki en büyük numarayla bir kez eşitlenir;
+# sonrasında numara vermek tek bir kilitli artırma + atomik dosya yazımıdır.
+
+NUMARA_SERISI_DOSYASI = "numara_serileri.json"
+NUMARA_SERILERI = {
+    "teklif": {"onek": "TKF", "tablo": "df_teklif", "kolon": "Teklif No"},
+    "proforma": {"onek": "PRF", "tablo": "df_proforma", "kolon": "Proforma No"},
+}
+
+
+def _seri_numarasi(seri: str, deger):
+    """Seri önekiyle başlayan numaranın sayı kısmı ("PRF-0042" → 42); diğerleri için None."""
+    metin = "" if deger is None or pd.isna(deger) else str(deger).strip()
+    if not metin.upper().startswith(NUMARA_SERILERI[seri]["onek"]):
+        return None
+    eslesme = re.search(r"(\d+)\s*$", metin)
+    return int(eslesme.group(1)) if eslesme else None
+
+
+class SequenceStore:
+    """Oturumlar arası paylaşılan, dosyaya kalıcı yazılan numara sayaçları."""
+
+    def __init__(self, path: str = NUMARA_SERISI_DOSYASI):
+        self.path = path
+        self._lock = threading.Lock()
+        self.son = {}
+        if os.path.exists(path):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    self.son = {k: int(v) for k, v in json.load(f).items()}
+            except Exception:
+                self.son = {}
+
+    def _yaz(self):
+        klasor = os.path.dirname(os.path.abspath(self.path))
+        with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=klasor, delete=False, suffix=".tmp") as f:
+            json.dump(self.son, f, ensure_ascii=False, indent=2)
+            gecici = f.name
+        os.replace(gecici, self.path)
+
+    def migrate(self, seri: str, mevcut_numaralar) -> int:
+        """Seri dosyada yoksa seri önekli mevcut numaraların en büyüğünden başlatır (yalnızca bir kez)."""
+        with self._lock:
+            if seri not in self.son:
+                sayilar = [n for n in (_seri_numarasi(seri, d) for d in mevcut_numaralar) if n is not None]
+                self.son[seri] = max(sayilar, default=0)
+                self._yaz()
+            return self.son[seri]
+
+    def allocate(self, seri: str) -> int:
+        with self._lock:
+            self.son[seri] = self.son.get(seri, 0) + 1
+            self._yaz()
+            return self.son[seri]
+
+    def observe(self, seri: str, numara) -> None:
+        """Elle girilen numara sayacın ilerisindeyse sayacı oraya taşır."""
+        numara = _seri_numarasi(seri, numara)
+        if numara is None:
+            return
+        with self._lock:
+            if numara > self.son.get(seri, 0):
+                self.son[seri] = numara
+                self._yaz()
+
+
+@st.cache_resource
+def get_sequence_store() -> SequenceStore:
+    return SequenceStore()
+
+
+def next_document_no(seri: str) -> str:
+    """Yeni teklif/proforma numarası; oturum başına ayrılır, kayıt edilene kadar tekrar kullanılır."""
+    ayar = NUMARA_SERILERI[seri]
+    anahtar = f"_ayrilan_no_{seri}"
+    if anahtar not in st.session_state:
+        depo = get_sequence_store()
+        frame = globals()[ayar["tablo"]]
+        depo.migrate(seri, frame[ayar["kolon"]] if ayar["kolon"] in frame.columns else [])
+        st.session_state[anahtar] = f"{ayar['onek']}-{depo.allocate(seri):04d}"
+    return st.session_state[anahtar]
+
+
+def consume_document_no(seri: str, kullanilan_no: str) -> None:
+    """Kayıt sonrası ayrılan numarayı bırakır; seri önekli, elle girilen ileri numaraları sayaca işler."""
+    st.session_state.pop(f"_ayrilan_no_{seri}", None)
+    get_sequence_store().observe(seri, kullanilan_no)
+
+
+# ===========================
+# ==== SATIŞ ANALİTİĞİ: ÖNCEDEN TOPLANMIŞ KÜP
+# ===========================
+# Fatura satırları (müşteri × segment × ülke × temsilci × gün/ay) hücrelerine
+# bir kez toplanır; tarih aralığı ve filtre değişiklikleri küp dilimlemesiyle
+# yanıtlanır.
+
+SATIS_KUP_BOYUTLARI = ["Müşteri Adı", "Segment", "Ülke", "Satış Temsilcisi"]
+
+
+def _temiz_metin(seri: pd.Series) -> pd.Series:
+    return seri.astype(object).where(seri.notna(), "").astype(str).str.strip()
+
+
+def prepare_sales_lines(df_evrak: pd.DataFrame, df_musteri: pd.DataFrame) -> pd.DataFrame:
+    """Fatura satırlarını tarih, sayısal tutar ve küp boyutlarıyla hazırlar (tarihe göre sıralı)."""
+    date_col = "Fatura Tarihi" if "Fatura Tarihi" in df_evrak.columns else "Tarih"
+    bos = pd.Series("", index=df_evrak.index, dtype=object)
+
+    lines = pd.DataFrame(index=df_evrak.index)
+    ham_musteri = df_evrak["Müşteri Adı"] if "Müşteri Adı" in df_evrak.columns else pd.Series(np.nan, index=df_evrak.index)
+    lines["Müşteri Adı"] = _temiz_metin(ham_musteri).where(ham_musteri.notna(), "Bilinmeyen Müşteri")
+
+    musteri_kart = pd.DataFrame(columns=["Kategori", "Ülke", "Satış Temsilcisi"])
+    if isinstance(df_musteri, pd.DataFrame) and "Müşteri Adı" in df_musteri.columns and not df_musteri.empty:
+        musteri_kart = (
+            df_musteri.dropna(subset=["Müşteri Adı"])
+            .assign(**{"Müşteri Adı": lambda d: _temiz_metin(d["Müşteri Adı"])})
+            .drop_duplicates("Müşteri Adı")
+            .set_index("Müşteri Adı")
+            .reindex(columns=["Kategori", "Ülke", "Satış Temsilcisi"])
+        )
+
+    lines["Segment"] = lines["Müşteri Adı"].map(musteri_kart["Kategori"]).fillna("Belirtilmemiş")
+    for kolon in ["Ülke", "Satış Temsilcisi"]:
+        kendi = _temiz_metin(df_evrak[kolon]) if kolon in df_evrak.columns else bos
+        karttan = _temiz_metin(lines["Müşteri Adı"].map(musteri_kart[kolon]))
+        lines[kolon] = kendi.where(kendi != "", karttan).replace("", "Belirtilmemiş")
+
+    tarih = pd.to_datetime(df_evrak[date_col], errors="coerce") if date_col in df_evrak.columns else pd.Series(pd.NaT, index=df_evrak.index)
+    lines["Tutar_num"] = amount_in_reporting(df_evrak, tarih_kolon=date_col)
+    lines["Tarih"] = tarih.dt.normalize()
+    for kolon in ["Fatura No", "Tutar"]:
+        lines[f"_{kolon}"] = df_evrak[kolon] if kolon in df_evrak.columns else ""
+    lines[f"_{date_col}"] = tarih
+
+    lines = lines[lines["Tarih"].notna()].sort_values("Tarih", kind="stable").reset_index(drop=True)
+    lines["Ay"] = lines["Tarih"].dt.to_period("M").dt.to_timestamp()
+    lines.attrs["date_col"] = date_col
+    return lines
+
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def build_sales_cube(data_version: str, _df_evrak: pd.DataFrame, _df_musteri: pd.DataFrame) -> dict:
+    """Veri sürümü başına bir kez kurulan satış küpü (salt okunur kullanılmalı)."""
+    lines = prepare_sales_lines(_df_evrak, _df_musteri)
+    gunluk = (
+        lines.groupby(SATIS_KUP_BOYUTLARI + ["Ay", "Tarih"], sort=False)["Tutar_num"]
+        .agg(Tutar="sum", Adet="size")
+        .reset_index()
+        .sort_values("Tarih", kind="stable")
+        .reset_index(drop=True)
+    )
+    aylik = (
+        gunluk.groupby(SATIS_KUP_BOYUTLARI + ["Ay"], sort=False)
+        .agg(Tutar=("Tutar", "sum"), Adet=("Adet", "sum"))
+        .reset_index()
+        .sort_values("Ay", kind="stable")
+        .reset_index(drop=True)
+    )
+    segment_var = (
+        isinstance(_df_musteri, pd.DataFrame)
+        and "Kategori" in _df_musteri.columns
+        and not _df_musteri.empty
+    )
+    return {
+        "lines": lines,
+        "gunluk": gunluk,
+        "aylik": aylik,
+        "date_col": lines.attrs.get("date_col", "Fatura Tarihi"),
+        "segment_var": segment_var,
+        "min": lines["Tarih"].min() if not lines.empty else pd.NaT,
+        "max": lines["Tarih"].max() if not lines.empty else pd.NaT,
+    }
+
+
+def _tarih_dilimi(df: pd.DataFrame, kolon: str, baslangic, bitis_haric) -> pd.DataFrame:
+    """Tarihe göre sıralı tablodan [baslangic, bitis_haric) aralığını ikili aramayla keser."""
+    degerler = df[kolon].to_numpy()
+    i = degerler.searchsorted(np.datetime64(baslangic), side="left")
+    j = degerler.searchsorted(np.datetime64(bitis_haric), side="left")
+    return df.iloc[i:j]
+
+
+def _kup_filtresi(df: pd.DataFrame, segment=None, musteri=None) -> pd.DataFrame:
+    if segment:
+        df = df[df["Segment"] == segment]
+    if musteri:
+        df = df[df["Müşteri Adı"] == musteri]
+    return df
+
+
+def sales_cube_slice(cube: dict, baslangic, bitis, segment=None, musteri=None) -> pd.DataFrame:
+    """[baslangic, bitis] gün aralığındaki küp hücrelerini döndürür.
+
+    Aralığa tam giren aylar aylık küpten, kenardaki kısmi aylar günlük küpten gelir.
+    """
+    baslangic = pd.Timestamp(baslangic).normalize()
+    bitis_haric = pd.Timestamp(bitis).normalize() + pd.Timedelta(days=1)
+    ilk_tam_ay = baslangic if baslangic.day == 1 else baslangic + pd.offsets.MonthBegin(1)
+    son_tam_ay_haric = bitis_haric if bitis_haric.day == 1 else bitis_haric - pd.offsets.MonthBegin(1)
+
+    if ilk_tam_ay >= son_tam_ay_haric:
+        parcalar = [_tarih_dilimi(cube["gunluk"], "Tarih", baslangic, bitis_haric)]
+    else:
+        parcalar = [
+            _tarih_dilimi(cube["gunluk"], "Tarih", baslangic, ilk_tam_ay),
+            _tarih_dilimi(cube["aylik"], "Ay", ilk_tam_ay, son_tam_ay_haric),
+            _tarih_dilimi(cube["gunluk"], "Tarih", son_tam_ay_haric, bitis_haric),
+        ]
+    kolonlar = SATIS_KUP_BOYUTLARI + ["Ay", "Tutar", "Adet"]
+    parcalar = [_kup_filtresi(p[kolonlar], segment, musteri) for p in parcalar if not p.empty]
+    if not parcalar:
+        return pd.DataFrame(columns=kolonlar)
+    return pd.concat(parcalar, ignore_index=True)
+
+
+def sales_cube_lines(cube: dict, baslangic, bitis, segment=None, musteri=None) -> pd.DataFrame:
+    """Detay tablosu için aralıktaki fatura satırlarını döndürür."""
+    baslangic = pd.Timestamp(baslangic).normalize()
+    bitis_haric = pd.Timestamp(bitis).normalize() + pd.Timedelta(days=1)
+    return _kup_filtresi(_tarih_dilimi(cube["lines"], "Tarih", baslangic, bitis_haric), segment, musteri)
+
+
+# ===========================
+# ==== SATIŞ ANALİTİĞİ: ZAMAN SERİSİ MOTORU
+# ===========================
+
+ZAMAN_SERISI_FREKANSLARI = {
+    # frekans: (3 aylık pencere, 12 aylık pencere, geçen yıl gecikmesi) dönem sayısı olarak
+    "W": (13, 52, 52),
+    "M": (3, 12, 12),
+    "Q": (1, 4, 4),
+}
+
+
+def revenue_timeseries_from_lines(lines: pd.DataFrame, freq: str = "M", by: str = None) -> pd.DataFrame:
+    """Hazırlanmış fatura satırlarından dönemsel ciro, kayan toplamlar ve YoY büyüme üretir."""
+    if freq not in ZAMAN_SERISI_FREKANSLARI:
+        raise ValueError(f"Desteklenmeyen frekans: {freq}")
+    pencere_3, pencere_12, yil_gecikmesi = ZAMAN_SERISI_FREKANSLARI[freq]
+    anahtar = by or "Toplam"
+    kolonlar = ["Dönem"] + ([by] if by else []) + ["Ciro", "Son 3 Ay", "Son 12 Ay", "Geçen Yıl", "YoY (%)"]
+    if lines.empty:
+        return pd.DataFrame(columns=kolonlar)
+
+    donem = lines["Tarih"].dt.to_period(freq)
+    grup = lines[by] if by else pd.Series("Toplam", index=lines.index)
+    genis = (
+        lines["Tutar_num"]
+        .groupby([donem.rename("Dönem"), grup.rename(anahtar)])
+        .sum()
+        .unstack(anahtar, fill_value=0.0)
+    )
+    genis = genis.reindex(pd.period_range(genis.index.min(), genis.index.max(), freq=freq), fill_value=0.0)
+
+    gecen_yil = genis.shift(yil_gecikmesi)
+    olcumler = {
+        "Ciro": genis,
+        "Son 3 Ay": genis.rolling(pencere_3, min_periods=1).sum(),
+        "Son 12 Ay": genis.rolling(pencere_12, min_periods=1).sum(),
+        "Geçen Yıl": gecen_yil,
+        "YoY (%)": ((genis / gecen_yil.where(gecen_yil > 0)) - 1) * 100,
+    }
+    uzun = pd.concat({ad: tablo.stack() for ad, tablo in olcumler.items()}, axis=1)
+    uzun.index.names = ["Dönem", anahtar]
+    uzun = uzun.reset_index()
+    uzun["Dönem"] = uzun["Dönem"].dt.start_time
+    return uzun[kolonlar].sort_values(["Dönem"] + ([by] if by else []), kind="stable").reset_index(drop=True)
+
+
+def compute_revenue_timeseries(df_evrak: pd.DataFrame, df_musteri: pd.DataFrame = None,
+                               freq: str = "M", by: str = None) -> pd.DataFrame:
+    """Streamlit'ten bağımsız çağrılabilir zaman serisi hesabı.
+
+    freq: "W", "M" veya "Q"; by: None, "Müşteri Adı", "Segment", "Ülke" ya da "Satış Temsilcisi".
+    """
+    lines = prepare_sales_lines(df_evrak, df_musteri if df_musteri is not None else pd.DataFrame())
+    return revenue_timeseries_from_lines(lines, freq=freq, by=by)
+
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def get_revenue_timeseries(data_version: str, freq: str, by: str, _lines: pd.DataFrame) -> pd.DataFrame:
+    return revenue_timeseries_from_lines(_lines, freq=freq, by=by)
+
+
+# ===========================
+# ==== GRAFİK ÖNBELLEĞİ
+# ===========================
+# Grafikler girdi özetinin hash'i ile önbelleğe alınmış PNG/SVG baytları olarak
+# çizilir; matplotlib yalnızca gerçekten bir grafik çizileceğinde yüklenir.
+
+PASTA_MAX_DILIM = 10
+
+
+def group_long_tail(summary: pd.DataFrame, label_col: str, value_col: str,
+                    max_dilim: int = PASTA_MAX_DILIM, diger_etiketi: str = "Diğer") -> pd.DataFrame:
+    """En büyük (max_dilim - 1) kalemi tutar, kalanları tek bir 'Diğer' satırında toplar."""
+    summary = summary[summary[value_col] > 0].sort_values(value_col, ascending=False)
+    if len(summary) <= max_dilim:
+        return summary.reset_index(drop=True)
+    bas = summary.iloc[: max_dilim - 1]
+    kuyruk = summary.iloc[max_dilim - 1:]
+    diger = pd.DataFrame({label_col: [f"{diger_etiketi} ({len(kuyruk)})"], value_col: [float(kuyruk[value_col].sum())]})
+    return pd.concat([bas[[label_col, value_col]], diger], ignore_index=True)
+
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def render_pie_chart(etiketler: tuple, degerler: tuple, baslik: str, lejant_basligi: str, fmt: str = "png") -> bytes:
+    """Pasta grafiğini çizip PNG/SVG baytları olarak döndürür (girdiye göre önbellekli)."""
+    from matplotlib import colormaps
+    from matplotlib.figure import Figure
+
+    toplam = float(sum(degerler)) or 1.0
+    fig = Figure(figsize=(8, 6))
+    ax = fig.subplots()
+    colors = colormaps["tab20"](np.linspace(0, 1, len(degerler)))
+    wedges, _, autotexts = ax.pie(
+        degerler,
+        autopct=lambda pct: f"%{pct:.1f}" if pct > 0 else "",
+        startangle=0,
+        colors=colors,
+        textprops={"color": "white", "weight": "bold"},
+    )
+    for autotext in autotexts:
+        autotext.set_fontsize(10)
+
+    legend_labels = [f"{label} (%{deger / toplam * 100:.1f})" for label, deger in zip(etiketler, degerler)]
+    ax.legend(
+        wedges,
+        legend_labels,
+        title=lejant_basligi,
+        loc="center left",
+        bbox_to_anchor=(1, 0.5),
+        fontsize=10,
+        title_fontsize=11,
+    )
+    ax.set_title(baslik, color="#185a9d", fontsize=14)
+    ax.axis("equal")
+
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format=fmt, bbox_inches="tight", dpi=110)
+    return buffer.getvalue()
+
+
+# ===========================
+# ==== TAHSİLAT: ALACAK YAŞLANDIRMA MOTORU
+# ===========================
+
+YASLANDIRMA_SINIRLARI = (30, 60, 90)
+DSO_PENCERE_GUN = 90
+
+
+def yaslandirma_etiketleri(sinirlar=YASLANDIRMA_SINIRLARI) -> list:
+    """(30, 60, 90) -> ['Vadesi Gelmemiş', '0-30', '31-60', '61-90', '90+']"""
+    etiketler = ["Vadesi Gelmemiş"]
+    alt = 0
+    for ust in sinirlar:
+        etiketler.append(f"{alt}-{ust}")
+        alt = ust + 1
+    etiketler.append(f"{sinirlar[-1]}+")
+    return etiketler
+
+
+def _fatura_tutari(df: pd.DataFrame) -> pd.Series:
+    """Kayıtlı Tutar_num, yoksa Tutar kolonunun sayısal karşılığı."""
+    tutar_num = pd.to_numeric(df["Tutar_num"], errors="coerce") if "Tutar_num" in df.columns else pd.Series(np.nan, index=df.index)
+    if tutar_num.isna().any() and "Tutar" in df.columns:
+        tutar_num = tutar_num.fillna(smart_to_num_series(df["Tutar"]))
+    return tutar_num.fillna(0.0).astype(float)
+
+
+def _dso(acik_bakiye, ciro, pencere_gun=DSO_PENCERE_GUN):
+    ciro = np.asarray(ciro, dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(ciro > 0, np.asarray(acik_bakiye, dtype=float) / ciro * pencere_gun, np.nan)
+
+
+def compute_receivables_aging(df_evrak: pd.DataFrame, today=None,
+                              sinirlar=YASLANDIRMA_SINIRLARI, trend_ay: int = 12) -> dict:
+    """Açık bakiyeleri vade gecikmesine göre kovalar; müşteri/temsilci kırılımı, DSO ve aylık trend üretir.
+
+    DSO = açık bakiye / son 90 günün fatura cirosu × 90.
+    Trendde ödeme tarihleri tutulmadığından ödenen kısımların vade tarihinde (vadesi gelmemişse
+    bugün) tahsil edildiği varsayılır.
+    """
+    today = pd.Timestamp(today or pd.Timestamp.today()).normalize()
+    etiketler = yaslandirma_etiketleri(sinirlar)
+
+    satirlar = pd.DataFrame(index=df_evrak.index)
+    for kolon in ["Müşteri Adı", "Ülke", "Satış Temsilcisi", "Fatura No"]:
+        satirlar[kolon] = df_evrak[kolon] if kolon in df_evrak.columns else ""
+    satirlar["Fatura Tarihi"] = pd.to_datetime(df_evrak["Fatura Tarihi"], errors="coerce") if "Fatura Tarihi" in df_evrak.columns else pd.NaT
+    satirlar["Vade Tarihi"] = pd.to_datetime(df_evrak["Vade Tarihi"], errors="coerce") if "Vade Tarihi" in df_evrak.columns else pd.NaT
+    satirlar["Tutar_num"] = _fatura_tutari(df_evrak)
+    satirlar["Ödenen Tutar"] = pd.to_numeric(df_evrak["Ödenen Tutar"], errors="coerce").fillna(0.0) if "Ödenen Tutar" in df_evrak.columns else 0.0
+    satirlar["Ödendi"] = df_evrak["Ödendi"].where(df_evrak["Ödendi"].notna(), False).astype(bool) if "Ödendi" in df_evrak.columns else False
+    satirlar["Kalan Bakiye"] = (satirlar["Tutar_num"] - satirlar["Ödenen Tutar"]).clip(lower=0.0)
+    # Toplamlar raporlama para biriminde (fatura tarihindeki kur, yoksa vade tarihindeki)
+    satirlar["Para Birimi"] = (
+        df_evrak["Para Birimi"] if "Para Birimi" in df_evrak.columns
+        else detect_currency_series(df_evrak.get("Tutar", pd.Series("", index=df_evrak.index)))
+    )
+    kur = fx_factor(satirlar["Para Birimi"], satirlar["Fatura Tarihi"].fillna(satirlar["Vade Tarihi"]))
+    satirlar["Tutar_rapor"] = satirlar["Tutar_num"] * kur
+    satirlar["Ödenen_rapor"] = satirlar["Ödenen Tutar"] * kur
+    satirlar["Kalan_rapor"] = satirlar["Kalan Bakiye"] * kur
+    satirlar["Kalan Gün"] = (satirlar["Vade Tarihi"] - today).dt.days
+    satirlar["Gecikme Gün"] = -satirlar["Kalan Gün"]
+    satirlar["Kova"] = pd.cut(
+        satirlar["Gecikme Gün"],
+        bins=[-np.inf, -1, *sinirlar, np.inf],
+        labels=etiketler,
+    )
+
+    vadeli = satirlar[satirlar["Vade Tarihi"].notna()]
+    acik = vadeli[vadeli["Kalan Bakiye"] > 0.01]
+
+    kova_ozet = (
+        acik.groupby("Kova", observed=False)["Kalan_rapor"]
+        .agg(Bakiye="sum", Fatura="size")
+        .reindex(etiketler, fill_value=0)
+    )
+
+    # Son 90 günün cirosu (DSO paydası)
+    fatura_tarihi = satirlar["Fatura Tarihi"]
+    pencere = fatura_tarihi.between(today - pd.Timedelta(days=DSO_PENCERE_GUN - 1), today)
+    son_ciro = satirlar.loc[pencere]
+
+    def _kirilim(kolon: str) -> pd.DataFrame:
+        anahtar = acik[kolon].fillna("").astype(str).str.strip().replace("", "Belirtilmemiş")
+        tablo = (
+            acik.assign(**{kolon: anahtar})
+            .pivot_table(index=kolon, columns="Kova", values="Kalan_rapor", aggfunc="sum", fill_value=0.0, observed=False)
+            .reindex(columns=etiketler, fill_value=0.0)
+        )
+        tablo.columns = list(tablo.columns)
+        tablo["Toplam"] = tablo[etiketler].sum(axis=1)
+        agirlik = (acik["Gecikme Gün"].clip(lower=0) * acik["Kalan_rapor"]).groupby(anahtar).sum()
+        tablo["Ağırlıklı Gecikme (gün)"] = (agirlik / tablo["Toplam"].where(tablo["Toplam"] > 0)).reindex(tablo.index)
+        ciro_anahtar = son_ciro[kolon].fillna("").astype(str).str.strip().replace("", "Belirtilmemiş")
+        ciro = son_ciro["Tutar_rapor"].groupby(ciro_anahtar).sum().reindex(tablo.index, fill_value=0.0)
+        tablo["DSO (gün)"] = _dso(tablo["Toplam"], ciro)
+        return tablo.sort_values("Toplam", ascending=False)
+
+    toplam_acik = float(acik["Kalan_rapor"].sum())
+    dso = float(_dso(toplam_acik, son_ciro["Tutar_rapor"].sum()))
+
+    # ---- Ay sonu trendi (vektörel: fatura × ay sonu matrisi) ----
+    ay_sonlari = pd.date_range(end=today, periods=trend_ay, freq="MS") + pd.offsets.MonthEnd(0)
+    ay_sonlari = ay_sonlari.where(ay_sonlari <= today, today)
+    gecerli = vadeli[vadeli["Fatura Tarihi"].notna()]
+    f_t = gecerli["Fatura Tarihi"].to_numpy()[:, None]
+    v_t = gecerli["Vade Tarihi"].to_numpy()[:, None]
+    tahsil_t = np.minimum(v_t, today.to_datetime64())
+    m = ay_sonlari.to_numpy()[None, :]
+    kesilmis = f_t <= m
+    acik_kisim = gecerli["Kalan_rapor"].to_numpy()[:, None]
+    odenen_kisim = np.minimum(gecerli["Ödenen_rapor"].to_numpy(), gecerli["Tutar_rapor"].to_numpy()).clip(min=0)[:, None]
+    alacak = (kesilmis * acik_kisim).sum(axis=0) + (kesilmis * (tahsil_t > m) * odenen_kisim).sum(axis=0)
+    gecikmis = (kesilmis * (v_t < m) * acik_kisim).sum(axis=0)
+    tum = satirlar[fatura_tarihi.notna()]
+    tum_f_t = tum["Fatura Tarihi"].to_numpy()[:, None]
+    pencere_ciro = ((tum_f_t > m - np.timedelta64(DSO_PENCERE_GUN, "D")) & (tum_f_t <= m)) * tum["Tutar_rapor"].to_numpy()[:, None]
+    trend = pd.DataFrame(
+        {
+            "Açık Alacak": alacak,
+            "Gecikmiş": gecikmis,
+            "DSO (gün)": _dso(alacak, pencere_ciro.sum(axis=0)),
+        },
+        index=pd.Index(ay_sonlari, name="Ay Sonu"),
+    )
+
+    return {
+        "satirlar": vadeli,
+        "kovalar": kova_ozet,
+        "musteri": _kirilim("Müşteri Adı"),
+        "temsilci": _kirilim("Satış Temsilcisi"),
+        "toplam_acik": toplam_acik,
+        "dso": dso,
+        "trend": trend,
+        "etiketler": etiketler,
+    }
+
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def get_receivables_aging(data_version: str, today: pd.Timestamp, sinirlar: tuple, _df_evrak: pd.DataFrame) -> dict:
+    return compute_receivables_aging(_df_evrak, today=today, sinirlar=sinirlar)
+
+
+# ===========================
+# ==== TAHSİLAT: NAKİT GİRİŞ TAHMİNİ
+# ===========================
+
+NAKIT_KAYNAKLARI = ("Açık Fatura", "Sevkli Sipariş")
+
+
+def _normal_anahtar(seri: pd.Series) -> pd.Series:
+    return _anahtar_metni(seri)
+
+
+def build_cash_events(df_evrak: pd.DataFrame, df_proforma: pd.DataFrame, df_musteri: pd.DataFrame,
+                      today=None) -> pd.DataFrame:
+    """Beklenen tahsilat olaylarını tek tabloda toplar.
+
+    - Açık faturalar: kalan bakiye, vade tarihinde.
+    - Sevk edilmiş fakat faturası kesilmemiş siparişler: tutar, sevk tarihi + müşterinin Vade (Gün) süresinde.
+    """
+    today = pd.Timestamp(today or pd.Timestamp.today()).normalize()
+    kolonlar = ["Kaynak", "Müşteri Adı", "Ülke", "Satış Temsilcisi", "Belge No", "Beklenen Tarih", "Tutar"]
+
+    faturalar = compute_receivables_aging(df_evrak, today=today)["satirlar"]
+    faturalar = faturalar[faturalar["Kalan Bakiye"] > 0.01]
+    fatura_olaylari = pd.DataFrame({
+        "Kaynak": NAKIT_KAYNAKLARI[0],
+        "Müşteri Adı": faturalar["Müşteri Adı"],
+        "Ülke": faturalar["Ülke"],
+        "Satış Temsilcisi": faturalar["Satış Temsilcisi"],
+        "Belge No": faturalar["Fatura No"],
+        "Beklenen Tarih": faturalar["Vade Tarihi"],
+        "Tutar": faturalar["Kalan_rapor"],
+    })
+
+    siparis_olaylari = pd.DataFrame(columns=kolonlar)
+    if isinstance(df_proforma, pd.DataFrame) and not df_proforma.empty:
+        pf = df_proforma.reindex(columns=[
+            "Müşteri Adı", "Ülke", "Satış Temsilcisi", "Proforma No", "Tarih", "Sevk Tarihi",
+            "Tutar", "Para Birimi", "Durum", "Sevk Durumu", "Vade (gün)",
+        ])
+        sevkli = (
+            _temiz_metin(pf["Sevk Durumu"]).isin(["Sevkedildi", "Ulaşıldı"])
+            & _temiz_metin(pf["Durum"]).eq("Siparişe Dönüştü")
+            & _temiz_metin(pf["Proforma No"]).ne("")
+        )
+        pf = pf[sevkli]
+
+        # Faturası kesilmiş (müşteri, proforma) çiftlerini dışla
+        pf = orders_missing_downstream(pf, df_evrak)
+
+        if not pf.empty:
+            musteri_vade = pd.Series(dtype=float)
+            if isinstance(df_musteri, pd.DataFrame) and {"Müşteri Adı", "Vade (Gün)"}.issubset(df_musteri.columns):
+                musteri_vade = (
+                    df_musteri.assign(_ad=_temiz_metin(df_musteri["Müşteri Adı"]))
+                    .drop_duplicates("_ad")
+                    .set_index("_ad")["Vade (Gün)"]
+                    .pipe(pd.to_numeric, errors="coerce")
+                )
+            vade_gun = (
+                _temiz_metin(pf["Müşteri Adı"]).map(musteri_vade)
+                .fillna(pd.to_numeric(pf["Vade (gün)"], errors="coerce"))
+                .fillna(0)
+                .clip(lower=0)
+            )
+            baz_tarih = pd.to_datetime(pf["Sevk Tarihi"], errors="coerce").fillna(
+                pd.to_datetime(pf["Tarih"], errors="coerce")
+            ).fillna(today)
+            siparis_olaylari = pd.DataFrame({
+                "Kaynak": NAKIT_KAYNAKLARI[1],
+                "Müşteri Adı": pf["Müşteri Adı"],
+                "Ülke": pf["Ülke"],
+                "Satış Temsilcisi": pf["Satış Temsilcisi"],
+                "Belge No": pf["Proforma No"],
+                "Beklenen Tarih": baz_tarih.dt.normalize() + pd.to_timedelta(vade_gun, unit="D"),
+                "Tutar": smart_to_num_series(pf["Tutar"]) * fx_factor(pf["Para Birimi"], pf["Tarih"]),
+            })
+
+    parcalar = [p for p in (fatura_olaylari, siparis_olaylari) if not p.empty]
+    if not parcalar:
+        return pd.DataFrame(columns=kolonlar)
+    olaylar = pd.concat(parcalar, ignore_index=True)
+    for kolon in ["Müşteri Adı", "Ülke", "Satış Temsilcisi", "Belge No"]:
+        olaylar[kolon] = _temiz_metin(olaylar[kolon])
+    olaylar["Beklenen Tarih"] = pd.to_datetime(olaylar["Beklenen Tarih"], errors="coerce")
+    olaylar["Tutar"] = olaylar["Tutar"].astype(float)
+    return olaylar[olaylar["Tutar"] > 0].reset_index(drop=True)
+
+
+def forecast_cash_in(olaylar: pd.DataFrame, today=None, freq: str = "W", gecikme_gun: int = 0,
+                     gecikmis_politika: str = "bugun", siparis_orani: float = 1.0,
+                     ufuk_gun: int = 180) -> pd.DataFrame:
+    """Senaryo varsayımlarıyla olayları dönem bazında (hafta / ay) toplar.
+
+    gecikme_gun: tüm beklenen tarihlere eklenen gecikme.
+    gecikmis_politika: vadesi geçmiş tutarlar için "bugun" (bugün tahsil), "haric" (dahil etme).
+    siparis_orani: faturası kesilmemiş siparişlerin tahsil edilme oranı (0-1).
+    """
+    today = pd.Timestamp(today or pd.Timestamp.today()).normalize()
+    if olaylar.empty:
+        return pd.DataFrame(columns=["Dönem", *NAKIT_KAYNAKLARI, "Toplam", "Kümülatif"])
+
+    tarih = olaylar["Beklenen Tarih"].fillna(today)
+    gecikmis = tarih < today
+    if gecikmis_politika == "haric":
+        olaylar, tarih = olaylar[~gecikmis], tarih[~gecikmis]
+    else:
+        tarih = tarih.where(~gecikmis, today)
+    tarih = tarih + pd.Timedelta(days=int(gecikme_gun))
+
+    tutar = olaylar["Tutar"].where(olaylar["Kaynak"] != NAKIT_KAYNAKLARI[1], olaylar["Tutar"] * float(siparis_orani))
+    ufuk = tarih <= today + pd.Timedelta(days=int(ufuk_gun) + int(gecikme_gun))
+    donem = tarih[ufuk].dt.to_period(freq).dt.start_time.rename("Dönem")
+
+    tablo = (
+        tutar[ufuk]
+        .groupby([donem, olaylar.loc[ufuk, "Kaynak"]])
+        .sum()
+        .unstack("Kaynak", fill_value=0.0)
+        .reindex(columns=list(NAKIT_KAYNAKLARI), fill_value=0.0)
+    )
+    if not tablo.empty:
+        tablo = tablo.reindex(
+            pd.period_range(tablo.index.min(), tablo.index.max(), freq=freq).start_time, fill_value=0.0
+        )
+    tablo.columns = list(tablo.columns)
+    tablo["Toplam"] = tablo[list(NAKIT_KAYNAKLARI)].sum(axis=1)
+    tablo["Kümülatif"] = tablo["Toplam"].cumsum()
+    tablo.index.name = "Dönem"
+    return tablo.reset_index()
+
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def get_cash_events(data_version: str, today: pd.Timestamp, _df_evrak: pd.DataFrame,
+                    _df_proforma: pd.DataFrame, _df_musteri: pd.DataFrame) -> pd.DataFrame:
+    return build_cash_events(_df_evrak, _df_proforma, _df_musteri, today=today)
+
+
+# ===========================
+# ==== SATIŞ HUNİSİ: TEKLİF → PROFORMA → SİPARİŞ → FATURA
+# ===========================
+# Aşamalar müşteri ve belge numarası anahtarlarıyla hash indeksler üzerinden
+# bağlanır: teklif → aynı müşterinin teklif tarihinden sonraki ilk proforması,
+# proforma → (müşteri, proforma no) anahtarıyla ilk faturası.
+
+HUNI_ASAMALARI = ["Teklif", "Proforma", "Sipariş", "Fatura"]
+TEKLIF_ESLESME_GUN = 180
+SIPARIS_DURUMLARI = ("Siparişe Dönüştü", "Faturası Kesildi")
+
+
+def _musteri_karti(df_musteri: pd.DataFrame) -> pd.DataFrame:
+    if not isinstance(df_musteri, pd.DataFrame) or "Müşteri Adı" not in df_musteri.columns or df_musteri.empty:
+        return pd.DataFrame(columns=["Ülke", "Satış Temsilcisi"])
+    return (
+        df_musteri.assign(_m=_normal_anahtar(df_musteri["Müşteri Adı"]))
+        .drop_duplicates("_m")
+        .set_index("_m")
+        .reindex(columns=["Ülke", "Satış Temsilcisi"])
+    )
+
+
+def _huni_boyutlari(frame: pd.DataFrame, anahtar: pd.Series, kart: pd.DataFrame) -> dict:
+    """Kaydın kendi Ülke/Temsilci değeri, yoksa müşteri kartındaki değer."""
+    boyutlar = {}
+    for kolon in ["Ülke", "Satış Temsilcisi"]:
+        kendi = _temiz_metin(frame[kolon]) if kolon in frame.columns else pd.Series("", index=frame.index)
+        karttan = _temiz_metin(anahtar.map(kart[kolon]))
+        boyutlar[kolon] = kendi.where(kendi != "", karttan).replace("", "Belirtilmemiş")
+    return boyutlar
+
+
+def build_sales_funnel(df_teklif: pd.DataFrame, df_proforma: pd.DataFrame, df_evrak: pd.DataFrame,
+                       df_musteri: pd.DataFrame, eslesme_gun: int = TEKLIF_ESLESME_GUN) -> dict:
+    """Teklif ve proforma seviyesinde bağlanmış huni tablolarını üretir.
+
+    teklifler: her teklif için eşleşen proforma (eslesme_gun içinde) ve süre.
+    proformalar: sipariş / fatura bayrakları, sevk ve fatura süreleri.
+    """
+    kart = _musteri_karti(df_musteri)
+
+    pf = df_proforma.reindex(columns=[
+        "Müşteri Adı", "Ülke", "Satış Temsilcisi", "Proforma No", "Tarih", "Tutar", "Para Birimi",
+        "Durum", "Sevk Durumu", "Sevk Tarihi",
+    ]) if isinstance(df_proforma, pd.DataFrame) else pd.DataFrame()
+    pf_m = _normal_anahtar(pf["Müşteri Adı"]) if not pf.empty else pd.Series(dtype=str)
+    pf_p = _normal_anahtar(pf["Proforma No"]) if not pf.empty else pd.Series(dtype=str)
+    pf_tarih = pd.to_datetime(pf["Tarih"], errors="coerce").dt.normalize() if not pf.empty else pd.Series(dtype="datetime64[ns]")
+
+    # (müşteri, proforma no) -> ilk fatura tarihi
+    if isinstance(df_evrak, pd.DataFrame) and not df_evrak.empty and "Proforma No" in df_evrak.columns:
+        ev = df_evrak.reindex(columns=["Müşteri Adı", "Proforma No", "Fatura Tarihi"])
+        fatura_indeksi = (
+            pd.DataFrame({
+                "_m": _normal_anahtar(ev["Müşteri Adı"]),
+                "_p": _normal_anahtar(ev["Proforma No"]),
+                "_t": pd.to_datetime(ev["Fatura Tarihi"], errors="coerce").dt.normalize(),
+            })
+            .query("_p != ''")
+            .groupby(["_m", "_p"])["_t"]
+            .agg(lambda t: t.min() if t.notna().any() else pd.NaT)
+        )
+    else:
+        fatura_indeksi = pd.Series(dtype="datetime64[ns]", index=pd.MultiIndex.from_arrays([[], []], names=["_m", "_p"]))
+
+    pf_anahtar = pd.MultiIndex.from_arrays([pf_m, pf_p], names=["_m", "_p"])
+    faturali = pd.Series(pf_anahtar.isin(fatura_indeksi.index) & (pf_p != "").to_numpy(), index=pf.index)
+    fatura_tarihi = pd.Series(
+        pd.to_datetime(fatura_indeksi.reindex(pf_anahtar).to_numpy()), index=pf.index
+    ).where(faturali)
+
+    sevk_durumu = _temiz_metin(pf["Sevk Durumu"]) if not pf.empty else pd.Series(dtype=str)
+    durum = _temiz_metin(pf["Durum"]) if not pf.empty else pd.Series(dtype=str)
+    sevk_tarihi = pd.to_datetime(pf["Sevk Tarihi"], errors="coerce").dt.normalize() if not pf.empty else pd.Series(dtype="datetime64[ns]")
+    siparis = durum.isin(SIPARIS_DURUMLARI) | sevk_durumu.isin(["Sevkedildi", "Ulaşıldı"]) | faturali
+
+    proformalar = pd.DataFrame({
+        "Müşteri Adı": _temiz_metin(pf["Müşteri Adı"]) if not pf.empty else pd.Series(dtype=str),
+        **_huni_boyutlari(pf, pf_m, kart),
+        "Proforma No": _temiz_metin(pf["Proforma No"]) if not pf.empty else pd.Series(dtype=str),
+        "Tarih": pf_tarih,
+        "Tutar": amount_in_reporting(pf) if not pf.empty else pd.Series(dtype=float),
+        "İptal": durum.eq("İptal"),
+        "Sipariş": siparis,
+        "Fatura": faturali,
+        "Sevk Tarihi": sevk_tarihi,
+        "Fatura Tarihi": fatura_tarihi,
+    }, index=pf.index)
+    proformalar["Proforma→Sevk (gün)"] = (proformalar["Sevk Tarihi"] - proformalar["Tarih"]).dt.days.where(siparis)
+    proformalar["Proforma→Fatura (gün)"] = (proformalar["Fatura Tarihi"] - proformalar["Tarih"]).dt.days
+    proformalar["_m"] = pf_m
+
+    # Teklif -> aynı müşterinin teklif tarihinde veya sonrasındaki ilk proforması
+    tk = df_teklif.reindex(columns=["Müşteri Adı", "Ülke", "Satış Temsilcisi", "Teklif No", "Tarih", "Tutar", "Para Birimi", "Durum"]) \
+        if isinstance(df_teklif, pd.DataFrame) else pd.DataFrame()
+    tk_m = _normal_anahtar(tk["Müşteri Adı"]) if not tk.empty else pd.Series(dtype=str)
+    teklifler = pd.DataFrame({
+        "Müşteri Adı": _temiz_metin(tk["Müşteri Adı"]) if not tk.empty else pd.Series(dtype=str),
+        **_huni_boyutlari(tk, tk_m, kart),
+        "Teklif No": _temiz_metin(tk["Teklif No"]) if not tk.empty else pd.Series(dtype=str),
+        "Tarih": pd.to_datetime(tk["Tarih"], errors="coerce").dt.normalize() if not tk.empty else pd.Series(dtype="datetime64[ns]"),
+        "Tutar": amount_in_reporting(tk) if not tk.empty else pd.Series(dtype=float),
+        "Durum": _temiz_metin(tk["Durum"]) if not tk.empty else pd.Series(dtype=str),
+        "_m": tk_m,
+    }, index=tk.index)
+    teklifler["Proforma No"] = ""
+    teklifler["Proforma Tarihi"] = pd.NaT
+
+    aday_teklif = teklifler[teklifler["Tarih"].notna()].reset_index().sort_values("Tarih", kind="stable")
+    aday_pf = (
+        proformalar.loc[proformalar["Tarih"].notna() & ~proformalar["İptal"], ["_m", "Tarih", "Proforma No"]]
+        .rename(columns={"Tarih": "Proforma Tarihi", "Proforma No": "_pno"})
+        .sort_values("Proforma Tarihi", kind="stable")
+    )
+    if not aday_teklif.empty and not aday_pf.empty:
+        eslesen = pd.merge_asof(
+            aday_teklif[["index", "_m", "Tarih"]],
+            aday_pf,
+            left_on="Tarih",
+            right_on="Proforma Tarihi",
+            by="_m",
+            direction="forward",
+            tolerance=pd.Timedelta(days=int(eslesme_gun)),
+        ).dropna(subset=["Proforma Tarihi"]).set_index("index")
+        teklifler.loc[eslesen.index, "Proforma No"] = eslesen["_pno"]
+        teklifler.loc[eslesen.index, "Proforma Tarihi"] = eslesen["Proforma Tarihi"]
+    teklifler["Proforma Tarihi"] = pd.to_datetime(teklifler["Proforma Tarihi"])
+    teklifler["Proforma"] = teklifler["Proforma Tarihi"].notna()
+    teklifler["Teklif→Proforma (gün)"] = (teklifler["Proforma Tarihi"] - teklifler["Tarih"]).dt.days
+
+    return {
+        "teklifler": teklifler.drop(columns="_m").reset_index(drop=True),
+        "proformalar": proformalar.drop(columns="_m").reset_index(drop=True),
+    }
+
+
+def sales_funnel_summary(huni: dict, by: str = None, baslangic=None, bitis=None) -> pd.DataFrame:
+    """Aşama adetleri, dönüşüm oranları, kaçak (ilerlemeyen) adet/tutar ve medyan süreler.
+
+    by: None, "Ülke" ya da "Satış Temsilcisi". Tarih aralığı belgenin kendi tarihine uygulanır.
+    """
+    teklifler, proformalar = huni["teklifler"], huni["proformalar"]
+    if baslangic is not None and bitis is not None:
+        b1 = pd.Timestamp(baslangic).normalize()
+        b2 = pd.Timestamp(bitis).normalize()
+        teklifler = teklifler[teklifler["Tarih"].between(b1, b2)]
+        proformalar = proformalar[proformalar["Tarih"].between(b1, b2)]
+
+    anahtar = by or "Toplam"
+    tk_grup = teklifler[by] if by else pd.Series("Toplam", index=teklifler.index)
+    pf_grup = proformalar[by] if by else pd.Series("Toplam", index=proformalar.index)
+    aktif = proformalar[~proformalar["İptal"]]
+    aktif_grup = pf_grup[aktif.index]
+    siparisler = aktif[aktif["Sipariş"]]
+    sip_grup = aktif_grup[siparisler.index]
+
+    tablo = pd.concat({
+        "Teklif": teklifler.groupby(tk_grup).size(),
+        "Teklif→Proforma": teklifler["Proforma"].groupby(tk_grup).sum(),
+        "Proforma": aktif.groupby(aktif_grup).size(),
+        "İptal": proformalar["İptal"].groupby(pf_grup).sum(),
+        "Sipariş": aktif["Sipariş"].groupby(aktif_grup).sum(),
+        "Fatura": siparisler["Fatura"].groupby(sip_grup).sum(),
+        "Teklif Tutarı": teklifler["Tutar"].groupby(tk_grup).sum(),
+        "Kaçak Teklif Tutarı": teklifler["Tutar"].where(~teklifler["Proforma"], 0.0).groupby(tk_grup).sum(),
+        "Kaçak Proforma Tutarı": aktif["Tutar"].where(~aktif["Sipariş"], 0.0).groupby(aktif_grup).sum(),
+        "Faturasız Sipariş Tutarı": siparisler["Tutar"].where(~siparisler["Fatura"], 0.0).groupby(sip_grup).sum(),
+        "Teklif→Proforma (gün)": teklifler["Teklif→Proforma (gün)"].groupby(tk_grup).median(),
+        "Proforma→Sevk (gün)": siparisler["Proforma→Sevk (gün)"].groupby(sip_grup).median(),
+        "Proforma→Fatura (gün)": siparisler["Proforma→Fatura (gün)"].groupby(sip_grup).median(),
+    }, axis=1)
+    adetler = ["Teklif", "Teklif→Proforma", "Proforma", "İptal", "Sipariş", "Fatura"]
+    tutarlar = ["Teklif Tutarı", "Kaçak Teklif Tutarı", "Kaçak Proforma Tutarı", "Faturasız Sipariş Tutarı"]
+    tablo[adetler] = tablo[adetler].fillna(0).astype(int)
+    tablo[tutarlar] = tablo[tutarlar].fillna(0.0)
+
+    def _oran(pay, payda):
+        return (tablo[pay] / tablo[payda].where(tablo[payda] > 0)) * 100
+
+    tablo["Teklif→Proforma (%)"] = _oran("Teklif→Proforma", "Teklif")
+    tablo["Proforma→Sipariş (%)"] = _oran("Sipariş", "Proforma")
+    tablo["Sipariş→Fatura (%)"] = _oran("Fatura", "Sipariş")
+    tablo["Kaçak Teklif"] = tablo["Teklif"] - tablo["Teklif→Proforma"]
+    tablo["Kaçak Proforma"] = tablo["Proforma"] - tablo["Sipariş"]
+    tablo["Faturasız Sipariş"] = tablo["Sipariş"] - tablo["Fatura"]
+    tablo.index.name = anahtar
+    return tablo.reset_index().sort_values("Teklif Tutarı", ascending=False, kind="stable").reset_index(drop=True)
+
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def get_sales_funnel(data_version: str, _df_teklif: pd.DataFrame, _df_proforma: pd.DataFrame,
+                     _df_evrak: pd.DataFrame, _df_musteri: pd.DataFrame) -> dict:
+    return build_sales_funnel(_df_teklif, _df_proforma, _df_evrak, _df_musteri)
+
+
+# ===========================
+# ==== SATIŞ ANALİTİĞİ: KOHORT VE YAŞAM BOYU DEĞER (LTV)
+# ===========================
+# Her müşteri ilk sipariş/fatura ayına göre bir kohorta atanır; kohort × ay
+# yaşı matrisleri (elde tutma, ciro, kümülatif LTV) vektörel groupby/pivot ile kurulur.
+
+KOHORT_BOYUTLARI = ["Kategori", "Ülke", "Fuar"]
+
+
+def _ay_sirasi(tarih: pd.Series) -> pd.Series:
+    return tarih.dt.year * 12 + tarih.dt.month
+
+
+def build_customer_cohorts(lines: pd.DataFrame, df_proforma: pd.DataFrame, df_musteri: pd.DataFrame,
+                           df_fuar_musteri: pd.DataFrame = None) -> dict:
+    """Müşteri kohortlarını ve müşteri × ay ciro aktivitesini üretir.
+
+    lines: prepare_sales_lines çıktısı (raporlama para biriminde Tutar_num).
+    Kohort ayı = ilk fatura veya siparişe dönüşen ilk proforma ayından erken olanı.
+    """
+    fatura = pd.DataFrame({
+        "_m": _normal_anahtar(lines["Müşteri Adı"]),
+        "Müşteri Adı": lines["Müşteri Adı"],
+        "Ay": lines["Ay"],
+        "Tutar": lines["Tutar_num"],
+    })
+    fatura = fatura[fatura["Müşteri Adı"] != "Bilinmeyen Müşteri"]
+    ilk_tarihler = [fatura[["_m", "Müşteri Adı", "Ay"]]]
+
+    if isinstance(df_proforma, pd.DataFrame) and not df_proforma.empty:
+        pf = df_proforma.reindex(columns=["Müşteri Adı", "Tarih", "Durum"])
+        pf = pd.DataFrame({
+            "_m": _normal_anahtar(pf["Müşteri Adı"]),
+            "Müşteri Adı": _temiz_metin(pf["Müşteri Adı"]),
+            "Ay": pd.to_datetime(pf["Tarih"], errors="coerce").dt.to_period("M").dt.to_timestamp(),
+            "_siparis": _temiz_metin(pf["Durum"]).isin(SIPARIS_DURUMLARI),
+        })
+        ilk_tarihler.append(pf.loc[pf["_siparis"] & pf["Ay"].notna() & (pf["_m"] != ""), ["_m", "Müşteri Adı", "Ay"]])
+
+    ilk = pd.concat(ilk_tarihler, ignore_index=True).sort_values("Ay", kind="stable")
+    musteriler = ilk.drop_duplicates("_m").set_index("_m").rename(columns={"Ay": "Kohort"})
+
+    kart = pd.DataFrame(columns=["Kategori", "Ülke"])
+    if isinstance(df_musteri, pd.DataFrame) and "Müşteri Adı" in df_musteri.columns and not df_musteri.empty:
+        kart = (
+            df_musteri.assign(_m=_normal_anahtar(df_musteri["Müşteri Adı"]))
+            .drop_duplicates("_m")
+            .set_index("_m")
+            .reindex(columns=["Kategori", "Ülke"])
+        )
+    fuar = pd.Series(dtype=object)
+    if isinstance(df_fuar_musteri, pd.DataFrame) and {"Fuar Adı", "Müşteri Adı"}.issubset(df_fuar_musteri.columns):
+        fuar = (
+            df_fuar_musteri.assign(
+                _m=_normal_anahtar(df_fuar_musteri["Müşteri Adı"]),
+                _t=pd.to_datetime(df_fuar_musteri.get("Tarih"), errors="coerce"),
+                _f=_temiz_metin(df_fuar_musteri["Fuar Adı"]),
+            )
+            .query("_f != ''")
+            .sort_values("_t", kind="stable")
+            .drop_duplicates("_m")
+            .set_index("_m")["_f"]
+        )
+    for kolon in ["Kategori", "Ülke"]:
+        musteriler[kolon] = _temiz_metin(musteriler.index.to_series().map(kart[kolon])).replace("", "Belirtilmemiş")
+    musteriler["Fuar"] = musteriler.index.to_series().map(fuar).fillna("Fuar Dışı")
+
+    aktivite = fatura.groupby(["_m", "Ay"], sort=False)["Tutar"].sum().reset_index()
+    aktivite = aktivite.join(musteriler[["Kohort", *KOHORT_BOYUTLARI]], on="_m")
+    aktivite["Yaş (Ay)"] = _ay_sirasi(aktivite["Ay"]) - _ay_sirasi(aktivite["Kohort"])
+    aktivite = aktivite[aktivite["Yaş (Ay)"] >= 0]
+
+    son_ay = aktivite["Ay"].max() if not aktivite.empty else pd.Timestamp.today().to_period("M").to_timestamp()
+    return {"musteriler": musteriler.reset_index(), "aktivite": aktivite.reset_index(drop=True), "son_ay": son_ay}
+
+
+def cohort_matrices(kohortlar: dict, boyut: str = None, deger: str = None, max_yas: int = 24) -> dict:
+    """Kohort × yaş matrisleri ve kohort özeti.
+
+    boyut/deger: KOHORT_BOYUTLARI içinden dilim (ör. "Ülke", "Almanya").
+    """
+    musteriler, aktivite = kohortlar["musteriler"], kohortlar["aktivite"]
+    if boyut and deger is not None:
+        musteriler = musteriler[musteriler[boyut] == deger]
+        aktivite = aktivite[aktivite[boyut] == deger]
+    toplam_ciro = aktivite.groupby("Kohort")["Tutar"].sum()
+    aktivite = aktivite[aktivite["Yaş (Ay)"] <= max_yas]
+
+    boyut_sayisi = musteriler.groupby("Kohort").size().rename("Müşteri")
+    kohort_yas = ["Kohort", "Yaş (Ay)"]
+    aktif = aktivite[aktivite["Tutar"] > 0].groupby(kohort_yas)["_m"].nunique().unstack("Yaş (Ay)", fill_value=0)
+    ciro = aktivite.groupby(kohort_yas)["Tutar"].sum().unstack("Yaş (Ay)", fill_value=0.0)
+
+    yaslar = list(range(0, max_yas + 1))
+    aktif = aktif.reindex(index=boyut_sayisi.index, columns=yaslar, fill_value=0)
+    ciro = ciro.reindex(index=boyut_sayisi.index, columns=yaslar, fill_value=0.0)
+
+    # Henüz yaşanmamış aylar boş bırakılır
+    kalan_ay = _ay_sirasi(pd.Series(kohortlar["son_ay"], index=boyut_sayisi.index)) - _ay_sirasi(boyut_sayisi.index.to_series())
+    gelecek = np.asarray(yaslar)[None, :] > kalan_ay.to_numpy()[:, None]
+
+    elde_tutma = aktif.div(boyut_sayisi, axis=0).mul(100).mask(gelecek)
+    ltv = ciro.cumsum(axis=1).div(boyut_sayisi, axis=0).mask(gelecek)
+    ciro = ciro.mask(gelecek)
+
+    ozet = pd.DataFrame({
+        "Müşteri": boyut_sayisi,
+        "Toplam Ciro": toplam_ciro,
+    }).reindex(boyut_sayisi.index).fillna({"Toplam Ciro": 0.0})
+    ozet["LTV"] = ozet["Toplam Ciro"] / ozet["Müşteri"]
+    for ay in (3, 6, 12):
+        if ay <= max_yas:
+            ozet[f"LTV {ay}. Ay"] = ltv[ay]
+    ozet["Gözlenen Ay"] = kalan_ay + 1
+
+    for tablo in (elde_tutma, ciro, ltv, ozet):
+        tablo.index = tablo.index.strftime("%Y-%m")
+        tablo.index.name = "Kohort"
+    return {"elde_tutma": elde_tutma, "ciro": ciro, "ltv": ltv, "ozet": ozet}
+
+
+def cohort_excel_bytes(matrisler: dict) -> bytes:
+    """Kohort matrislerini tek bir Excel dosyasında (her matris ayrı sayfa) döndürür."""
+    sayfalar = {"Özet": "ozet", "Elde Tutma (%)": "elde_tutma", "Ciro": "ciro", "Kümülatif LTV": "ltv"}
+    buffer = io.BytesIO()
+    with pd.ExcelWriter(buffer, engine="openpyxl") as writer:
+        for sayfa, anahtar in sayfalar.items():
+            matrisler[anahtar].to_excel(writer, sheet_name=sayfa)
+    return buffer.getvalue()
+
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def get_customer_cohorts(data_version: str, _lines: pd.DataFrame, _df_proforma: pd.DataFrame,
+                         _df_musteri: pd.DataFrame, _df_fuar_musteri: pd.DataFrame) -> dict:
+    return build_customer_cohorts(_lines, _df_proforma, _df_musteri, _df_fuar_musteri)
+
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def get_cohort_matrices(data_version: str, boyut: str, deger: str, max_yas: int, _kohortlar: dict) -> dict:
+    return cohort_matrices(_kohortlar, boyut=boyut, deger=deger, max_yas=max_yas)
+
+
+# ===========================
+# ==== MÜŞTERİ PORTFÖYÜ: ARAMA İNDEKSİ
+# ===========================
+# Alanlar Türkçe kurallarla katlanır (İ/I/ı → i) ve veri sürümü başına bir kez
+# trigram ve kelime ters indekslerine yazılır. Sorgu, trigram listelerinin
+# kesişimiyle adaylara indirilir, adaylarda alt dize doğrulanır ve sonuç alan
+# önceliğine göre (ad > telefon > e-posta > adres > ülke > temsilci) sıralanır.
+
+ARAMA_ALANLARI = ["Müşteri Adı", "Telefon", "E-posta", "Adres", "Ülke", "Satış Temsilcisi"]
+_TR_KATLAMA = str.maketrans({"İ": "i", "I": "i", "ı": "i"})
+_KELIME_AYIRICI = re.compile(r"[^\w@.+]+")
+ARAMA_KUCUK_ADAY = 512
+
+
+def tr_casefold(metin) -> str:
+    return str(metin).translate(_TR_KATLAMA).casefold()
+
+
+def _katlanmis_seri(seri: pd.Series) -> pd.Series:
+    return seri.astype(object).where(seri.notna(), "").astype(str).str.translate(_TR_KATLAMA).str.casefold()
+
+
+def _trigramlar(metin: str) -> set:
+    return {metin[i:i + 3] for i in range(len(metin) - 2)}
+
+
+class CustomerSearchIndex:
+    """Müşteri tablosu için trigram + kelime ters indeksi (satır konumlarıyla)."""
+
+    def __init__(self, frame: pd.DataFrame, alanlar=ARAMA_ALANLARI):
+        self.etiketler = frame.index
+        self.alanlar = list(alanlar)
+        self.metinler = [
+            _katlanmis_seri(frame[alan]).reset_index(drop=True) if alan in frame.columns
+            else pd.Series("", index=range(len(frame)), dtype=object)
+            for alan in self.alanlar
+        ]
+        trigram = defaultdict(set)
+        kelime = defaultdict(set)
+        for metinler in self.metinler:
+            for konum, alan_metni in enumerate(metinler):
+                if not alan_metni:
+                    continue
+                for tg in _trigramlar(alan_metni):
+                    trigram[tg].add(konum)
+                for tk in _KELIME_AYIRICI.split(alan_metni):
+                    if tk:
+                        kelime[tk].add(konum)
+        self.trigram = {tg: np.fromiter(k, dtype=np.int64) for tg, k in trigram.items()}
+        self.kelime = {tk: np.fromiter(k, dtype=np.int64) for tk, k in kelime.items()}
+
+    def _adaylar(self, sorgu: str) -> np.ndarray:
+        if len(sorgu) < 3:
+            # Kısa sorgularda trigram yok; tüm satırlar aday
+            return np.arange(len(self.etiketler))
+        listeler = []
+        for tg in _trigramlar(sorgu):
+            liste = self.trigram.get(tg)
+            if liste is None:
+                return np.empty(0, dtype=np.int64)
+            listeler.append(liste)
+        listeler.sort(key=len)
+        adaylar = np.sort(listeler[0])
+        for liste in listeler[1:]:
+            adaylar = np.intersect1d(adaylar, liste, assume_unique=True)
+            if not len(adaylar):
+                break
+        return adaylar
+
+    def _kucuk_aday_sirala(self, sorgu: str, adaylar, kelime_basi, tam_kelime: set) -> list:
+        """Az adayda pandas yükü olmadan aynı sıralama."""
+        sonuclar = []
+        for konum in adaylar.tolist():
+            for alan_sira, metinler in enumerate(self.metinler):
+                alan_metni = metinler.iat[konum]
+                if sorgu in alan_metni:
+                    anahtar = (alan_sira, kelime_basi.search(alan_metni) is None, konum not in tam_kelime)
+                    sonuclar.append((*anahtar, self.metinler[0].iat[konum], konum))
+                    break
+        sonuclar.sort()
+        return [self.etiketler[konum] for *_, konum in sonuclar]
+
+    def search(self, sorgu: str) -> list:
+        """Sorguyu içeren satırların index etiketlerini alan önceliğine göre sıralı döndürür.
+
+        Sıralama: ilk eşleşen alan, kelime başı eşleşmesi, tam kelime eşleşmesi, müşteri adı.
+        """
+        sorgu = tr_casefold(sorgu).strip()
+        if not sorgu:
+            return list(self.etiketler)
+        adaylar = self._adaylar(sorgu)
+        if not len(adaylar):
+            return []
+        kelime_basi = re.compile(r"(?:^|\W)" + re.escape(sorgu))
+        tam_kelime_konumlari = self.kelime.get(sorgu, np.empty(0, dtype=np.int64))
+        if len(adaylar) <= ARAMA_KUCUK_ADAY:
+            return self._kucuk_aday_sirala(sorgu, adaylar, kelime_basi, set(tam_kelime_konumlari.tolist()))
+
+        yok = len(self.alanlar)
+        sira = np.full(len(adaylar), yok)
+        kelime_ici = np.ones(len(adaylar), dtype=bool)
+        for alan_sira, metinler in enumerate(self.metinler):
+            bekleyen = sira == yok
+            if not bekleyen.any():
+                break
+            aday_metin = metinler.iloc[adaylar[bekleyen]]
+            bulundu = aday_metin.str.contains(sorgu, regex=False).to_numpy()
+            if not bulundu.any():
+                continue
+            hedef = np.flatnonzero(bekleyen)[bulundu]
+            sira[hedef] = alan_sira
+            kelime_ici[hedef] = ~aday_metin[bulundu].str.contains(kelime_basi).to_numpy()
+
+        eslesen = sira < yok
+        tam_kelime = np.isin(adaylar, tam_kelime_konumlari)
+        sonuc = pd.DataFrame({
+            "sira": sira[eslesen],
+            "kelime_ici": kelime_ici[eslesen],
+            "tam_degil": ~tam_kelime[eslesen],
+            "ad": self.metinler[0].iloc[adaylar[eslesen]].to_numpy(),
+            "konum": adaylar[eslesen],
+        }).sort_values(["sira", "kelime_ici", "tam_degil", "ad"], kind="stable")
+        return list(self.etiketler[sonuc["konum"].to_numpy()])
+
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def get_customer_search_index(data_version: str, _df_musteri: pd.DataFrame) -> CustomerSearchIndex:
+    return CustomerSearchIndex(_df_musteri)
+
+
+# ===========================
+# ==== MÜŞTERİ TEKİLLEŞTİRME (BULANIK EŞLEŞME)
+# ===========================
+# İsimler normalize edilir (Türkçe karakter, hukuki ekler, noktalama); kayıtlar
+# blok anahtarlarına (ülke + ad öneki, telefon, e-posta alan adı, normalize ad)
+# dağıtılır ve yalnızca aynı bloğu paylaşan çiftler puanlanır.
+
+HUKUKI_EKLER = {
+    "ltd", "limited", "sti", "as", "inc", "llc", "gmbh", "co", "corp", "corporation", "company",
+    "sa", "sas", "srl", "spa", "bv", "kg", "plc", "llp", "fze", "fzco", "fzc", "ooo",
+    "ve", "and",
+}
+# Unvan kısaltmaları tek yazıma açılır: "Dış Tic." ile "Dış Ticaret" aynı kelimelere iner.
+UNVAN_KISALTMALARI = {
+    "tic": "ticaret", "san": "sanayi", "ith": "ithalat", "ihr": "ihracat", "paz": "pazarlama",
+}
+UCRETSIZ_EPOSTA_ALANLARI = {
+    "gmail.com", "hotmail.com", "outlook.com", "yahoo.com", "icloud.com", "yandex.com", "yandex.ru",
+    "mail.ru", "live.com", "msn.com", "aol.com",
+}
+BENZERLIK_ESIGI = 0.85
+BLOK_UST_SINIR = 200
+_TR_HARF_DONUSUM = str.maketrans({"ç": "c", "ğ": "g", "ö": "o", "ş": "s", "ü": "u", "ı": "i"})
+
+
+def normalize_company_name(ad) -> str:
+    """'ABC Dış Ticaret Ltd. Şti.' → 'abc dis ticaret'."""
+    metin = tr_casefold(ad or "").translate(_TR_HARF_DONUSUM)
+    metin = "".join(c for c in unicodedata.normalize("NFKD", metin) if not unicodedata.combining(c))
+    # "a.ş." / "s.a." gibi noktalı kısaltmaları tek kelimeye indir
+    metin = re.sub(r"\b(\w)\.(?=\w\b)", r"\1", metin)
+    kelimeler = re.sub(r"[^\w]+", " ", metin).replace("_", " ").split()
+    return " ".join(UNVAN_KISALTMALARI.get(k, k) for k in kelimeler if k not in HUKUKI_EKLER)
+
+
+def _telefon_anahtari(telefon) -> str:
+    rakamlar = re.sub(r"\D+", "", str(telefon or ""))
+    return rakamlar[-9:] if len(rakamlar) >= 7 else ""
+
+
+def _eposta_parcalari(eposta) -> tuple:
+    eposta = str(eposta or "").strip().casefold()
+    if "@" not in eposta:
+        return "", ""
+    alan = eposta.rsplit("@", 1)[1]
+    return eposta, ("" if alan in UCRETSIZ_EPOSTA_ALANLARI else alan)
+
+
+def _tekillestirme_kaydi(ad, ulke="", telefon="", eposta="") -> dict:
+    normal = normalize_company_name(ad)
+    eposta_tam, alan = _eposta_parcalari(eposta)
+    ulke_n = tr_casefold(ulke or "").strip()
+    kayit = {
+        "ad": normal,
+        "kelimeler": frozenset(normal.split()),
+        "sirali": " ".join(sorted(normal.split())),
+        "ulke": ulke_n,
+        "telefon": _telefon_anahtari(telefon),
+        "eposta": eposta_tam,
+        "alan": alan,
+    }
+    bloklar = set()
+    if normal:
+        kelimeler = normal.split()
+        bloklar.add("n:" + " ".join(sorted(kelimeler)))
+        bloklar.add(f"u:{ulke_n}|p:{normal.replace(' ', '')[:4]}")
+        bloklar.add(f"u:{ulke_n}|k:{max(kelimeler, key=len)}")
+    if kayit["telefon"]:
+        bloklar.add("t:" + kayit["telefon"])
+    if alan:
+        bloklar.add("e:" + alan)
+    kayit["bloklar"] = bloklar
+    return kayit
+
+
+def duplicate_score(a: dict, b: dict, esik: float = BENZERLIK_ESIGI) -> tuple:
+    """(puan 0-1, gerekçeler) döndürür.
+
+    Ad benzerliği: kelime kümesi Jaccard'ı ile sıralı kelimeler üzerinde SequenceMatcher
+    oranının büyüğü; üst sınırı eşiğin altında kalan çiftlerde oran hesaplanmaz.
+    """
+    gerekceler = []
+    puan = 0.0
+    if a["ad"] and b["ad"]:
+        puan = len(a["kelimeler"] & b["kelimeler"]) / max(len(a["kelimeler"] | b["kelimeler"]), 1)
+        if puan < 1.0:
+            eslestirici = difflib.SequenceMatcher(None, a["sirali"], b["sirali"])
+            alt_sinir = esik - 0.1
+            if eslestirici.real_quick_ratio() >= alt_sinir and eslestirici.quick_ratio() >= alt_sinir:
+                puan = max(puan, eslestirici.ratio())
+        if puan >= 0.99:
+            gerekceler.append("aynı ad")
+        elif puan >= 0.6:
+            gerekceler.append(f"benzer ad (%{puan * 100:.0f})")
+    if a["telefon"] and a["telefon"] == b["telefon"]:
+        puan = max(puan, 0.95)
+        gerekceler.append("aynı telefon")
+    if a["eposta"] and a["eposta"] == b["eposta"]:
+        puan = max(puan, 0.97)
+        gerekceler.append("aynı e-posta")
+    elif a["alan"] and a["alan"] == b["alan"]:
+        puan = min(puan + 0.1, 1.0)
+        gerekceler.append("aynı e-posta alan adı")
+    if a["ulke"] and b["ulke"] and a["ulke"] != b["ulke"] and not {"aynı telefon", "aynı e-posta"} & set(gerekceler):
+        puan -= 0.1
+    return round(puan, 3), gerekceler
+
+
+class CustomerDedupeIndex:
+    """Kayıtları blok anahtarlarına göre gruplar; adaylar yalnızca ortak bloklardan gelir."""
+
+    def __init__(self, kayitlar: list):
+        self.kayitlar = kayitlar
+        self.bloklar = defaultdict(list)
+        for konum, kayit in enumerate(kayitlar):
+            for blok in kayit["bloklar"]:
+                self.bloklar[blok].append(konum)
+
+    def adaylar(self, kayit: dict) -> set:
+        konumlar = set()
+        for blok in kayit["bloklar"]:
+            uyeler = self.bloklar.get(blok, ())
+            if len(uyeler) <= BLOK_UST_SINIR or blok.startswith(("t:", "n:")):
+                konumlar.update(uyeler)
+        return konumlar
+
+    def eslesmeler(self, kayit: dict, esik: float = BENZERLIK_ESIGI) -> list:
+        sonuc = []
+        for konum in self.adaylar(kayit):
+            puan, gerekceler = duplicate_score(kayit, self.kayitlar[konum], esik)
+            if puan >= esik:
+                sonuc.append((konum, puan, gerekceler))
+        return sorted(sonuc, key=lambda x: -x[1])
+
+    def ciftler(self, esik: float = BENZERLIK_ESIGI):
+        """Blok içi çiftleri (her çift bir kez) puanlayıp eşiği geçenleri üretir."""
+        gorulen = set()
+        for blok, uyeler in self.bloklar.items():
+            if len(uyeler) < 2 or (len(uyeler) > BLOK_UST_SINIR and not blok.startswith(("t:", "n:"))):
+                continue
+            for i, a in enumerate(uyeler):
+                for b in uyeler[i + 1:]:
+                    cift = (a, b) if a < b else (b, a)
+                    if cift in gorulen:
+                        continue
+                    gorulen.add(cift)
+                    puan, gerekceler = duplicate_score(self.kayitlar[a], self.kayitlar[b], esik)
+                    if puan >= esik:
+                        yield cift[0], cift[1], puan, gerekceler
+
+
+def _tekillestirme_kaynaklari(df_musteri: pd.DataFrame, df_fuar_musteri: pd.DataFrame = None) -> pd.DataFrame:
+    """Müşteri ve fuar müşterisi kayıtlarını ortak kolonlarla birleştirir."""
+    parcalar = []
+    if isinstance(df_musteri, pd.DataFrame) and not df_musteri.empty:
+        m = df_musteri.reindex(columns=["Müşteri Adı", "Ülke", "Telefon", "E-posta"])
+        m.insert(0, "Kaynak", "Müşteri")
+        m["Satır"] = df_musteri.index
+        parcalar.append(m)
+    if isinstance(df_fuar_musteri, pd.DataFrame) and not df_fuar_musteri.empty:
+        f = df_fuar_musteri.reindex(columns=["Müşteri Adı", "Ülke", "Telefon", "E-mail"]).rename(columns={"E-mail": "E-posta"})
+        fuar_adi = df_fuar_musteri.get("Fuar Adı", pd.Series("", index=df_fuar_musteri.index))
+        f.insert(0, "Kaynak", "Fuar: " + fuar_adi.astype(object).where(fuar_adi.notna(), "").astype(str))
+        f["Satır"] = df_fuar_musteri.index
+        parcalar.append(f)
+    if not parcalar:
+        return pd.DataFrame(columns=["Kaynak", "Müşteri Adı", "Ülke", "Telefon", "E-posta", "Satır"])
+    birlesik = pd.concat(parcalar, ignore_index=True)
+    return birlesik[birlesik["Müşteri Adı"].notna() & (birlesik["Müşteri Adı"].astype(str).str.strip() != "")].reset_index(drop=True)
+
+
+def _kayitlari_hazirla(kaynak: pd.DataFrame) -> list:
+    return [
+        _tekillestirme_kaydi(ad, ulke, tel, eposta)
+        for ad, ulke, tel, eposta in zip(
+            kaynak["Müşteri Adı"], kaynak["Ülke"].fillna(""), kaynak["Telefon"].fillna(""), kaynak["E-posta"].fillna("")
+        )
+    ]
+
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def get_customer_dedupe_index(data_version: str, _df_musteri: pd.DataFrame) -> tuple:
+    kaynak = _tekillestirme_kaynaklari(_df_musteri)
+    return kaynak, CustomerDedupeIndex(_kayitlari_hazirla(kaynak))
+
+
+def find_duplicate_customers(ad, ulke="", telefon="", eposta="", esik: float = BENZERLIK_ESIGI) -> pd.DataFrame:
+    """Eklenmek üzere olan müşteriye benzeyen mevcut kayıtlar (puana göre azalan)."""
+    kaynak, indeks = get_customer_dedupe_index(DATA_VERSION, df_musteri)
+    eslesmeler = indeks.eslesmeler(_tekillestirme_kaydi(ad, ulke, telefon, eposta), esik)
+    if not eslesmeler:
+        return pd.DataFrame(columns=["Müşteri Adı", "Ülke", "Telefon", "E-posta", "Benzerlik", "Gerekçe"])
+    konumlar, puanlar, gerekceler = zip(*eslesmeler)
+    sonuc = kaynak.iloc[list(konumlar)][["Müşteri Adı", "Ülke", "Telefon", "E-posta"]].copy()
+    sonuc["Benzerlik"] = puanlar
+    sonuc["Gerekçe"] = [", ".join(g) for g in gerekceler]
+    return sonuc.reset_index(drop=True)
+
+
+def duplicate_customer_report(df_musteri: pd.DataFrame, df_fuar_musteri: pd.DataFrame = None,
+                              esik: float = BENZERLIK_ESIGI) -> pd.DataFrame:
+    """Müşteri + fuar müşterisi kayıtlarında olası mükerrer çiftler."""
+    kaynak = _tekillestirme_kaynaklari(df_musteri, df_fuar_musteri)
+    indeks = CustomerDedupeIndex(_kayitlari_hazirla(kaynak))
+    satirlar = []
+    for a, b, puan, gerekceler in indeks.ciftler(esik):
+        ka, kb = kaynak.iloc[a], kaynak.iloc[b]
+        satirlar.append({
+            "Kayıt 1": ka["Müşteri Adı"], "Kaynak 1": ka["Kaynak"], "Ülke 1": ka["Ülke"],
+            "Kayıt 2": kb["Müşteri Adı"], "Kaynak 2": kb["Kaynak"], "Ülke 2": kb["Ülke"],
+            "Benzerlik": puan, "Gerekçe": ", ".join(gerekceler),
+        })
+    kolonlar = ["Kayıt 1", "Kaynak 1", "Ülke 1", "Kayıt 2", "Kaynak 2", "Ülke 2", "Benzerlik", "Gerekçe"]
+    if not satirlar:
+        return pd.DataFrame(columns=kolonlar)
+    return pd.DataFrame(satirlar, columns=kolonlar).sort_values("Benzerlik", ascending=False).reset_index(drop=True)
+
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def get_duplicate_customer_report(data_version: str, esik: float, _df_musteri: pd.DataFrame,
+                                  _df_fuar_musteri: pd.DataFrame) -> pd.DataFrame:
+    return duplicate_customer_report(_df_musteri, _df_fuar_musteri, esik)
+
+
+# ===========================
+# ==== ETKİLEŞİM GÜNLÜĞÜ: KAYIT DEPOSU
+# ===========================
+# Görüşme kayıtları veri sürümü başına bir kez tarihe göre sıralanır; müşteri ve
+# tip için ikincil indeksler, açıklama için kelime ters indeksi tutulur. Sorgular
+# sıralı konum dizileri döndürür; ekran paged_table ile yalnızca görünen sayfayı dilimler.
+
+class InteractionLogStore:
+    """df_kayit üzerinde tarih sıralı, indeksli sorgu katmanı."""
+
+    def __init__(self, frame: pd.DataFrame):
+        self.frame = frame
+        tarih = pd.to_datetime(frame["Tarih"], errors="coerce") if "Tarih" in frame.columns \
+            else pd.Series(pd.NaT, index=frame.index)
+        ns = tarih.to_numpy(dtype="datetime64[ns]").view("i8")
+        # NaT en küçük int64 değeri; artan sıralamada başa düşer
+        self.konum = np.argsort(ns, kind="stable")
+        self.tarih = ns[self.konum]
+        sirali = frame.iloc[self.konum]
+
+        def _ikincil(kolon):
+            if kolon not in sirali.columns:
+                return {}
+            degerler = sirali[kolon].astype(object).where(sirali[kolon].notna(), "").astype(str).str.strip()
+            return {k: np.asarray(v, dtype=np.int64) for k, v in degerler.groupby(degerler.to_numpy()).indices.items()}
+
+        self.musteri = _ikincil("Müşteri Adı")
+        self.tip = _ikincil("Tip")
+        self.metin = _katlanmis_seri(sirali["Açıklama"]) if "Açıklama" in sirali.columns \
+            else pd.Series("", index=range(len(sirali)), dtype=object)
+        kelime = defaultdict(list)
+        for sira, aciklama in enumerate(self.metin):
+            for tk in set(_KELIME_AYIRICI.split(aciklama)):
+                if tk:
+                    kelime[tk].append(sira)
+        self.kelime = {tk: np.asarray(s, dtype=np.int64) for tk, s in kelime.items()}
+
+    def __len__(self) -> int:
+        return len(self.konum)
+
+    def _tarih_araligi(self, baslangic, bitis) -> tuple:
+        alt, ust = 0, len(self.tarih)
+        if baslangic is not None:
+            alt = int(np.searchsorted(self.tarih, pd.Timestamp(baslangic).value, side="left"))
+        if bitis is not None:
+            son = pd.Timestamp(bitis) + pd.Timedelta(days=1)
+            ust = int(np.searchsorted(self.tarih, son.value, side="left"))
+        # Tarihi okunamayan kayıtlar aralık filtresinde dışarıda kalır
+        if baslangic is not None or bitis is not None:
+            alt = max(alt, int(np.searchsorted(self.tarih, np.iinfo(np.int64).min, side="right")))
+        return alt, max(alt, ust)
+
+    def _arama_adaylari(self, sorgu: str):
+        """Sorgudaki her kelime parçası için, onu içeren indeks kelimelerinin birleşimi."""
+        adaylar = None
+        for parca in {p for p in _KELIME_AYIRICI.split(sorgu) if p}:
+            listeler = [s for tk, s in self.kelime.items() if parca in tk]
+            if not listeler:
+                return np.empty(0, dtype=np.int64)
+            birlesim = np.unique(np.concatenate(listeler))
+            adaylar = birlesim if adaylar is None else np.intersect1d(adaylar, birlesim, assume_unique=True)
+            if not len(adaylar):
+                break
+        return adaylar
+
+    def query(self, musteri=None, tipler=None, baslangic=None, bitis=None, arama: str = "") -> np.ndarray:
+        """Filtrelere uyan kayıtların sıra numaraları (en yeni önce)."""
+        alt, ust = self._tarih_araligi(baslangic, bitis)
+        secim = np.arange(alt, ust, dtype=np.int64)
+        if musteri:
+            secim = np.intersect1d(secim, self.musteri.get(str(musteri).strip(), np.empty(0, dtype=np.int64)),
+                                   assume_unique=True)
+        if tipler:
+            tip_konum = [self.tip[t] for t in tipler if t in self.tip]
+            secim = np.intersect1d(secim, np.concatenate(tip_konum) if tip_konum else np.empty(0, dtype=np.int64),
+                                   assume_unique=True)
+        sorgu = tr_casefold(arama).strip()
+        if sorgu and len(secim):
+            adaylar = self._arama_adaylari(sorgu)
+            if adaylar is not None:
+                secim = np.intersect1d(secim, adaylar, assume_unique=True)
+            # Kelime sınırını aşan sorgularda alt dize doğrulaması
+            if len(secim):
+                secim = secim[self.metin.iloc[secim].str.contains(sorgu, regex=False).to_numpy()]
+        return secim[::-1]
+
+    def rows(self, siralar) -> pd.DataFrame:
+        """Sıra numaralarına karşılık gelen kayıtlar (ana tablo index'i korunur)."""
+        return self.frame.iloc[self.konum[np.asarray(siralar, dtype=np.int64)]]
+
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def get_interaction_log(data_version: str, _df_kayit: pd.DataFrame) -> InteractionLogStore:
+    return InteractionLogStore(_df_kayit)
+
+
+def interaction_log():
+    return get_interaction_log(DATA_VERSION, df_kayit)
+
+
+# ===========================
+# ==== GOOGLE DRIVE: KLASÖR ÖNBELLEĞİ
+# ===========================
+# (ad, üst klasör) → klasör ID eşlemesi diskte kalıcı tutulur; yalnızca önbellekte
+# olmayan klasörler için Drive sorgulanır. Aynı klasörü arama/oluşturma işlemi
+# anahtar bazında kilitlenir, eşzamanlı oturumlar mükerrer klasör açamaz.
+
+DRIVE_KLASOR_DOSYASI = "drive_klasorleri.json"
+DRIVE_KLASOR_MIME = "application/vnd.google-apps.folder"
+
+
+def drive_query_literal(deger) -> str:
+    """Drive sorgusunda tek tırnak içinde kullanılacak değeri kaçışlar."""
+    return str(deger).replace("\\", "\\\\").replace("'", "\\'")
+
+
+class DriveFolderCache:
+    """Kalıcı (ad, üst klasör) → ID önbelleği; kaçırılan anahtarlar Drive'da doğrulanır."""
+
+    def __init__(self, path: str = DRIVE_KLASOR_DOSYASI):
+        self.path = path
+        self._lock = threading.Lock()
+        self._anahtar_kilitleri = defaultdict(threading.Lock)
+        self.klasorler = {}
+        if os.path.exists(path):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    self.klasorler = {tuple(k.split("\n", 1)): v for k, v in json.load(f).items()}
+            except Exception:
+                self.klasorler = {}
+
+    def _yaz(self):
+        klasor = os.path.dirname(os.path.abspath(self.path))
+        veri = {"\n".join(k): v for k, v in self.klasorler.items()}
+        with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=klasor, delete=False, suffix=".tmp") as f:
+            json.dump(veri, f, ensure_ascii=False, indent=2)
+            gecici = f.name
+        os.replace(gecici, self.path)
+
+    def _kaydet(self, anahtar: tuple, folder_id: str):
+        with self._lock:
+            self.klasorler[anahtar] = folder_id
+            self._yaz()
+
+    def get_or_create(self, name: str, parent_id: str) -> str:
+        anahtar = (str(parent_id), str(name))
+        folder_id = self.klasorler.get(anahtar)
+        if folder_id:
+            return folder_id
+        with self._lock:
+            kilit = self._anahtar_kilitleri[anahtar]
+        with kilit:
+            # Kilit beklenirken başka bir oturum oluşturmuş olabilir
+            folder_id = self.klasorler.get(anahtar)
+            if folder_id:
+                return folder_id
+            q = (
+                f"title = '{drive_query_literal(name)}' and mimeType = '{DRIVE_KLASOR_MIME}' "
+                f"and '{drive_query_literal(parent_id)}' in parents and trashed = false"
+            )
+            lst = drive.ListFile({'q': q, 'maxResults': 1}).GetList()
+            if lst:
+                folder_id = lst[0]['id']
+            else:
+                f = drive.CreateFile({'title': name, 'mimeType': DRIVE_KLASOR_MIME, 'parents': [{'id': parent_id}]})
+                f.Upload()
+                folder_id = f['id']
+            self._kaydet(anahtar, folder_id)
+            return folder_id
+
+    def forget(self, folder_id: str) -> None:
+        """Silinmiş/erişilemeyen klasörü (ve altındakileri) önbellekten çıkarır."""
+        with self._lock:
+            silinecek = {folder_id}
+            degisti = True
+            while degisti:
+                degisti = False
+                for anahtar, fid in list(self.klasorler.items()):
+                    if fid in silinecek or anahtar[0] in silinecek:
+                        silinecek.add(fid)
+                        del self.klasorler[anahtar]
+                        degisti = True
+            self._yaz()
+
+
+@st.cache_resource
+def get_drive_folder_cache() -> DriveFolderCache:
+    return DriveFolderCache()
+
+
+def drive_folder(name: str, parent_id: str) -> str:
+    return get_drive_folder_cache().get_or_create(name, parent_id)
+
+
+# ===========================
+# ==== GOOGLE DRIVE: PARALEL YÜKLEME
+# ===========================
+# Çoklu dosya yüklemeleri sınırlı bir iş parçacığı havuzunda yürür. Tüm oturumlar
+# Drive isteklerini ortak bir jeton kovasından geçirir; bir dosyanın hatası
+# diğerlerini durdurmaz, sonuç dosya bazında döner.
+
+DRIVE_YUKLEME_ISCI = 4
+DRIVE_ISTEK_HIZI = 5.0      # saniyede istek
+DRIVE_ISTEK_KAPASITE = 10   # ani yük için biriken jeton
+
+
+class TokenBucket:
+    """Saniyede `hiz` jeton dolan, en fazla `kapasite` jeton tutan kova."""
+
+    def __init__(self, hiz: float = DRIVE_ISTEK_HIZI, kapasite: int = DRIVE_ISTEK_KAPASITE):
+        self.hiz = float(hiz)
+        self.kapasite = float(kapasite)
+        self._jeton = float(kapasite)
+        self._son = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, adet: float = 1.0) -> None:
+        while True:
+            with self._lock:
+                simdi = time.monotonic()
+                self._jeton = min(self.kapasite, self._jeton + (simdi - self._son) * self.hiz)
+                self._son = simdi
+                if self._jeton >= adet:
+                    self._jeton -= adet
+                    return
+                bekle = (adet - self._jeton) / self.hiz
+            time.sleep(bekle)
+
+
+@st.cache_resource
+def get_drive_rate_limiter() -> TokenBucket:
+    return TokenBucket()
+
+
+def drive_file_link(file_id: str) -> str:
+    if isinstance(drive, LocalDrive):
+        return drive.file_link(file_id)
+    return f"https://drive.google.com/file/d/{file_id}/view?usp=sharing"
+
+
+def _yukleme_akisi(data):
+    """bytes/memoryview ya da dosya benzeri nesneyi (ör. UploadedFile) başa sarılmış bir akışa çevirir."""
+    if hasattr(data, "read"):
+        data.seek(0)
+        return data
+    return io.BytesIO(data)
+
+
+def content_md5(data) -> str:
+    """Drive'ın md5Checksum alanıyla karşılaştırılabilir içerik özeti (kopyasız)."""
+    if hasattr(data, "getbuffer"):
+        return hashlib.md5(data.getbuffer()).hexdigest()
+    if hasattr(data, "read"):
+        data.seek(0)
+        return hashlib.md5(data.read()).hexdigest()
+    return hashlib.md5(data).hexdigest()
+
+
+DRIVE_LISTE_TTL = 300       # saniye; başka kullanıcıların Drive'da yaptığı değişiklikler için
+DRIVE_LISTE_SAYFA = 1000    # Drive v2 list çağrısının izin verdiği en büyük sayfa
+DRIVE_LISTE_ALANLARI = "items(id,title,mimeType,md5Checksum,modifiedDate,fileSize),nextPageToken"
+
+
+class DriveListingCache:
+    """Klasör ID → dosya listesi (yalnızca gerekli alanlar) önbelleği; TTL ve açık geçersiz kılma ile."""
+
+    def __init__(self, ttl: float = DRIVE_LISTE_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._kilitler = defaultdict(threading.Lock)
+        self._kayitlar = {}   # folder_id -> {"zaman", "dosyalar", "md5"}
+
+    def _kilit(self, folder_id: str) -> threading.Lock:
+        with self._lock:
+            return self._kilitler[folder_id]
+
+    def _listele(self, folder_id: str) -> dict:
+        liste = drive.ListFile({
+            'q': f"'{drive_query_literal(folder_id)}' in parents and trashed = false",
+            'fields': DRIVE_LISTE_ALANLARI,
+            'maxResults': DRIVE_LISTE_SAYFA,
+        })
+        dosyalar = []
+        while True:
+            get_drive_rate_limiter().acquire()
+            try:
+                sayfa = next(liste)
+            except StopIteration:
+                break
+            dosyalar.extend({k: f.get(k) for k in ("id", "title", "mimeType", "md5Checksum", "modifiedDate", "fileSize")}
+                            for f in sayfa)
+        return {
+            "zaman": time.monotonic(),
+            "dosyalar": dosyalar,
+            "md5": {f["md5Checksum"]: f["id"] for f in dosyalar if f.get("md5Checksum")},
+        }
+
+    def get(self, folder_id: str) -> dict:
+        with self._kilit(folder_id):
+            kayit = self._kayitlar.get(folder_id)
+            if kayit is None or time.monotonic() - kayit["zaman"] > self.ttl:
+                kayit = self._listele(folder_id)
+                self._kayitlar[folder_id] = kayit
+            return kayit
+
+    def add(self, folder_id: str, dosya: dict) -> None:
+        """Kendi yüklememizi listeye işler; önbellekte olmayan klasöre dokunmaz."""
+        with self._kilit(folder_id):
+            kayit = self._kayitlar.get(folder_id)
+            if kayit is not None:
+                kayit["dosyalar"].append(dosya)
+                if dosya.get("md5Checksum"):
+                    kayit["md5"][dosya["md5Checksum"]] = dosya["id"]
+
+    def invalidate(self, folder_id: str) -> None:
+        with self._kilit(folder_id):
+            self._kayitlar.pop(folder_id, None)
+
+
+@st.cache_resource
+def get_drive_listing_cache() -> DriveListingCache:
+    return DriveListingCache()
+
+
+def drive_listing(folder_id: str) -> list:
+    """Klasördeki dosyalar (id, title, mimeType, md5Checksum, modifiedDate, fileSize)."""
+    return get_drive_listing_cache().get(folder_id)["dosyalar"]
+
+
+class DriveHashIndex:
+    """Klasör listesindeki md5Checksum değerleri üzerinden aynı içeriğin ikinci kez aktarılmasını önler."""
+
+    def __init__(self, listeler: DriveListingCache):
+        self.listeler = listeler
+        self._lock = threading.Lock()
+        self._kilitler = defaultdict(threading.Lock)
+
+    def _kilit(self, anahtar) -> threading.Lock:
+        with self._lock:
+            return self._kilitler[anahtar]
+
+    def upload_once(self, parent_id: str, ozet: str, yukle) -> tuple:
+        """Klasörde aynı özet varsa (ID, True), yoksa yukle() ile (ID, False) döndürür.
+
+        yukle() yeni dosyanın listeye işlenecek alanlarını (en az "id") döndürür.
+        """
+        with self._kilit((parent_id, ozet)):
+            mevcut = self.listeler.get(parent_id)["md5"].get(ozet)
+            if mevcut:
+                return mevcut, True
+            dosya = yukle()
+            self.listeler.add(parent_id, {**dosya, "md5Checksum": ozet})
+            return dosya["id"], False
+
+
+@st.cache_resource
+def get_drive_hash_index() -> DriveHashIndex:
+    return DriveHashIndex(get_drive_listing_cache())
+
+
+def drive_upload_dedup(parent_id: str, filename: str, data) -> tuple:
+    """İçerik klasörde zaten varsa mevcut linki, yoksa yeni yüklemenin linkini döndürür: (link, yeniden_kullanildi)."""
+
+    def _yukle():
+        get_drive_rate_limiter().acquire()
+        gfile = drive.CreateFile({
+            'title': filename,
+            'parents': [{'id': parent_id}],
+            'mimeType': mimetypes.guess_type(filename)[0] or "application/octet-stream",
+        })
+        gfile.content = _yukleme_akisi(data)
+        # PyDrive2 her iş parçacığı için ayrı httplib2 bağlantısı kullanır
+        gfile.Upload()
+        return {k: gfile.get(k) for k in ("id", "title", "mimeType", "modifiedDate", "fileSize")}
+
+    file_id, yeniden = get_drive_hash_index().upload_once(parent_id, content_md5(data), _yukle)
+    return drive_file_link(file_id), yeniden
+
+
+def drive_upload(parent_id: str, filename: str, data) -> str:
+    """İçeriği diske yazmadan doğrudan bellekten parent klasöre yükler (aynı içerik tekrar aktarılmaz)."""
+    return drive_upload_dedup(parent_id, filename, data)[0]
+
+
+def upload_many(isler: list, ilerleme=None, isci: int = DRIVE_YUKLEME_ISCI) -> dict:
+    """isler: {"anahtar", "parent_id", "filename", "data"} sözlükleri (data: bytes ya da dosya nesnesi).
+
+    Dönen sözlük anahtar → {"link", "yeniden", "hata"}; ilerleme(anahtar, sonuc, tamamlanan, toplam)
+    her dosya bittiğinde ana iş parçacığında çağrılır.
+    """
+    sonuclar = {}
+    if not isler:
+        return sonuclar
+    with ThreadPoolExecutor(max_workers=max(1, min(isci, len(isler)))) as havuz:
+        gelecekler = {
+            havuz.submit(drive_upload_dedup, is_["parent_id"], is_["filename"], is_["data"]): is_["anahtar"]
+            for is_ in isler
+        }
+        for tamamlanan, gelecek in enumerate(as_completed(gelecekler), start=1):
+            anahtar = gelecekler[gelecek]
+            try:
+                link, yeniden = gelecek.result()
+                sonuclar[anahtar] = {"link": link, "yeniden": yeniden, "hata": None}
+            except Exception as e:
+                sonuclar[anahtar] = {"link": "", "yeniden": False, "hata": e}
+            if ilerleme is not None:
+                ilerleme(anahtar, sonuclar[anahtar], tamamlanan, len(isler))
+    return sonuclar
+
+
+def upload_with_progress(isler: list, etiket: str = "Dosyalar yükleniyor") -> dict:
+    """upload_many + Streamlit ilerleme çubuğu ve dosya bazında durum satırı."""
+    if not isler:
+        return {}
+    cubuk = st.progress(0.0, text=f"{etiket} (0/{len(isler)})")
+    adlar = {is_["anahtar"]: is_.get("ad", is_["filename"]) for is_ in isler}
+
+    def _ilerleme(anahtar, sonuc, tamamlanan, toplam):
+        cubuk.progress(tamamlanan / toplam, text=f"{etiket} ({tamamlanan}/{toplam})")
+        if sonuc["hata"] is not None:
+            st.error(f"{adlar[anahtar]} yüklenemedi: {sonuc['hata']}")
+
+    sonuclar = upload_many(isler, ilerleme=_ilerleme)
+    cubuk.empty()
+    return sonuclar
+
+
+# ===========================
+# ==== İÇERİK ARŞİVİ: YEREL DRIVE İNDEKSİ
+# ===========================
+# Arşiv klasörleri arka planda taranır; dosya bilgileri ve küçük resimler yerel
+# bir dizinde tutulur. İlk tarama klasör ağacını gezer, sonraki yenilemeler tek
+# bir "modifiedDate > son değişiklik" sorgusuyla yalnızca değişenleri işler.
+# Silinen dosyalar tam taramada düşer. Sayfa yalnızca yerel indeksi okur.
+
+DRIVE_FOLDER_IDS = {
+    "Genel Medya Klasörü": "1gFAaK-6v1e3346e-W0TsizOqSq43vHLY",
+    "Ürün Görselleri":      "18NNlmadm5NNFkI1Amzt_YMwB53j6AmbD",
+    "Kalite Evrakları":     "1pbArzYfA4Tp50zvdyTzSPF2ThrMWrGJc",
+}
+ARSIV_DIZINI = ".icerik_arsivi"
+ARSIV_KUCUK_BOYUT = (320, 320)
+ARSIV_YENILEME_SN = 15 * 60            # sayfa açıldığında artımlı yenileme aralığı
+ARSIV_TAM_TARAMA_SN = 24 * 60 * 60     # silinenleri düşürmek için tam tarama aralığı
+ARSIV_YOKLAMA_SN = 2                   # tarama sürerken durum kutusunun yenilenme aralığı
+ARSIV_ALANLARI = (
+    "items(id,title,mimeType,modifiedDate,fileSize,thumbnailLink,alternateLink,parents(id),labels(trashed)),"
+    "nextPageToken"
+)
+ARSIV_TURLERI = {"image/": "Görsel", "video/": "Video", "application/pdf": "PDF"}
+
+
+def _arsiv_turu(mime: str) -> str:
+    for onek, tur in ARSIV_TURLERI.items():
+        if str(mime or "").startswith(onek):
+            return tur
+    return "Diğer"
+
+
+def _markdown_metni(metin) -> str:
+    """Dosya adını markdown bağlantı metninde güvenle göstermek için özel karakterleri kaçırır."""
+    return re.sub(r"([\\`*_{}\[\]()<>#+\-.!|~$])", r"\\\1", str(metin or ""))
+
+
+class DriveArchiveIndexer:
+    """DRIVE_FOLDER_IDS altındaki dosyaların yerel indeksi ve küçük resim önbelleği."""
+
+    def __init__(self, kokler: dict = None, dizin: str = ARSIV_DIZINI):
+        self.kokler = dict(kokler or DRIVE_FOLDER_IDS)
+        self.dizin = dizin
+        self.kucuk_dizin = os.path.join(dizin, "kucukresim")
+        self.path = os.path.join(dizin, "indeks.json")
+        self._lock = threading.Lock()
+        self._is = None
+        self.durum = {"calisiyor": False, "hata": "", "islenen": 0}
+        self.klasorler, self.dosyalar = {}, {}
+        self.son_degisiklik, self.son_tam_tarama, self.son_guncelleme = "", 0.0, 0.0
+        self.surum = 0
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    veri = json.load(f)
+                self.klasorler = veri.get("klasorler", {})
+                self.dosyalar = veri.get("dosyalar", {})
+                self.son_degisiklik = veri.get("son_degisiklik", "")
+                self.son_tam_tarama = float(veri.get("son_tam_tarama", 0.0))
+                self.son_guncelleme = float(veri.get("son_guncelleme", 0.0))
+            except Exception:
+                self.klasorler, self.dosyalar = {}, {}
+
+    # ---- Kalıcılık ----
+    def _yaz(self):
+        os.makedirs(self.dizin, exist_ok=True)
+        with self._lock:
+            veri = {
+                "klasorler": self.klasorler, "dosyalar": self.dosyalar, "son_degisiklik": self.son_degisiklik,
+                "son_tam_tarama": self.son_tam_tarama, "son_guncelleme": self.son_guncelleme,
+            }
+            with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=self.dizin, delete=False, suffix=".tmp") as f:
+                json.dump(veri, f, ensure_ascii=False)
+                gecici = f.name
+            os.replace(gecici, self.path)
+
+    # ---- Drive ----
+    @staticmethod
+    def _sorgu(q: str):
+        liste = drive.ListFile({'q': q, 'fields': ARSIV_ALANLARI, 'maxResults': DRIVE_LISTE_SAYFA})
+        while True:
+            get_drive_rate_limiter().acquire()
+            try:
+                sayfa = next(liste)
+            except StopIteration:
+                return
+            yield from sayfa
+
+    def _kucuk_resim(self, kayit: dict, link: str) -> str:
+        """Drive'ın küçük resmini indirip ARSIV_KUCUK_BOYUT'a küçültür; yerel dosya yolunu döndürür."""
+        if not link:
+            return ""
+        hedef = os.path.join(self.kucuk_dizin, f"{kayit['id']}.jpg")
+        get_drive_rate_limiter().acquire()
+        yanit, icerik = drive.auth.Get_Http_Object().request(link)
+        if int(yanit.status) != 200:
+            return ""
+        os.makedirs(self.kucuk_dizin, exist_ok=True)
+        try:
+            from PIL import Image
+            resim = Image.open(io.BytesIO(icerik)).convert("RGB")
+            resim.thumbnail(ARSIV_KUCUK_BOYUT)
+            resim.save(hedef, "JPEG", quality=80)
+        except Exception:
+            with open(hedef, "wb") as f:
+                f.write(icerik)
+        return hedef
+
+    def _kayit(self, f, klasor: dict) -> dict:
+        onceki = self.dosyalar.get(f['id'], {})
+        kayit = {
+            "id": f['id'],
+            "title": f.get('title', ""),
+            "mimeType": f.get('mimeType', ""),
+            "modifiedDate": f.get('modifiedDate', ""),
+            "fileSize": int(f.get('fileSize') or 0),
+            "link": f.get('alternateLink') or drive_file_link(f['id']),
+            "kok": klasor["kok"],
+            "yol": klasor["yol"],
+            "kucuk": onceki.get("kucuk", ""),
+        }
+        # Küçük resim yalnızca dosya değiştiyse yeniden üretilir
+        if not kayit["kucuk"] or not os.path.exists(kayit["kucuk"]) or onceki.get("modifiedDate") != kayit["modifiedDate"]:
+            try:
+                kayit["kucuk"] = self._kucuk_resim(kayit, f.get('thumbnailLink'))
+            except Exception:
+                kayit["kucuk"] = ""
+        return kayit
+
+    def _agaci_tara(self, baslangic: dict, klasorler: dict, dosyalar: dict):
+        kuyruk = list(baslangic.items())
+        while kuyruk:
+            folder_id, klasor = kuyruk.pop()
+            klasorler[folder_id] = klasor
+            for f in self._sorgu(f"'{drive_query_literal(folder_id)}' in parents and trashed = false"):
+                if f.get('mimeType') == DRIVE_KLASOR_MIME:
+                    alt_yol = f"{klasor['yol']}/{f['title']}" if klasor["yol"] else f['title']
+                    kuyruk.append((f['id'], {"kok": klasor["kok"], "yol": alt_yol}))
+                    continue
+                dosyalar[f['id']] = self._kayit(f, klasor)
+                self.durum["islenen"] += 1
+                self.son_degisiklik = max(self.son_degisiklik, dosyalar[f['id']]["modifiedDate"] or "")
+
+    def _tam_tarama(self):
+        klasorler, dosyalar = {}, {}
+        self.son_degisiklik = ""
+        self._agaci_tara({fid: {"kok": ad, "yol": ""} for ad, fid in self.kokler.items()}, klasorler, dosyalar)
+        # Artık var olmayan dosyaların küçük resimleri silinir
+        for eski_id, eski in self.dosyalar.items():
+            if eski_id not in dosyalar and eski.get("kucuk") and os.path.exists(eski["kucuk"]):
+                os.remove(eski["kucuk"])
+        with self._lock:
+            self.klasorler, self.dosyalar = klasorler, dosyalar
+            self.son_tam_tarama = time.time()
+
+    def _artimli_tarama(self):
+        klasorler, dosyalar = dict(self.klasorler), dict(self.dosyalar)
+        q = f"modifiedDate > '{drive_query_literal(self.son_degisiklik)}'"
+        for f in self._sorgu(q):
+            ust = [p.get('id') for p in f.get('parents', []) if p.get('id') in klasorler]
+            trashed = bool((f.get('labels') or {}).get('trashed'))
+            if not ust:
+                continue
+            klasor = klasorler[ust[0]]
+            if f.get('mimeType') == DRIVE_KLASOR_MIME:
+                if not trashed and f['id'] not in klasorler:
+                    alt_yol = f"{klasor['yol']}/{f['title']}" if klasor["yol"] else f['title']
+                    self._agaci_tara({f['id']: {"kok": klasor["kok"], "yol": alt_yol}}, klasorler, dosyalar)
+                continue
+            if trashed:
+                dosyalar.pop(f['id'], None)
+            else:
+                dosyalar[f['id']] = self._kayit(f, klasor)
+                self.durum["islenen"] += 1
+            self.son_degisiklik = max(self.son_degisiklik, f.get('modifiedDate') or "")
+        with self._lock:
+            self.klasorler, self.dosyalar = klasorler, dosyalar
+
+    def refresh(self, tam: bool = False):
+        """Tarama yapar (ilk seferde ve tam=True ise klasör ağacı baştan gezilir)."""
+        self.durum.update(calisiyor=True, hata="", islenen=0)
+        try:
+            kokler_degisti = {k["kok"] for k in self.klasorler.values() if not k["yol"]} != set(self.kokler)
+            if tam or not self.son_degisiklik or kokler_degisti \
+                    or time.time() - self.son_tam_tarama > ARSIV_TAM_TARAMA_SN:
+                self._tam_tarama()
+            else:
+                self._artimli_tarama()
+            self.son_guncelleme = time.time()
+            self.surum += 1
+            self._yaz()
+        except Exception as e:
+            self.durum["hata"] = str(e)
+        finally:
+            self.durum["calisiyor"] = False
+
+    def start(self, tam: bool = False) -> bool:
+        """Arka plan taramasını başlatır; zaten çalışıyorsa False döner."""
+        with self._lock:
+            if self._is is not None and self._is.is_alive():
+                return False
+            self._is = threading.Thread(target=self.refresh, kwargs={"tam": tam}, daemon=True, name="drive-arsiv")
+            self._is.start()
+            return True
+
+    def ensure_fresh(self) -> None:
+        if time.time() - self.son_guncelleme > ARSIV_YENILEME_SN:
+            self.start()
+
+    def frame(self) -> pd.DataFrame:
+        with self._lock:
+            kayitlar = list(self.dosyalar.values())
+        kolonlar = ["id", "title", "mimeType", "modifiedDate", "fileSize", "link", "kok", "yol", "kucuk"]
+        df = pd.DataFrame(kayitlar, columns=kolonlar)
+        df["Tür"] = df["mimeType"].map(_arsiv_turu)
+        df["Tarih"] = pd.to_datetime(df["modifiedDate"], errors="coerce", utc=True).dt.tz_convert(None)
+        df["_arama"] = _katlanmis_seri(df["title"] + " " + df["yol"])
+        return df.sort_values("Tarih", ascending=False, kind="stable").reset_index(drop=True)
+
+
+@st.cache_resource
+def get_archive_indexer() -> DriveArchiveIndexer:
+    return DriveArchiveIndexer()
+
+
+@st.cache_data(show_spinner=False, max_entries=2)
+def archive_frame(surum: int, son_guncelleme: float) -> pd.DataFrame:
+    """İndeks sürümü değişene kadar aynı DataFrame (arama metni önceden katlanmış)."""
+    return get_archive_indexer().frame()
 
 
 # ===========================
@@ -1073,13 +4241,14 @@ import streamlit as st
 menuler = [
     ("Özet Ekran", "🧩"),
     ("Cari Kayıtlar", "👤"),
+    ("Müşteri Portföyü", "📒"),
     ("Temsilci Yönetimi", "🧑‍🤝‍🧑"),
     ("Etkileşim Günlüğü", "☎️"),
     ("Teklif Yönetimi", "💼"),
     ("Proforma Yönetimi", "📄"),
     ("Sipariş Operasyonları", "🚚"),
     ("Fatura işlemleri", "🧾"),
-    ("Tahsilat planı", "💳"),
+    ("Tahsilat Planı", "💳"),
     ("ETA İzleme", "🛳️"),
     ("Fuar Kayıtları", "🎫"),
     ("İçerik Arşivi", "🗂️"),
@@ -1262,395 +4431,187 @@ if menu == "Özet Ekran":
         unsafe_allow_html=True,
     )
 
-    invoices_df = df_evrak.copy()
-    if "Tutar" not in invoices_df.columns:
-        invoices_df["Tutar"] = 0
-    invoices_df["Tutar_num"] = invoices_df["Tutar"].apply(smart_to_num).fillna(0.0)
-    toplam_fatura_tutar = float(invoices_df["Tutar_num"].sum())
-
-    date_col = next((col for col in ["Fatura Tarihi", "Tarih"] if col in invoices_df.columns), None)
+    store = refresh_dashboard_store()
     today_norm = pd.Timestamp.today().normalize()
+    ozet = store.snapshot(today_norm)
+
+    def _tarih_str(value):
+        return "" if value is None or pd.isna(value) else pd.Timestamp(value).strftime("%d/%m/%Y")
+
+    def _gun_farki(bitis, baslangic):
+        if bitis is None or baslangic is None or pd.isna(bitis) or pd.isna(baslangic):
+            return ""
+        return int((pd.Timestamp(bitis).normalize() - pd.Timestamp(baslangic).normalize()).days)
 
-    if date_col:
-        invoices_df[date_col] = pd.to_datetime(invoices_df[date_col], errors="coerce")
     # ---- Bekleyen Teklifler ----
     st.markdown("### Bekleyen Teklifler")
-    bekleyen_teklifler = df_teklif[df_teklif["Durum"] == "Açık"] if "Durum" in df_teklif.columns else pd.DataFrame()
-    try:
-        toplam_teklif = pd.to_numeric(bekleyen_teklifler["Tutar"], errors="coerce").sum()
-    except:
-        toplam_teklif = 0
+    toplam_teklif = ozet["toplam_teklif"]
     st.markdown(f"<div style='font-size:1.3em; color:#11998e; font-weight:bold;'>Toplam: {toplam_teklif:,.2f} USD</div>", unsafe_allow_html=True)
-    if bekleyen_teklifler.empty:
+    if not ozet["acik_teklifler"]:
         st.info("Bekleyen teklif yok.")
     else:
-        st.dataframe(bekleyen_teklifler[["Müşteri Adı", "Tarih", "Teklif No", "Tutar", "Ürün/Hizmet", "Açıklama"]], use_container_width=True)
+        st.dataframe(pd.DataFrame([k["satir"] for k in ozet["acik_teklifler"]]), use_container_width=True)
 
     # ---- Bekleyen Proformalar ----
     st.markdown("### Bekleyen Proformalar")
-    bekleyen_proformalar = df_proforma[df_proforma["Durum"] == "Beklemede"] if "Durum" in df_proforma.columns else pd.DataFrame()
-    try:
-        toplam_proforma = pd.to_numeric(bekleyen_proformalar["Tutar"], errors="coerce").sum()
-    except:
-        toplam_proforma = 0
+    toplam_proforma = ozet["toplam_proforma"]
     st.markdown(f"<div style='font-size:1.3em; color:#f7971e; font-weight:bold;'>Toplam: {toplam_proforma:,.2f} USD</div>", unsafe_allow_html=True)
-    if bekleyen_proformalar.empty:
+    if not ozet["bekleyen_proformalar"]:
         st.info("Bekleyen proforma yok.")
     else:
+        bekleyen_proformalar = pd.DataFrame([k["satir"] for k in ozet["bekleyen_proformalar"]])
         st.dataframe(bekleyen_proformalar[["Müşteri Adı", "Proforma No", "Tarih", "Tutar", "Vade (gün)", "Açıklama"]], use_container_width=True)
 
     # ---- Sevk Bekleyen Siparişler ----
-
-    if "Sevk Durumu" not in df_proforma.columns:
-        df_proforma["Sevk Durumu"] = ""
-    if "Ülke" not in df_proforma.columns:
-        df_proforma["Ülke"] = ""
-    if "Termin Tarihi" not in df_proforma.columns:
-        df_proforma["Termin Tarihi"] = ""     
-    sevk_bekleyenler = df_proforma[(df_proforma["Durum"] == "Siparişe Dönüştü") & (~df_proforma["Sevk Durumu"].isin(["Sevkedildi", "Ulaşıldı"]))] if "Durum" in df_proforma.columns else pd.DataFrame()
-    sevk_bekleyen_sayisi = len(sevk_bekleyenler)
-    st.markdown(f"### Sevk Bekleyen Siparişler ({sevk_bekleyen_sayisi} Adet)")
-    try:
-        toplam_siparis = pd.to_numeric(sevk_bekleyenler["Tutar"], errors="coerce").sum()
-    except:
-        toplam_siparis = 0
+    sevk_bekleyenler = sorted(
+        ozet["sevk_bekleyenler"],
+        key=lambda k: (k["termin"] is None, k["termin"] or pd.Timestamp.min),
+    )
+    st.markdown(f"### Sevk Bekleyen Siparişler ({len(sevk_bekleyenler)} Adet)")
+    toplam_siparis = ozet["toplam_siparis"]
     st.markdown(f"<div style='font-size:1.3em; color:#185a9d; font-weight:bold;'>Toplam: {toplam_siparis:,.2f} USD</div>", unsafe_allow_html=True)
-    if sevk_bekleyenler.empty:
+    if not sevk_bekleyenler:
         st.info("Sevk bekleyen sipariş yok.")
     else:
-        sevk_bekleyenler = sevk_bekleyenler.copy()
-        sevk_bekleyenler["Termin Tarihi"] = pd.to_datetime(
-            sevk_bekleyenler["Termin Tarihi"], errors="coerce"
-        )
-        sevk_bekleyenler["Proforma Tarihi"] = pd.to_datetime(
-            sevk_bekleyenler["Tarih"], errors="coerce"
-        )        
-        sevk_bekleyenler = sevk_bekleyenler.sort_values(
-            by="Termin Tarihi", ascending=True, na_position="last"
-        )
-
-        display_df = sevk_bekleyenler.copy()
-        display_df["Termin - Bugün Farkı (Gün)"] = (
-            display_df["Termin Tarihi"] - today_norm
-        ).dt.days
-        display_df["Sipariş Üzerinden Geçen Gün"] = (
-            display_df["Termin Tarihi"] - display_df["Proforma Tarihi"]
-        ).dt.days
-
-        for tarih_kolon in ["Termin Tarihi", "Proforma Tarihi"]:
-            display_df[tarih_kolon] = (
-                display_df[tarih_kolon]
-                .dt.strftime("%d/%m/%Y")
-                .fillna("")
-                .replace({"NaT": ""})
-            )
-
-        for gun_kolon in ["Termin - Bugün Farkı (Gün)", "Sipariş Üzerinden Geçen Gün"]:
-            display_df[gun_kolon] = display_df[gun_kolon].apply(
-                lambda x: "" if pd.isna(x) else int(x)
-            )
-
-        st.dataframe(
-            display_df[
-                [
-                    "Müşteri Adı",
-                    "Ülke",
-                    "Proforma No",
-                    "Proforma Tarihi",
-                    "Termin Tarihi",
-                    "Termin - Bugün Farkı (Gün)",
-                    "Sipariş Üzerinden Geçen Gün",                   
-                    "Tutar",
-                    "Açıklama",
-                ]
-            ],
-            use_container_width=True,
-        )
+        display_df = pd.DataFrame([
+            {
+                "Müşteri Adı": k["satir"]["Müşteri Adı"],
+                "Ülke": k["satir"]["Ülke"],
+                "Proforma No": k["satir"]["Proforma No"],
+                "Proforma Tarihi": _tarih_str(k["tarih"]),
+                "Termin Tarihi": _tarih_str(k["termin"]),
+                "Termin - Bugün Farkı (Gün)": _gun_farki(k["termin"], today_norm),
+                "Sipariş Üzerinden Geçen Gün": _gun_farki(k["termin"], k["tarih"]),
+                "Tutar": k["satir"]["Tutar"],
+                "Açıklama": k["satir"]["Açıklama"],
+            }
+            for k in sevk_bekleyenler
+        ])
+        st.dataframe(display_df, use_container_width=True)
 
     # ---- Yolda Olan Siparişler ----
     st.markdown("### ETA Takibindeki Siparişler")
-    eta_yolda = df_proforma[(df_proforma["Sevk Durumu"] == "Sevkedildi") & (~df_proforma["Sevk Durumu"].isin(["Ulaşıldı"]))] if "Sevk Durumu" in df_proforma.columns else pd.DataFrame()
-    sevkiyat_sayisi = len(eta_yolda)
+    eta_yolda = ozet["yoldakiler"]
     st.markdown(
-        f"<div style='font-size:1.3em; color:#c471f5; font-weight:bold;'>Sevkiyat Sayısı: {sevkiyat_sayisi}</div>",
+        f"<div style='font-size:1.3em; color:#c471f5; font-weight:bold;'>Sevkiyat Sayısı: {len(eta_yolda)}</div>",
         unsafe_allow_html=True,
     )
-    if eta_yolda.empty:
+    if not eta_yolda:
         st.info("Yolda olan (sevk edilmiş) sipariş yok.")
     else:
-        eta_display = eta_yolda.copy()
-        eta_display["Proforma No"] = eta_display["Proforma No"].astype(str)
-
-        if not df_eta.empty:
-            eta_lookup = df_eta.copy()
-            eta_lookup["Proforma No"] = eta_lookup["Proforma No"].astype(str)
-            eta_lookup = eta_lookup.sort_values(by="ETA Tarihi", kind="stable")
-            eta_lookup = eta_lookup.drop_duplicates(subset=["Proforma No"], keep="last")
-            eta_display = eta_display.merge(
-                eta_lookup[["Proforma No", "ETA Tarihi"]],
-                on="Proforma No",
-                how="left",
-            )
-        else:
-            eta_display["ETA Tarihi"] = pd.NaT
-
-        eta_display["ETA Tarihi"] = pd.to_datetime(eta_display["ETA Tarihi"], errors="coerce")
-        eta_display["Kalan Gün"] = (
-            eta_display["ETA Tarihi"] - today_norm
-        ).dt.days
-        eta_display["Kalan Gün"] = eta_display["Kalan Gün"].apply(
-            lambda x: "" if pd.isna(x) else int(x)
-        )        
-        eta_display = eta_display.sort_values(
-            by="ETA Tarihi",
-            ascending=True,
-            na_position="last",
-            kind="stable",
-        )
-        eta_display["ETA Tarihi"] = eta_display["ETA Tarihi"].dt.strftime("%d/%m/%Y")
-        eta_display["ETA Tarihi"] = eta_display["ETA Tarihi"].fillna("").replace({"NaT": ""})
+        eta_satirlari = []
+        for k in eta_yolda:
+            eta_tarihi = ozet["eta_son"].get(k["proforma_no"])
+            eta_satirlari.append({
+                "Müşteri Adı": k["satir"]["Müşteri Adı"],
+                "Ülke": k["satir"]["Ülke"],
+                "Proforma No": k["proforma_no"],
+                "Tarih": k["satir"]["Tarih"],
+                "ETA Tarihi": eta_tarihi,
+                "Tutar": k["satir"]["Tutar"],
+                "Kalan Gün": _gun_farki(eta_tarihi, today_norm),
+                "Açıklama": k["satir"]["Açıklama"],
+            })
+        eta_satirlari.sort(key=lambda r: (r["ETA Tarihi"] is None, r["ETA Tarihi"] or pd.Timestamp.min))
+        for satir in eta_satirlari:
+            satir["ETA Tarihi"] = _tarih_str(satir["ETA Tarihi"])
+        st.dataframe(pd.DataFrame(eta_satirlari), use_container_width=True)
 
-        st.dataframe(
-            eta_display[[
-                "Müşteri Adı",
-                "Ülke",
-                "Proforma No",
-                "Tarih",
-                "ETA Tarihi",
-                "Tutar",
-                "Kalan Gün",
-                "Açıklama",
-            ]],
-            use_container_width=True,
-        )
     # ---- Son Teslim Edilen Siparişler ----
     st.markdown("### Son Teslim Edilen 5 Sipariş")
-    if "Sevk Durumu" in df_proforma.columns:
-        teslim_edilenler = df_proforma[df_proforma["Sevk Durumu"] == "Ulaşıldı"].copy()
-        if not teslim_edilenler.empty:
-            # Ana kolonları normalize et
-            for text_col in ["Proforma No", "Müşteri Adı", "Ülke"]:
-                if text_col in teslim_edilenler.columns:
-                    teslim_edilenler[text_col] = (
-                        teslim_edilenler[text_col]
-                        .astype(str)
-                        .str.strip()
-                    )
-
-            # Tarih kolonlarını datetime'a çevir
-            date_cols = [
-                "Proforma Tarihi",
-                "Tarih",
-                "Termin Tarihi",
-                "Sevk Tarihi",
-                "Ulaşma Tarihi",
-            ]
-            for tarih_kolon in date_cols:
-                if tarih_kolon in teslim_edilenler.columns:
-                    teslim_edilenler[tarih_kolon] = pd.to_datetime(
-                        teslim_edilenler[tarih_kolon], errors="coerce"
-                    )
-
-            if "Proforma Tarihi" not in teslim_edilenler.columns and "Tarih" in teslim_edilenler.columns:
-                teslim_edilenler["Proforma Tarihi"] = teslim_edilenler["Tarih"]
-
-            # Son teslim edilenleri sıralayıp tekrarlayan proformaları ele
-            sort_candidates = ["Ulaşma Tarihi", "Sevk Tarihi", "Proforma Tarihi"]
-            sort_col = next(
-                (col for col in sort_candidates if col in teslim_edilenler.columns),
-                None,
-            )
-
-            if sort_col is not None:
-                teslim_edilenler = teslim_edilenler.sort_values(
-                    by=sort_col, ascending=False, na_position="last"
-                )
-
-            if "Proforma No" in teslim_edilenler.columns:
-                teslim_edilenler = teslim_edilenler.drop_duplicates(
-                    subset=["Proforma No"], keep="first"
-                )
-
-            teslim_edilenler = teslim_edilenler.head(5).reset_index(drop=True)
-
-            if {
-                "Sevk Tarihi",
-                "Proforma Tarihi",
-            }.issubset(teslim_edilenler.columns):
-                teslim_edilenler["Gün Farkı"] = (
-                    teslim_edilenler["Sevk Tarihi"]
-                    - teslim_edilenler["Proforma Tarihi"]
-                ).dt.days
-            
-            for kolon in [
-                "Proforma Tarihi",
-                "Termin Tarihi",
-                "Sevk Tarihi",
-                "Ulaşma Tarihi",
-            ]:
-                if kolon in teslim_edilenler.columns:
-                    teslim_edilenler[kolon] = (
-                        teslim_edilenler[kolon]
-                        .dt.strftime("%d/%m/%Y")
-                        .fillna("")
-                        .replace({"NaT": ""})
-                    )
-            if "Gün Farkı" in teslim_edilenler.columns:
-                teslim_edilenler["Gün Farkı"] = teslim_edilenler["Gün Farkı"].apply(
-                    lambda x: "" if pd.isna(x) else int(x)
-                )
-
-            display_columns = [
-                "Müşteri Adı",
-                "Ülke",
-                "Proforma No",
-                "Proforma Tarihi",
-                "Termin Tarihi",
-                "Sevk Tarihi",
-                "Ulaşma Tarihi",
-                "Gün Farkı",
-                "Tutar",
-                "Açıklama",
-            ]
-
-            mevcut_kolonlar = [
-                kolon for kolon in display_columns if kolon in teslim_edilenler.columns
-            ]
-
-            st.dataframe(
-                teslim_edilenler[mevcut_kolonlar],
-                use_container_width=True,
-            )
-        else:
-            st.info("Teslim edilmiş sipariş yok.")
+    teslim_adaylari = sorted(
+        ozet["teslim_edilenler"],
+        key=lambda k: k["ulasma"] or k["sevk"] or k["tarih"] or pd.Timestamp.min,
+        reverse=True,
+    )
+    teslim_satirlari, gorulen_proformalar = [], set()
+    for k in teslim_adaylari:
+        if k["proforma_no"] in gorulen_proformalar:
+            continue
+        gorulen_proformalar.add(k["proforma_no"])
+        teslim_satirlari.append({
+            "Müşteri Adı": str(k["satir"]["Müşteri Adı"]).strip(),
+            "Ülke": str(k["satir"]["Ülke"]).strip(),
+            "Proforma No": k["proforma_no"],
+            "Proforma Tarihi": _tarih_str(k["tarih"]),
+            "Termin Tarihi": _tarih_str(k["termin"]),
+            "Sevk Tarihi": _tarih_str(k["sevk"]),
+            "Ulaşma Tarihi": _tarih_str(k["ulasma"]),
+            "Gün Farkı": _gun_farki(k["sevk"], k["tarih"]),
+            "Tutar": k["satir"]["Tutar"],
+            "Açıklama": k["satir"]["Açıklama"],
+        })
+        if len(teslim_satirlari) == 5:
+            break
+    if teslim_satirlari:
+        st.dataframe(pd.DataFrame(teslim_satirlari), use_container_width=True)
     else:
         st.info("Teslim edilmiş sipariş yok.")
 
     # ---- Vade Takibi Tablosu (HERKES GÖRÜR) ----
     st.markdown("### Vadeli Fatura ve Tahsilat Takibi")
 
-    for col in ["Vade Tarihi", "Ödendi", "Ödenen Tutar"]:
-        if col not in invoices_df.columns:
-            if col == "Vade Tarihi":
-                invoices_df[col] = ""
-            elif col == "Ödendi":
-                invoices_df[col] = False
-            else:
-                invoices_df[col] = 0.0
-
-    invoices_df["Ödendi"] = invoices_df["Ödendi"].fillna(False).astype(bool)
-    invoices_df["Ödenen Tutar"] = pd.to_numeric(
-        invoices_df["Ödenen Tutar"], errors="coerce"
-    ).fillna(0.0)
-    kalan_serisi = (
-        invoices_df["Tutar_num"].fillna(0.0) - invoices_df["Ödenen Tutar"]
-    ).clip(lower=0.0)
-
-    vade_ts = pd.to_datetime(invoices_df["Vade Tarihi"], errors="coerce")
-    outstanding_mask = kalan_serisi > 0.01
-    vadesi_gelmemis_m = (vade_ts > today_norm) & outstanding_mask
-    vadesi_bugun_m = (vade_ts.dt.date == today_norm.date()) & outstanding_mask
-    gecikmis_m = (vade_ts < today_norm) & outstanding_mask
-
-    tg_sum = float(kalan_serisi.loc[vadesi_gelmemis_m].sum())
-    tb_sum = float(kalan_serisi.loc[vadesi_bugun_m].sum())
-    gec_sum = float(kalan_serisi.loc[gecikmis_m].sum())
-
+    kovalar = ozet["vade_kovalari"]
     c1, c2, c3 = st.columns(3)
-    c1.metric("Vadeleri Gelmeyen", f"{tg_sum:,.2f} USD", f"{int(vadesi_gelmemis_m.sum())} Fatura")
-    c2.metric("Bugün Vadesi Dolan", f"{tb_sum:,.2f} USD", f"{int(vadesi_bugun_m.sum())} Fatura")
-    c3.metric("Geciken Ödemeler", f"{gec_sum:,.2f} USD", f"{int(gecikmis_m.sum())} Fatura")
-
-    for col in ["Proforma No", "Vade (gün)", "Ödendi", "Ülke", "Satış Temsilcisi", "Ödeme Şekli"]:
-        if col not in invoices_df.columns:
-            invoices_df[col] = "" if col != "Ödendi" else False
-    invoices_df["Ödendi"] = invoices_df["Ödendi"].fillna(False).astype(bool)
-
-    vade_df = invoices_df[
-        invoices_df["Vade Tarihi"].notna() & outstanding_mask
-    ].copy()
+    c1.metric("Vadeleri Gelmeyen", f"{kovalar['gelmemis'][0]:,.2f} USD", f"{kovalar['gelmemis'][1]} Fatura")
+    c2.metric("Bugün Vadesi Dolan", f"{kovalar['bugun'][0]:,.2f} USD", f"{kovalar['bugun'][1]} Fatura")
+    c3.metric("Geciken Ödemeler", f"{kovalar['gecikmis'][0]:,.2f} USD", f"{kovalar['gecikmis'][1]} Fatura")
+
+    vade_df = pd.DataFrame([
+        {
+            "Müşteri Adı": k["satir"]["Müşteri Adı"],
+            "Ülke": k["satir"]["Ülke"],
+            "Fatura No": k["satir"]["Fatura No"],
+            "Vade Tarihi": k["vade"],
+            "Tutar": k["satir"]["Tutar"],
+            "Kalan Gün": _gun_farki(k["vade"], today_norm),
+            "Kalan Bakiye": f"{k['kalan']:,.2f} USD",
+        }
+        for k in ozet["acik_faturalar"]
+    ])
     gecikmis_df = pd.DataFrame()
     if vade_df.empty:
         st.info("Açık vade kaydı yok.")
     else:
-        vade_df["Vade Tarihi"] = pd.to_datetime(vade_df["Vade Tarihi"])
-        vade_df["Kalan Gün"] = (vade_df["Vade Tarihi"] - pd.to_datetime(datetime.date.today())).dt.days
-        vade_df = vade_df.sort_values("Kalan Gün", ascending=True)
-        gecikmis_df = vade_df[vade_df["Kalan Gün"] < 0].copy()
-        vade_df_display = vade_df.copy()
-        vade_df_display["Kalan Bakiye"] = vade_df_display.index.map(kalan_serisi.get)
-        vade_df_display["Kalan Bakiye"] = vade_df_display["Kalan Bakiye"].fillna(0.0).map(lambda x: f"{x:,.2f} USD")
-        st.dataframe(
-            vade_df_display[["Müşteri Adı", "Ülke", "Fatura No", "Vade Tarihi", "Tutar", "Kalan Gün", "Kalan Bakiye"]],
-            use_container_width=True,
-        )
+        vade_df = vade_df.sort_values("Kalan Gün", ascending=True, kind="stable")
+        gecikmis_df = vade_df[vade_df["Kalan Gün"] < 0]
+        st.dataframe(vade_df, use_container_width=True)
 
     st.markdown("#### Gecikmiş Ödemeler")
     if not gecikmis_df.empty:
-        gecikmis_display = gecikmis_df.copy()
-        gecikmis_display["Kalan Bakiye"] = gecikmis_display.index.map(kalan_serisi.get)
-        gecikmis_display["Kalan Bakiye"] = gecikmis_display["Kalan Bakiye"].fillna(0.0).map(lambda x: f"{x:,.2f} USD")
-        st.dataframe(
-            gecikmis_display[["Müşteri Adı", "Ülke", "Fatura No", "Vade Tarihi", "Tutar", "Kalan Gün", "Kalan Bakiye"]],
-            use_container_width=True,
-        )
+        st.dataframe(gecikmis_df, use_container_width=True)
     else:
         st.info("Gecikmiş ödeme bulunmuyor.")
     st.markdown("### Satış Analitiği Özeti")
 
     summary_cols = st.columns(4)
-    summary_cols[0].metric("Toplam Fatura Tutarı", f"{toplam_fatura_tutar:,.2f} USD")
-
-    if date_col and invoices_df[date_col].notna().any():
-        last_30_start = today_norm - pd.Timedelta(days=29)
-        last_30_end = today_norm + pd.Timedelta(days=1) - pd.Timedelta(milliseconds=1)
-        mask_last_30 = invoices_df[date_col].between(last_30_start, last_30_end, inclusive="both")
-        last_30_total = float(invoices_df.loc[mask_last_30, "Tutar_num"].sum())
-        summary_cols[1].metric("Son 30 Gün Cirosu", f"{last_30_total:,.2f} USD", f"{int(mask_last_30.sum())} Fatura")
-
-        current_year = today_norm.year
-        mask_year = invoices_df[date_col].dt.year == current_year
-        year_total = float(invoices_df.loc[mask_year, "Tutar_num"].sum())
-        summary_cols[2].metric(f"{current_year} Toplamı", f"{year_total:,.2f} USD", f"{int(mask_year.sum())} Fatura")
-    else:
-        summary_cols[1].metric("Son 30 Gün Cirosu", "0.00 USD")
-        summary_cols[2].metric(f"{today_norm.year} Toplamı", "0.00 USD")
+    summary_cols[0].metric("Toplam Fatura Tutarı", f"{ozet['toplam_fatura']:,.2f} USD")
 
-    if "Müşteri Adı" in invoices_df.columns:
-        active_customers = (
-            invoices_df["Müşteri Adı"]
-            .fillna("")
-            .astype(str)
-            .str.strip()
-            .replace("", np.nan)
-            .dropna()
-            .nunique()
-        )
-    else:
-        active_customers = 0
-    summary_cols[3].metric("Aktif Müşteri", str(active_customers))
+    last_30_total, last_30_adet = ozet["son_30"]
+    year_total, year_adet = ozet["yil"]
+    summary_cols[1].metric("Son 30 Gün Cirosu", f"{last_30_total:,.2f} USD", f"{last_30_adet} Fatura")
+    summary_cols[2].metric(f"{today_norm.year} Toplamı", f"{year_total:,.2f} USD", f"{year_adet} Fatura")
+    summary_cols[3].metric("Aktif Müşteri", str(ozet["aktif_musteri"]))
 
-    if invoices_df.empty:
+    if df_evrak.empty:
         st.info("Satış analitiği için fatura kaydı bulunmuyor.")
-    elif "Müşteri Adı" in invoices_df.columns:
-        top_df = invoices_df[invoices_df["Tutar_num"] > 0].copy()
-        top_df["Müşteri Adı"] = top_df["Müşteri Adı"].fillna("Bilinmeyen Müşteri").astype(str).str.strip()
-        top_customers = (
-            top_df.groupby("Müşteri Adı")["Tutar_num"]
-            .sum()
-            .sort_values(ascending=False)
-            .head(5)
-            .reset_index()
-        )
-        if not top_customers.empty:
-            st.markdown("#### En Yüksek Ciroya Sahip İlk 5 Müşteri")
-            display_df = top_customers.copy()
-            display_df["Toplam Ciro"] = display_df["Tutar_num"].map(lambda x: f"{x:,.2f} USD")
-            st.dataframe(display_df[["Müşteri Adı", "Toplam Ciro"]], use_container_width=True)
-        else:
-            st.info("Müşteri bazında ciro hesaplanacak veri bulunamadı.")
+    elif ozet["ilk_5_musteri"]:
+        st.markdown("#### En Yüksek Ciroya Sahip İlk 5 Müşteri")
+        display_df = pd.DataFrame(ozet["ilk_5_musteri"], columns=["Müşteri Adı", "Tutar_num"])
+        display_df["Toplam Ciro"] = display_df["Tutar_num"].map(lambda x: f"{x:,.2f} USD")
+        st.dataframe(display_df[["Müşteri Adı", "Toplam Ciro"]], use_container_width=True)
     else:
-        st.info("Satış analitiği için müşteri bilgisi bulunmuyor.")
+        st.info("Müşteri bazında ciro hesaplanacak veri bulunamadı.")
+
+    with st.expander("🧮 Özet verisini doğrula"):
+        st.caption("Özet tabloları kayıt değişikliklerinde artımlı güncellenir. Gerekirse sıfırdan yeniden hesaplanabilir.")
+        if st.button("Tam yeniden hesapla ve karşılaştır"):
+            farklar = store.verify(_dashboard_frames())
+            store.rebuild(_dashboard_frames(), DATA_VERSION)
+            if farklar:
+                st.warning("Artımlı özet ile tam hesaplama arasında fark bulundu ve düzeltildi: " + ", ".join(farklar))
+            else:
+                st.success("Artımlı özet, tam hesaplamayla birebir aynı.")
 
 
     st.markdown("<hr>", unsafe_allow_html=True)
@@ -1707,6 +4668,8 @@ if menu == "Cari Kayıtlar":
             para_birimi = st.selectbox("Para Birimi", ["USD", "EURO", "TL", "RUBLE"], index=0)
             dt_secim = st.selectbox("DT Seçin", ["DT-1", "DT-2", "DT-3", "DT-4"], index=0)
 
+        benzer_yoksay = st.checkbox("Benzer kayıt uyarısını yok say ve yine de kaydet", value=False)
+
         col_submit1, col_submit2 = st.columns([1, 1])
         save_clicked = col_submit1.form_submit_button("Kaydet")
         save_and_send_clicked = col_submit2.form_submit_button("Kaydet ve Muhasebeye Gönder")
@@ -1741,6 +4704,14 @@ if menu == "Cari Kayıtlar":
                 st.error(e)
             st.stop()
 
+        # --- Bulanık mükerrer kontrol (normalize ad, telefon, e-posta) ---
+        if not benzer_yoksay:
+            benzerler = find_duplicate_customers(name_n, ulke_n, phone_n, email_n)
+            if not benzerler.empty:
+                st.warning("Bu müşteriye benzeyen kayıtlar bulundu. Farklı bir müşteri ise uyarıyı yok sayarak kaydedin.")
+                st.dataframe(benzerler, use_container_width=True)
+                st.stop()
+
         # --- Yeni satır ---
         new_row = {
             "Müşteri Adı": name_n,
@@ -1759,7 +4730,7 @@ if menu == "Cari Kayıtlar":
         }
 
         # --- Kaydet ---
-        df_musteri = pd.concat([df_musteri, pd.DataFrame([new_row])], ignore_index=True)
+        record_insert("musteri", new_row)
         update_excel()
 
         if send_to_accounting:
@@ -1847,16 +4818,10 @@ if menu == "Müşteri Portföyü":
     if len(temsilci_filtre) > 0:
         view_df = view_df[view_df["Satış Temsilcisi"].isin(temsilci_filtre)]
 
-    # Arama filtresi
+    # Arama filtresi (indeks sırası: ad eşleşmeleri önce)
     if aranacak.strip():
-        s = aranacak.strip().lower()
-        def _match(row):
-            fields = [
-                row.get("Müşteri Adı", ""), row.get("Telefon", ""), row.get("E-posta", ""),
-                row.get("Adres", ""), row.get("Ülke", ""), row.get("Satış Temsilcisi", "")
-            ]
-            return any(s in str(x).lower() for x in fields)
-        view_df = view_df[view_df.apply(_match, axis=1)]
+        arama_sonucu = get_customer_search_index(DATA_VERSION, df_musteri).search(aranacak)
+        view_df = view_df.loc[[etiket for etiket in arama_sonucu if etiket in view_df.index]]
 
     # Görüntü tablosu (boşları sadece tabloda “—” yap)
     show_cols = ["Müşteri Adı", "Ülke", "Satış Temsilcisi", "Telefon", "E-posta", "Adres", "Kategori", "Durum", "Vade (Gün)", "Ödeme Şekli", "Para Birimi", "DT Seçimi"]
@@ -1864,8 +4829,12 @@ if menu == "Müşteri Portföyü":
         if c not in view_df.columns:
             view_df[c] = ""
 
-    table_df = view_df[show_cols].replace({np.nan: "—", "": "—"})
-    table_df = table_df.sort_values("Müşteri Adı").reset_index(drop=True)
+    def _musteri_tablo_bicimi(tablo):
+        return tablo.replace({np.nan: "—", "": "—"}).reset_index(drop=True)
+
+    table_df = view_df[show_cols]
+    if not aranacak.strip():
+        table_df = table_df.sort_values("Müşteri Adı", kind="stable")
 
     # Özet bilgi ve dışa aktar
     top_row = st.columns([3, 1])
@@ -1874,7 +4843,7 @@ if menu == "Müşteri Portföyü":
     with top_row[1]:
         st.download_button(
             "CSV indir",
-            data=table_df.to_csv(index=False).encode("utf-8"),
+            data=_musteri_tablo_bicimi(table_df).to_csv(index=False).encode("utf-8"),
             file_name="musteri_listesi.csv",
             mime="text/csv",
             use_container_width=True
@@ -1883,7 +4852,14 @@ if menu == "Müşteri Portföyü":
     if table_df.empty:
         st.markdown("<div style='color:#b00020; font-weight:bold; font-size:1.1em;'>Kayıt bulunamadı.</div>", unsafe_allow_html=True)
     else:
-        st.dataframe(table_df, use_container_width=True)
+        paged_table(
+            table_df,
+            key="musteri_tablo",
+            siralama=["Müşteri Adı", "Ülke", "Satış Temsilcisi", "Kategori", "Durum", "Vade (Gün)"],
+            bicim=_musteri_tablo_bicimi,
+            filtre=(aranacak.strip(), tuple(ulke_filtre), tuple(temsilci_filtre), tuple(durum_filtre)),
+            use_container_width=True,
+        )
 
         st.markdown("#### Toplu Mail Gönderimi")
     with st.expander("Filtrelenmiş müşterilere toplu mail gönder", expanded=False):
@@ -1962,6 +4938,26 @@ if menu == "Müşteri Portföyü":
                         st.success("E-postalar başarıyla gönderildi.")
 
 
+    with st.expander("🔍 Olası Mükerrer Kayıtlar (Müşteri + Fuar)"):
+        esik_yuzde = st.slider("Benzerlik eşiği (%)", min_value=70, max_value=100, value=int(BENZERLIK_ESIGI * 100), step=1)
+        if st.button("Raporu Oluştur", key="mukerrer_rapor"):
+            st.session_state["mukerrer_rapor_esik"] = esik_yuzde / 100
+        if "mukerrer_rapor_esik" in st.session_state:
+            rapor = get_duplicate_customer_report(
+                DATA_VERSION, st.session_state["mukerrer_rapor_esik"], df_musteri, df_fuar_musteri
+            )
+            if rapor.empty:
+                st.success("Eşiği geçen olası mükerrer kayıt bulunamadı.")
+            else:
+                st.caption(f"{len(rapor)} olası mükerrer çift bulundu.")
+                st.dataframe(rapor, use_container_width=True)
+                st.download_button(
+                    "CSV indir",
+                    data=rapor.to_csv(index=False).encode("utf-8"),
+                    file_name="olasi_mukerrer_musteriler.csv",
+                    mime="text/csv",
+                )
+
     st.markdown("<h4 style='margin-top: 24px;'>Müşteri Düzenle / Sil</h4>", unsafe_allow_html=True)
 
     # Düzenleme/Silme için seçim: ID ile — güvenli
@@ -1970,18 +4966,20 @@ if menu == "Müşteri Portföyü":
     if secenek_df.empty:
         st.info("Düzenlemek/silmek için uygun kayıt yok.")
     else:
-        secim = st.selectbox(
+        secim = id_picker(
             "Düzenlenecek Müşteriyi Seçin",
-            options=secenek_df["ID"].tolist(),
-            format_func=lambda _id: f"{secenek_df.loc[secenek_df['ID']==_id, 'Müşteri Adı'].values[0]} ({secenek_df.loc[secenek_df['ID']==_id, 'Kategori'].values[0]})"
+            secenek_df["ID"].tolist(),
+            label_map("musteri", "{Müşteri Adı} ({Kategori})"),
+            key="musteri_duzenle_sec",
         )
 
         # Orijinal index (ana df_musteri içinden) — ID ile eşle
-        orj_mask = (df_musteri["ID"] == secim)
-        if not orj_mask.any():
+        orj_idx = record_label("musteri", secim)
+        if secim is None:
+            pass
+        elif orj_idx is None:
             st.warning("Beklenmeyen hata: Seçilen kayıt ana tabloda bulunamadı.")
         else:
-            orj_idx = df_musteri.index[orj_mask][0]
 
             with st.form("edit_existing_customer"):
                 name = st.text_input("Müşteri Adı", value=str(df_musteri.at[orj_idx, "Müşteri Adı"]))
@@ -2096,7 +5094,7 @@ if menu == "Müşteri Portföyü":
                     st.rerun()
 
             if sil:
-                df_musteri = df_musteri.drop(orj_idx).reset_index(drop=True)
+                record_delete("musteri", secim)
                 update_excel()
                 st.success("Müşteri kaydı silindi!")
                 st.rerun()
@@ -2426,7 +5424,7 @@ if menu == "Etkileşim Günlüğü":
                         "Açıklama": aciklama,
                         "Kullanıcı": st.session_state.user or ""
                     }
-                    df_kayit = pd.concat([df_kayit, pd.DataFrame([new_row])], ignore_index=True)
+                    record_insert("kayit", new_row)
                     update_excel()
                     st.success("Kayıt eklendi!")
                     st.rerun()
@@ -2438,31 +5436,37 @@ if menu == "Etkileşim Günlüğü":
         tip_f = colf2.multiselect("Tip Filtresi", ["Arama", "Görüşme", "Ziyaret"], default=[])
         aranacak = colf3.text_input("Ara (açıklama)", value="")
 
-        view = df_kayit.copy()
-        # Filtreler
-        if musteri_f and musteri_f != "(Hepsi)":
-            view = view[view["Müşteri Adı"] == musteri_f]
-        if tip_f:
-            view = view[view["Tip"].isin(tip_f)]
-        if aranacak.strip():
-            s = aranacak.lower().strip()
-            view = view[view["Açıklama"].astype(str).str.lower().str.contains(s, na=False)]
+        gunluk = interaction_log()
+        secilen = gunluk.query(
+            musteri=musteri_f if musteri_f and musteri_f != "(Hepsi)" else None,
+            tipler=tip_f,
+            arama=aranacak,
+        )
 
-        # Görünüm tablosu
-        if not view.empty:
-            goster = view.copy()
-            goster["Tarih"] = pd.to_datetime(goster["Tarih"], errors="coerce").dt.strftime("%d/%m/%Y")
+        # Görünüm tablosu (yalnızca görünen sayfa dilimlenir)
+        if len(secilen):
             goruntulenecek_kolonlar = ["Müşteri Adı", "Tarih", "Tip", "Açıklama", "Kullanıcı"]
-            mevcut_kolonlar = [kol for kol in goruntulenecek_kolonlar if kol in goster.columns]
-            st.dataframe(
-                goster[mevcut_kolonlar].sort_values("Tarih", ascending=False),
-                use_container_width=True
+
+            def _kayit_sayfa_bicimi(sayfa_df):
+                sayfa_df = sayfa_df.copy()
+                sayfa_df["Tarih"] = pd.to_datetime(sayfa_df["Tarih"], errors="coerce").dt.strftime("%d/%m/%Y")
+                return sayfa_df[[kol for kol in goruntulenecek_kolonlar if kol in sayfa_df.columns]]
+
+            paged_table(
+                lambda bas, bit: gunluk.rows(secilen[bas:bit]),
+                key="kayit_tablo",
+                toplam=len(secilen),
+                bicim=_kayit_sayfa_bicimi,
+                filtre=(musteri_f, tuple(tip_f), aranacak.strip()),
+                use_container_width=True,
             )
 
-            # Dışa aktar
+            # Dışa aktar (filtrelenen tüm kayıtlar)
+            disa = gunluk.rows(secilen).copy()
+            disa["Tarih"] = pd.to_datetime(disa["Tarih"], errors="coerce").dt.strftime("%d/%m/%Y")
             st.download_button(
                 "CSV indir",
-                data=goster.to_csv(index=False).encode("utf-8"),
+                data=disa.to_csv(index=False).encode("utf-8"),
                 file_name="gorusme_kayitlari.csv",
                 mime="text/csv"
             )
@@ -2471,23 +5475,24 @@ if menu == "Etkileşim Günlüğü":
 
         # Düzenleme / Silme
         st.markdown("#### Kayıt Düzenle / Sil")
-        if view.empty:
+        if not len(secilen):
             st.caption("Önce filtreleriyle bir kayıt listeleyin.")
         else:
-            # Seçim ID ile (en son ekleneni üste almak için tarihe göre sıralayalım)
-            view_sorted = view.sort_values("Tarih", ascending=False).reset_index(drop=True)
-            sec_id = st.selectbox(
+            # Seçim ID ile (depo en yeni kaydı üstte döndürür)
+            sec_id = id_picker(
                 "Kayıt Seçin",
-                options=view_sorted["ID"].tolist(),
-                format_func=lambda _id: f"{view_sorted.loc[view_sorted['ID']==_id, 'Müşteri Adı'].values[0]} | {view_sorted.loc[view_sorted['ID']==_id, 'Tip'].values[0]}"
+                gunluk.rows(secilen)["ID"].tolist(),
+                label_map("kayit", "{Müşteri Adı} | {Tip}"),
+                key="kayit_duzenle_sec",
             )
 
             # Orijinal index
-            orj_mask = (df_kayit["ID"] == sec_id)
-            if not orj_mask.any():
+            orj_idx = record_label("kayit", sec_id)
+            if sec_id is None:
+                pass
+            elif orj_idx is None:
                 st.warning("Beklenmeyen hata: Kayıt ana tabloda bulunamadı.")
             else:
-                orj_idx = df_kayit.index[orj_mask][0]
                 with st.form("edit_kayit"):
                     musteri_g = st.selectbox("Müşteri", musteri_options, index=(musteri_options.index(df_kayit.at[orj_idx, "Müşteri Adı"]) if df_kayit.at[orj_idx, "Müşteri Adı"] in musteri_options else 0))
                     try:
@@ -2515,7 +5520,7 @@ if menu == "Etkileşim Günlüğü":
                     st.rerun()
 
                 if sil:
-                    df_kayit = df_kayit.drop(orj_idx).reset_index(drop=True)
+                    record_delete("kayit", sec_id)
                     update_excel()
                     st.success("Kayıt silindi!")
                     st.rerun()
@@ -2528,19 +5533,29 @@ if menu == "Etkileşim Günlüğü":
         with col2:
             bitis = st.date_input("Bitiş Tarihi", value=datetime.date.today(), format="DD/MM/YYYY")
 
-        # Sağlam tarih filtrelemesi
-        tser = pd.to_datetime(df_kayit["Tarih"], errors="coerce")
-        start_ts = pd.to_datetime(baslangic)
-        end_ts = pd.to_datetime(bitis) + pd.Timedelta(days=1) - pd.Timedelta(milliseconds=1)
-        tarih_arasi = df_kayit[tser.between(start_ts, end_ts, inclusive="both")].copy()
-
-        if not tarih_arasi.empty:
-            goster = tarih_arasi.copy()
-            goster["Tarih"] = pd.to_datetime(goster["Tarih"], errors="coerce").dt.strftime('%d/%m/%Y')
-            st.dataframe(goster.sort_values("Tarih", ascending=False), use_container_width=True)
+        # Tarih sıralı depoda ikili arama ile aralık
+        gunluk = interaction_log()
+        secilen = gunluk.query(baslangic=baslangic, bitis=bitis)
+
+        if len(secilen):
+            def _aralik_sayfa_bicimi(sayfa_df):
+                sayfa_df = sayfa_df.copy()
+                sayfa_df["Tarih"] = pd.to_datetime(sayfa_df["Tarih"], errors="coerce").dt.strftime('%d/%m/%Y')
+                return sayfa_df
+
+            paged_table(
+                lambda bas, bit: gunluk.rows(secilen[bas:bit]),
+                key="kayit_aralik_tablo",
+                toplam=len(secilen),
+                bicim=_aralik_sayfa_bicimi,
+                filtre=(baslangic, bitis),
+                use_container_width=True,
+            )
+            disa = gunluk.rows(secilen).copy()
+            disa["Tarih"] = pd.to_datetime(disa["Tarih"], errors="coerce").dt.strftime('%d/%m/%Y')
             st.download_button(
                 "CSV indir",
-                data=goster.to_csv(index=False).encode("utf-8"),
+                data=disa.to_csv(index=False).encode("utf-8"),
                 file_name="gorusme_kayitlari_tarih_araligi.csv",
                 mime="text/csv"
             )
@@ -2795,22 +5810,12 @@ elif menu == "Teklif Yönetimi":
         df_teklif.loc[mask_bos_id, "ID"] = [str(uuid.uuid4()) for _ in range(mask_bos_id.sum())]
         update_excel()
 
-    # --- Otomatik teklif no ---
-    def otomatik_teklif_no():
-        if df_teklif.empty or "Teklif No" not in df_teklif.columns:
-            return "TKF-0001"
-        sayilar = pd.to_numeric(
-            df_teklif["Teklif No"].astype(str).str.extract(r'(\d+)$')[0], errors='coerce'
-        ).dropna().astype(int)
-        yeni_no = (sayilar.max() + 1) if not sayilar.empty else 1
-        return f"TKF-{yeni_no:04d}"
-
 
     # ---------- ÜST ÖZET: Açık teklifler ----------
     tkg = df_teklif.copy()
     tkg["Tarih"] = pd.to_datetime(tkg["Tarih"], errors="coerce")
     acik_teklifler = tkg[tkg["Durum"] == "Açık"].sort_values(["Müşteri Adı", "Teklif No"])
-    toplam_teklif = float(acik_teklifler["Tutar"].apply(smart_to_num).sum())
+    toplam_teklif = float(amount_in_reporting(acik_teklifler).sum())
     acik_teklif_sayi = len(acik_teklifler)
     st.subheader("Açık Pozisyondaki Teklifler")
     st.markdown(
@@ -2846,7 +5851,7 @@ elif menu == "Teklif Yönetimi":
         with st.form("add_teklif"):
             musteri_sec = st.selectbox("Müşteri Seç", musteri_list, key="yeni_teklif_musteri")
             tarih = st.date_input("Tarih", value=datetime.date.today(), format="DD/MM/YYYY")
-            teklif_no = st.text_input("Teklif No", value=otomatik_teklif_no())
+            teklif_no = st.text_input("Teklif No", value=next_document_no("teklif"))
             tutar = st.text_input("Tutar (USD)")
             urun = st.text_input("Ürün/Hizmet")
             aciklama = st.text_area("Açıklama")
@@ -2866,14 +5871,7 @@ elif menu == "Teklif Yönetimi":
                         temiz_musteri = "".join(x if x.isalnum() else "_" for x in str(musteri_sec))
                         temiz_tarih = str(tarih).replace("-", "")
                         pdf_filename = f"{temiz_musteri}__{temiz_tarih}__{teklif_no}.pdf"
-                        temp_path = os.path.join(".", pdf_filename)
-                        with open(temp_path, "wb") as f:
-                            f.write(pdf_file.read())
-                        gfile = drive.CreateFile({'title': pdf_filename, 'parents': [{'id': FIYAT_TEKLIFI_ID}]})
-                        gfile.SetContentFile(temp_path)
-                        gfile.Upload()
-                        pdf_link = f"https://drive.google.com/file/d/{gfile['id']}/view?usp=sharing"
-                        güvenli_sil(temp_path)
+                        pdf_link = drive_upload(FIYAT_TEKLIFI_ID, pdf_filename, pdf_file)
 
                     new_row = {
                         "ID": str(uuid.uuid4()),
@@ -2886,8 +5884,9 @@ elif menu == "Teklif Yönetimi":
                         "Durum": durum,
                         "PDF": pdf_link
                     }
-                    df_teklif = pd.concat([df_teklif, pd.DataFrame([new_row])], ignore_index=True)
+                    record_insert("teklif", new_row)
                     update_excel()
+                    consume_document_no("teklif", teklif_no)
                     st.success("Teklif eklendi!")
                     st.session_state['teklif_view'] = None
                     st.rerun()
@@ -2929,7 +5928,7 @@ elif menu == "Teklif Yönetimi":
             ]
 
         # Toplam ve tablo
-        toplam_view = float(view["Tutar"].apply(smart_to_num).sum())
+        toplam_view = float(amount_in_reporting(view).sum())
         st.markdown(f"<div style='margin:.25rem 0 .5rem 0; font-weight:600;'>Filtreli Toplam: {toplam_view:,.2f} USD</div>", unsafe_allow_html=True)
 
         if not view.empty:
@@ -2951,17 +5950,19 @@ elif menu == "Teklif Yönetimi":
             st.caption("Önce filtrelerle bir kayıt listeleyin.")
         else:
             v_sorted = view.sort_values("Tarih", ascending=False).reset_index(drop=True)
-            sec_id = st.selectbox(
+            sec_id = id_picker(
                 "Teklif Seçiniz",
-                options=v_sorted["ID"].tolist(),
-                format_func=lambda _id: f"{v_sorted.loc[v_sorted['ID']==_id, 'Müşteri Adı'].values[0]} | {v_sorted.loc[v_sorted['ID']==_id, 'Teklif No'].values[0]}"
+                v_sorted["ID"].tolist(),
+                label_map("teklif", "{Müşteri Adı} | {Teklif No}"),
+                key="teklif_duzenle_sec",
             )
 
-            orj_mask = (df_teklif["ID"] == sec_id)
-            if not orj_mask.any():
+            orj_idx = record_label("teklif", sec_id)
+            if sec_id is None:
+                pass
+            elif orj_idx is None:
                 st.warning("Beklenmeyen hata: Teklif ana tabloda bulunamadı.")
             else:
-                orj_idx = df_teklif.index[orj_mask][0]
                 # Var olan PDF linkini göster
                 mevcut_pdf = str(df_teklif.at[orj_idx, "PDF"]) if pd.notna(df_teklif.at[orj_idx, "PDF"]) else ""
                 if mevcut_pdf:
@@ -2996,14 +5997,7 @@ elif menu == "Teklif Yönetimi":
                         temiz_m = "".join(x if x.isalnum() else "_" for x in str(musteri_g or "musteri"))
                         temiz_t = str(tarih_g).replace("-", "")
                         fname = f"{temiz_m}__{temiz_t}__{teklif_no_g}.pdf"
-                        tmp_path = os.path.join(".", fname)
-                        with open(tmp_path, "wb") as f:
-                            f.write(pdf_yeni.read())
-                        gfile = drive.CreateFile({'title': fname, 'parents': [{'id': FIYAT_TEKLIFI_ID}]})
-                        gfile.SetContentFile(tmp_path)
-                        gfile.Upload()
-                        pdf_link_final = f"https://drive.google.com/file/d/{gfile['id']}/view?usp=sharing"
-                        güvenli_sil(tmp_path)
+                        pdf_link_final = drive_upload(FIYAT_TEKLIFI_ID, fname, pdf_yeni)
 
                     df_teklif.at[orj_idx, "Tarih"] = tarih_g
                     df_teklif.at[orj_idx, "Teklif No"] = teklif_no_g
@@ -3018,7 +6012,7 @@ elif menu == "Teklif Yönetimi":
                     st.rerun()
 
                 if sil:
-                    df_teklif = df_teklif.drop(orj_idx).reset_index(drop=True)
+                    record_delete("teklif", sec_id)
                     update_excel()
                     st.success("Teklif silindi!")
                     st.rerun()
@@ -3056,12 +6050,11 @@ elif menu == "Proforma Yönetimi":
         if not hedef_id:
             return
 
-        hedef_mask = df["ID"] == hedef_id
-        if not hedef_mask.any():
+        hedef_idx = record_label("proforma", hedef_id)
+        if hedef_idx is None:
             st.session_state.convert_proforma_id = None
             return
 
-        hedef_idx = df.index[hedef_mask][0]
         hedef_kayit = df.loc[hedef_idx]
 
         st.markdown("#### Siparişe Dönüştürme - Sipariş Formu Yükle")
@@ -3087,15 +6080,7 @@ elif menu == "Proforma Yönetimi":
                 f"{hedef_kayit['Müşteri Adı']}_{hedef_kayit['Proforma No']}_SiparisFormu_"
                 f"{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}.pdf"
             )
-            tmp = os.path.join(".", sf_name)
-            with open(tmp, "wb") as f:
-                f.write(siparis_formu_file.read())
-
-            gfile = drive.CreateFile({'title': sf_name, 'parents': [{'id': SIPARIS_FORMU_FOLDER_ID}]})
-            gfile.SetContentFile(tmp)
-            gfile.Upload()
-            sf_url = f"https://drive.google.com/file/d/{gfile['id']}/view?usp=sharing"
-            güvenli_sil(tmp)
+            sf_url = drive_upload(SIPARIS_FORMU_FOLDER_ID, sf_name, siparis_formu_file)
 
             df.at[hedef_idx, "Sipariş Formu"] = sf_url
             df.at[hedef_idx, "Durum"] = "Siparişe Dönüştü"
@@ -3119,7 +6104,7 @@ elif menu == "Proforma Yönetimi":
     pview = df_proforma.copy()
     pview["Tarih"] = pd.to_datetime(pview["Tarih"], errors="coerce")
     beklemede_kayitlar = pview[pview["Durum"] == "Beklemede"].sort_values(["Tarih","Müşteri Adı"], ascending=[False, True])
-    toplam_bekleyen = float(beklemede_kayitlar["Tutar"].apply(smart_to_num).sum())
+    toplam_bekleyen = float(amount_in_reporting(beklemede_kayitlar).sum())
 
     st.subheader("Bekleyen Proformalar")
     st.markdown(f"<div style='font-weight:600;'>Toplam Bekleyen: {toplam_bekleyen:,.2f} USD</div>", unsafe_allow_html=True)
@@ -3147,7 +6132,7 @@ elif menu == "Proforma Yönetimi":
 
             with st.form("add_proforma"):
                 tarih      = st.date_input("Tarih", value=datetime.date.today())
-                proforma_no= st.text_input("Proforma No")
+                proforma_no= st.text_input("Proforma No", value=next_document_no("proforma"))
                 tutar      = st.text_input("Tutar (USD)")
                 vade_gun   = st.text_input("Vade (gün)")
                 ulke       = st.text_input("Ülke", value=default_ulke, disabled=True)
@@ -3169,12 +6154,7 @@ elif menu == "Proforma Yönetimi":
                             pdf_link = ""
                             if pdf_file and PROFORMA_PDF_FOLDER_ID:
                                 fname = f"{musteri_sec}_{tarih}_{proforma_no}.pdf"
-                                tmp = os.path.join(".", fname)
-                                with open(tmp,"wb") as f: f.write(pdf_file.read())
-                                gfile = drive.CreateFile({'title': fname, 'parents':[{'id': PROFORMA_PDF_FOLDER_ID}]})
-                                gfile.SetContentFile(tmp); gfile.Upload()
-                                pdf_link = f"https://drive.google.com/file/d/{gfile['id']}/view?usp=sharing"
-                                güvenli_sil(tmp)
+                                pdf_link = drive_upload(PROFORMA_PDF_FOLDER_ID, fname, pdf_file)
 
                             new_row = {
                                 "ID": str(uuid.uuid4()),
@@ -3194,8 +6174,9 @@ elif menu == "Proforma Yönetimi":
                                 "Termin Tarihi": "",
                                 "Ulaşma Tarihi": ""
                             }
-                            df_proforma = pd.concat([df_proforma, pd.DataFrame([new_row])], ignore_index=True)
+                            record_insert("proforma", new_row)
                             update_excel()
+                            consume_document_no("proforma", proforma_no.strip())
                             st.success("Proforma eklendi!")
                             st.rerun()
 
@@ -3219,17 +6200,19 @@ elif menu == "Proforma Yönetimi":
                     use_container_width=True
                 )
 
-                sec_id = st.selectbox(
+                sec_id = id_picker(
                     "Proforma Seç",
-                    options=kayitlar["ID"].tolist(),
-                    format_func=lambda _id: f"{kayitlar.loc[kayitlar['ID']==_id,'Proforma No'].values[0]} | {kayitlar.loc[kayitlar['ID']==_id,'Tarih'].dt.strftime('%d/%m/%Y').values[0] if pd.notna(kayitlar.loc[kayitlar['ID']==_id,'Tarih'].values[0]) else ''}"
+                    kayitlar["ID"].tolist(),
+                    label_map("proforma", "{Proforma No} | {Tarih}", tarih_kolonlari=("Tarih",)),
+                    key="proforma_duzenle_sec",
                 )
 
-                orj_mask = (df_proforma["ID"] == sec_id)
-                if not orj_mask.any():
+                idx = record_label("proforma", sec_id)
+                if sec_id is None:
+                    pass
+                elif idx is None:
                     st.warning("Beklenmeyen hata: Kayıt bulunamadı.")
                 else:
-                    idx = df_proforma.index[orj_mask][0]
                     kayit = df_proforma.loc[idx]
 
                     if str(kayit.get("PDF","")).strip():
@@ -3255,12 +6238,7 @@ elif menu == "Proforma Yönetimi":
                         pdf_final = str(kayit.get("PDF",""))
                         if pdf_yeni and PROFORMA_PDF_FOLDER_ID:
                             fname = f"{musteri_sec}_{tarih_}_{proforma_no_}.pdf"
-                            tmp = os.path.join(".", fname)
-                            with open(tmp,"wb") as f: f.write(pdf_yeni.read())
-                            gfile = drive.CreateFile({'title': fname, 'parents':[{'id': PROFORMA_PDF_FOLDER_ID}]})
-                            gfile.SetContentFile(tmp); gfile.Upload()
-                            pdf_final = f"https://drive.google.com/file/d/{gfile['id']}/view?usp=sharing"
-                            güvenli_sil(tmp)
+                            pdf_final = drive_upload(PROFORMA_PDF_FOLDER_ID, fname, pdf_yeni)
 
                         df_proforma.at[idx, "Tarih"] = tarih_
                         df_proforma.at[idx, "Proforma No"] = proforma_no_
@@ -3283,7 +6261,7 @@ elif menu == "Proforma Yönetimi":
                     # --- SİL ---
                     if sil:
                         st.session_state.convert_proforma_id = None
-                        df_proforma = df_proforma.drop(idx).reset_index(drop=True)
+                        record_delete("proforma", sec_id)
                         update_excel()
                         st.success("Kayıt silindi!")
                         st.rerun()
@@ -3325,11 +6303,8 @@ elif menu == "Sipariş Operasyonları":
     siparisler["Tarih"] = pd.to_datetime(siparisler["Tarih"], errors="coerce")
     siparisler = siparisler.sort_values(["Termin Tarihi Order","Tarih"], ascending=[True, True])
 
-    # ---- Görünüm için format
+    # ---- Görünüm için format (yalnızca görünen sayfaya uygulanır)
     siparis_sayisi = len(siparisler)
-    g = siparisler.copy()
-    g["Tarih"] = g["Tarih"].dt.strftime("%d/%m/%Y")
-    g["Termin Tarihi"] = pd.to_datetime(g["Termin Tarihi"], errors="coerce").dt.strftime("%d/%m/%Y")
 
     st.markdown(
         f"<h4 style='color:#219A41; font-weight:bold;'>Tüm Siparişe Dönüşenler ({siparis_sayisi} Adet)</h4>",
@@ -3346,47 +6321,62 @@ elif menu == "Sipariş Operasyonları":
         "Tutar",
         "Açıklama",
     ]
-    g_tab = g[goruntulenecek_kolonlar].reset_index(drop=True)
+    g_tab = siparisler[goruntulenecek_kolonlar].reset_index(drop=True)
     g_tab.index = g_tab.index + 1
     g_tab.index.name = "Sıra"
-    st.dataframe(g_tab, use_container_width=True)
+
+    def _siparis_tablo_bicimi(sayfa_df):
+        sayfa_df = sayfa_df.copy()
+        sayfa_df["Tarih"] = sayfa_df["Tarih"].dt.strftime("%d/%m/%Y")
+        sayfa_df["Termin Tarihi"] = pd.to_datetime(sayfa_df["Termin Tarihi"], errors="coerce").dt.strftime("%d/%m/%Y")
+        return sayfa_df
+
+    gorunen_siparisler = paged_table(
+        g_tab,
+        key="siparis_tablo",
+        siralama=["Tarih", "Müşteri Adı", "Termin Tarihi", "Ülke", "Satış Temsilcisi", "Proforma No"],
+        bicim=_siparis_tablo_bicimi,
+        use_container_width=True,
+    )
 
     # ================= Termin Tarihi Güncelle =================
     st.markdown("#### Termin Tarihi Güncelle")
-    sec_id_termin = st.selectbox(
+    siparis_etiketleri = label_map("proforma", "{Müşteri Adı} - {Proforma No}")
+    sec_id_termin = id_picker(
         "Termin Tarihi Girilecek Sipariş",
-        options=siparisler["ID"].tolist(),
-        format_func=lambda _id: f"{siparisler.loc[siparisler['ID']==_id, 'Müşteri Adı'].values[0]} - {siparisler.loc[siparisler['ID']==_id, 'Proforma No'].values[0]}"
+        siparisler["ID"].tolist(),
+        siparis_etiketleri,
+        key="termin_sec",
     )
-    mask_termin = (df_proforma["ID"] == sec_id_termin)
-    mevcut_termin = pd.to_datetime(df_proforma.loc[mask_termin, "Termin Tarihi"].values[0] if mask_termin.any() else None, errors="coerce")
+    termin_kayit = record_get("proforma", sec_id_termin)
+    mevcut_termin = pd.to_datetime(termin_kayit["Termin Tarihi"] if termin_kayit is not None else None, errors="coerce")
     default_termin = (mevcut_termin.date() if pd.notna(mevcut_termin) else datetime.date.today())
     yeni_termin = st.date_input("Termin Tarihi", value=default_termin, key="termin_input")
 
-    if st.button("Termin Tarihini Kaydet"):
-        df_proforma.loc[mask_termin, "Termin Tarihi"] = yeni_termin
+    if st.button("Termin Tarihini Kaydet", disabled=sec_id_termin is None):
+        record_update("proforma", sec_id_termin, {"Termin Tarihi": yeni_termin})
         update_excel()
         st.success("Termin tarihi kaydedildi!")
         st.rerun()
 
     # ================= Sevk Et (ETA’ya gönder) =================
     st.markdown("#### Siparişi Sevk Et (ETA İzleme Kaydına Gönder)")
-    sec_id_sevk = st.selectbox(
+    sec_id_sevk = id_picker(
         "Sevk Edilecek Sipariş",
-        options=siparisler["ID"].tolist(),
-        format_func=lambda _id: f"{siparisler.loc[siparisler['ID']==_id, 'Müşteri Adı'].values[0]} - {siparisler.loc[siparisler['ID']==_id, 'Proforma No'].values[0]}",
-        key="sevk_sec"
+        siparisler["ID"].tolist(),
+        siparis_etiketleri,
+        key="sevk_sec",
     )
-    if st.button("Sevkedildi → ETA İzlemeye Ekle"):
+    if st.button("Sevkedildi → ETA İzlemeye Ekle", disabled=sec_id_sevk is None):
         # Proforma'dan bilgiler
-        row = df_proforma.loc[df_proforma["ID"] == sec_id_sevk].iloc[0]
+        row = record_get("proforma", sec_id_sevk)
         # ETA kolon güvenliği
         for col in ETA_COLUMNS:        
             if col not in df_eta.columns:
                 df_eta[col] = ""
         # ETA'ya ekle (varsa güncelleme)
-        filt = (df_eta["Müşteri Adı"] == row["Müşteri Adı"]) & (df_eta["Proforma No"] == row["Proforma No"])
-        if filt.any():
+        filt = order_index().rows("eta", row["Müşteri Adı"], row["Proforma No"])
+        if filt:
             df_eta.loc[filt, "Sevk Tarihi"] = row.get("Sevk Tarihi", "")           
             df_eta.loc[filt, "Açıklama"] = row.get("Açıklama","")
         else:
@@ -3399,29 +6389,29 @@ elif menu == "Sipariş Operasyonları":
                 "Açıklama": row.get("Açıklama","")
             }])], ignore_index=True)
         # Proforma'yı işaretle
-        df_proforma.loc[df_proforma["ID"] == sec_id_sevk, "Sevk Durumu"] = "Sevkedildi"
+        record_update("proforma", sec_id_sevk, {"Sevk Durumu": "Sevkedildi"})
         update_excel()
         st.success("Sipariş sevkedildi ve ETA takibine gönderildi!")
         st.rerun()
 
     # ================= Beklemeye Al (Geri Çağır) =================
     st.markdown("#### Siparişi Beklemeye Al (Geri Çağır)")
-    sec_id_geri = st.selectbox(
+    sec_id_geri = id_picker(
         "Beklemeye Alınacak Sipariş",
-        options=siparisler["ID"].tolist(),
-        format_func=lambda _id: f"{siparisler.loc[siparisler['ID']==_id, 'Müşteri Adı'].values[0]} - {siparisler.loc[siparisler['ID']==_id, 'Proforma No'].values[0]}",
-        key="geri_sec"
+        siparisler["ID"].tolist(),
+        siparis_etiketleri,
+        key="geri_sec",
     )
-    if st.button("Beklemeye Al / Geri Çağır"):
-        m = (df_proforma["ID"] == sec_id_geri)
-        df_proforma.loc[m, ["Durum","Sevk Durumu","Termin Tarihi"]] = ["Beklemede","",""]
+    if st.button("Beklemeye Al / Geri Çağır", disabled=sec_id_geri is None):
+        record_update("proforma", sec_id_geri, {"Durum": "Beklemede", "Sevk Durumu": "", "Termin Tarihi": ""})
         update_excel()
         st.success("Sipariş tekrar bekleyen proformalar listesine alındı!")
         st.rerun()
 
     # ================= Linkler + Toplam =================
+    # Yalnızca tabloda görünen sayfanın linkleri (g_tab sırası 1'den başlar)
     st.markdown("#### Tıklanabilir Proforma ve Sipariş Formu Linkleri")
-    for _, r in siparisler.iterrows():
+    for _, r in siparisler.iloc[gorunen_siparisler.index - 1].iterrows():
         links = []
         if str(r.get("PDF","")).strip():
             links.append(f"[Proforma PDF: {r['Proforma No']}]({r['PDF']})")
@@ -3433,7 +6423,7 @@ elif menu == "Sipariş Operasyonları":
 
     # Toplam bekleyen sevk tutarı (akıllı parse)
 
-    toplam = float(siparisler["Tutar"].apply(smart_to_num).sum())
+    toplam = float(amount_in_reporting(siparisler).sum())
     st.markdown(f"<div style='color:#219A41; font-weight:bold;'>*Toplam Bekleyen Sevk: {toplam:,.2f} USD*</div>", unsafe_allow_html=True)
 
 ### ===========================
@@ -3484,54 +6474,7 @@ elif menu == "Fatura işlemleri":
 
     # ---- Sevk edilmiş fakat faturası kesilmemiş siparişler ----
     st.markdown("### Faturası Kesilmemiş Sevkli Siparişler")
-    sevkedilen_mask = df_proforma["Sevk Durumu"] == "Sevkedildi"
-    if "Durum" in df_proforma.columns:
-        sevkedilen_mask &= df_proforma["Durum"].astype(str).str.strip().eq("Siparişe Dönüştü")
-    pending_orders = df_proforma[sevkedilen_mask].copy()
-
-    if not pending_orders.empty:
-        pending_orders["Termin Tarihi Sıra"] = pd.to_datetime(
-            pending_orders.get("Termin Tarihi"), errors="coerce"
-        )
-        pending_orders["Tarih Sıra"] = pd.to_datetime(
-            pending_orders.get("Tarih"), errors="coerce"
-        )
-        pending_orders = pending_orders.sort_values(
-            ["Termin Tarihi Sıra", "Tarih Sıra"], ascending=[True, True]
-        )
-
-    if not pending_orders.empty:
-        pending_orders["ID"] = pending_orders["ID"].astype(str)
-        pending_orders["Müşteri Adı"] = pending_orders["Müşteri Adı"].astype(str)
-        pending_orders["Proforma No"] = pending_orders["Proforma No"].astype(str)
-
-        pending_orders = pending_orders[
-            pending_orders["ID"].str.strip() != ""
-        ]
-
-        if not df_evrak.empty:
-            invoice_pairs = set(
-                (
-                    str(m).strip().lower(),
-                    str(p).strip().lower(),
-                )
-                for m, p in zip(df_evrak.get("Müşteri Adı", []), df_evrak.get("Proforma No", []))
-                if str(m).strip() or str(p).strip()
-            )
-            pending_orders = pending_orders[
-                ~pending_orders.apply(
-                    lambda r: (
-                        str(r.get("Müşteri Adı", "")).strip().lower(),
-                        str(r.get("Proforma No", "")).strip().lower(),
-                    )
-                    in invoice_pairs,
-                    axis=1,
-                )
-            ]
-
-        pending_orders = pending_orders[
-            pending_orders["Proforma No"].astype(str).str.strip() != ""
-        ]
+    pending_orders = shipped_orders_without_invoice(df_proforma, df_evrak)
 
     if pending_orders.empty:
         st.info("Sevk edilip henüz faturası kaydedilmemiş sipariş bulunmuyor.")
@@ -3549,21 +6492,14 @@ elif menu == "Fatura işlemleri":
                 pending_orders[col] = ""
         table = pending_orders[display_cols].copy()
         table["Termin Tarihi"] = pd.to_datetime(table["Termin Tarihi"], errors="coerce").dt.strftime("%d/%m/%Y")
-        table["Tutar"] = table["Tutar"].apply(lambda x: f"{smart_to_num(x):,.2f} USD" if str(x).strip() else "")
+        tutar_ham = table["Tutar"].astype(object).fillna("").astype(str).str.strip()
+        para = pending_orders.get("Para Birimi", pd.Series(RAPOR_PARA_BIRIMI, index=table.index)).astype(str)
+        table["Tutar"] = (smart_to_num_series(tutar_ham).map("{:,.2f}".format) + " " + para).where(tutar_ham != "", "")
         st.dataframe(table.drop(columns=["ID"]), use_container_width=True)
 
-        option_labels = {"": "— Sipariş Seç —"}
-        for _, row in pending_orders.iterrows():
-            label = f"{row['Müşteri Adı']} - {row['Proforma No']}"
-            termin_dt = pd.to_datetime(row.get("Termin Tarihi", ""), errors="coerce")
-            if pd.notnull(termin_dt):
-                label += f" | Termin: {termin_dt.strftime('%d/%m/%Y')}"
-            tutar_raw = row.get("Tutar", "")
-            if str(tutar_raw).strip():
-                label += f" | Tutar: {smart_to_num(tutar_raw):,.2f} USD"
-            option_labels[row["ID"]] = label
+        option_labels = {"": "— Sipariş Seç —", **order_option_labels(pending_orders).to_dict()}
 
-        pending_options = [""] + pending_orders["ID"].tolist()
+        pending_options = [""] + pending_orders["ID"].astype(str).tolist()
         if st.session_state.get(pending_reset_flag_key):
             st.session_state[pending_select_key] = ""
             st.session_state[pending_reset_flag_key] = False
@@ -3579,7 +6515,7 @@ elif menu == "Fatura işlemleri":
         )
 
         if st.button("Seçimi Fatura Formuna Aktar", disabled=(selected_pending == "")):
-            row = pending_orders[pending_orders["ID"] == selected_pending]
+            row = pending_orders[pending_orders["ID"].astype(str) == selected_pending]
             if not row.empty:
                 hedef = row.iloc[0]
                 st.session_state[musteri_key] = str(hedef.get("Müşteri Adı", ""))
@@ -3633,18 +6569,12 @@ elif menu == "Fatura işlemleri":
     # ---- Proforma'dan Vade (gün) çek ve Vade Tarihi hesapla ----
     vade_gun = ""
     if secilen_musteri and proforma_no_sec:
-        pr = df_proforma[
-            (df_proforma["Müşteri Adı"].astype(str) == secilen_musteri)
-            & (df_proforma["Proforma No"].astype(str) == proforma_no_sec)
-        ]
+        pr = df_proforma.loc[order_index().rows("proforma", secilen_musteri, proforma_no_sec)]
         if not pr.empty:
             vade_gun = pr.iloc[0].get("Vade (gün)", "")
 
     # ---- Eski evrak linkleri (aynı müşteri+proforma altında son satır) ----
-    onceki_evrak = df_evrak[
-        (df_evrak["Müşteri Adı"].astype(str) == secilen_musteri)
-        & (df_evrak["Proforma No"].astype(str) == proforma_no_sec)
-    ].tail(1)
+    onceki_evrak = df_evrak.loc[order_index().rows("evrak", secilen_musteri, proforma_no_sec)].tail(1)
 
     def file_link_html(label, url):
         return f'<div style="margin-top:-6px;"><a href="{url}" target="_blank" style="color:#219A41;">[Daha önce yüklenmiş {label}]</a></div>' if url else \
@@ -3659,22 +6589,6 @@ elif menu == "Fatura işlemleri":
         ("Fatura PDF",          "Fatura PDF")  # eklendi
     ]
 
-    # ---- Drive'a yükleme yardımcı fonksiyonu ----
-    def upload_to_drive(parent_folder_id: str, filename: str, bytes_data: bytes) -> str:
-        meta = {'title': filename, 'parents': [{'id': parent_folder_id}]}
-        gfile = drive.CreateFile(meta)
-        with tempfile.NamedTemporaryFile(delete=False) as tmp:
-            tmp.write(bytes_data)
-            tmp_path = tmp.name
-        gfile.SetContentFile(tmp_path)
-        try:
-            gfile.Upload()  # personal drive: supportsAllDrives gerekmez
-            link = f"https://drive.google.com/file/d/{gfile['id']}/view?usp=sharing"
-        finally:
-            try: os.remove(tmp_path)
-            except: pass
-        return link
-
     # ---- Form ----
     with st.form("add_evrak"):
         fatura_no = st.text_input("Fatura No")
@@ -3710,20 +6624,26 @@ elif menu == "Fatura işlemleri":
 
         tutar_num = smart_to_num(tutar)
 
-        # 1) Dosyaları Drive'a yükle (varsa). Yoksa eski linki koru.
-        file_urls = {}
-        for col, _label in evrak_tipleri:
-            upfile = uploaded_files[col]
-            if upfile:
-                clean_name = re.sub(r'[\\/*?:"<>|]+', "_", f"{secilen_musteri}__{proforma_no_sec}__{col}__{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}.pdf")
-                file_urls[col] = upload_to_drive(EVRAK_KLASOR_ID, clean_name, upfile.read())
-            else:
-                file_urls[col] = onceki_evrak.iloc[0][col] if not onceki_evrak.empty else ""
+        # 1) Dosyaları Drive'a paralel yükle (varsa). Yoksa ya da yükleme başarısızsa eski linki koru.
+        file_urls = {col: (onceki_evrak.iloc[0][col] if not onceki_evrak.empty else "") for col, _ in evrak_tipleri}
+        zaman_damgasi = datetime.datetime.now().strftime('%Y%m%d%H%M%S')
+        yuklemeler = [
+            {
+                "anahtar": col,
+                "ad": label,
+                "parent_id": EVRAK_KLASOR_ID,
+                "filename": re.sub(r'[\\/*?:"<>|]+', "_", f"{secilen_musteri}__{proforma_no_sec}__{col}__{zaman_damgasi}.pdf"),
+                "data": uploaded_files[col],
+            }
+            for col, label in evrak_tipleri if uploaded_files[col]
+        ]
+        for col, sonuc in upload_with_progress(yuklemeler, "Evraklar yükleniyor").items():
+            if sonuc["link"]:
+                file_urls[col] = sonuc["link"]
 
         # 2) Tekilleştirme: aynı (Müşteri, Proforma, Fatura No) varsa GÜNCELLE; yoksa EKLE
         key_mask = (
-            (df_evrak["Müşteri Adı"].astype(str) == secilen_musteri) &
-            (df_evrak["Proforma No"].astype(str) == proforma_no_sec) &
+            df_evrak.index.isin(order_index().rows("evrak", secilen_musteri, proforma_no_sec)) &
             (df_evrak["Fatura No"].astype(str) == fatura_no)
         )
 
@@ -3771,7 +6691,7 @@ elif menu == "Fatura işlemleri":
                 "Yük Resimleri": "",
                 "EK Belgeler": "",
             }
-            df_evrak = pd.concat([df_evrak, pd.DataFrame([new_row])], ignore_index=True)
+            record_insert("evrak", new_row)
             islem = "eklendi"
         if "Tutar_num" not in df_evrak.columns:
             df_evrak["Tutar_num"] = pd.NA
@@ -3910,7 +6830,7 @@ elif menu == "Fatura işlemleri":
             tutar_raw = row.get("Tutar", "")
             tutar_str = ""
             if str(tutar_raw).strip():
-                tutar_str = f"{smart_to_num(tutar_raw):,.2f} USD"
+                tutar_str = f"{smart_to_num(tutar_raw):,.2f} {row.get('Para Birimi', RAPOR_PARA_BIRIMI)}"
 
             parts = [f"{musteri}", f"Fatura: {fatura_no}"]
             if proforma_no:
@@ -3960,31 +6880,51 @@ elif menu == "Tahsilat Planı":
             else:
                 df_evrak[c] = ""
 
-    # Sadece vadesi olan kayıtlar
-    vade_df = df_evrak.copy()
-    vade_df["Tutar_num"] = pd.to_numeric(vade_df["Tutar_num"], errors="coerce").fillna(0.0)
-    vade_df["Ödenen Tutar"] = pd.to_numeric(vade_df["Ödenen Tutar"], errors="coerce").fillna(0.0)    
-    vade_df["Vade Tarihi"] = pd.to_datetime(vade_df["Vade Tarihi"], errors="coerce")
-    vade_df = vade_df[vade_df["Vade Tarihi"].notna()]
-    vade_df["Kalan Bakiye"] = (vade_df["Tutar_num"] - vade_df["Ödenen Tutar"]).clip(lower=0.0)    
+    # Vadeli kayıtlar ve yaşlandırma (evrak değişene kadar önbellekten)
+    today = pd.Timestamp.today().normalize()
+    yaslandirma = get_receivables_aging(DATA_VERSION, today, YASLANDIRMA_SINIRLARI, df_evrak)
+    vade_df = yaslandirma["satirlar"]
 
+    ulke_f, tem_f = [], []
     if vade_df.empty:
         st.info("Vade tarihi girilmiş kayıt bulunmuyor.")
     else:
-        today = pd.Timestamp.today().normalize()
-        vade_df["Kalan Gün"] = (vade_df["Vade Tarihi"] - today).dt.days
-
         # Ödenmemişler üzerinden özet kutucukları
-        acik_mask = vade_df["Kalan Bakiye"] > 0.01
-        acik = vade_df[acik_mask].copy()
+        acik = vade_df[vade_df["Kalan Bakiye"] > 0.01]
         vadesi_gelmemis = acik[acik["Kalan Gün"] > 0]
         bugun = acik[acik["Kalan Gün"] == 0]
         gecikmis = acik[acik["Kalan Gün"] < 0]
 
         c1, c2, c3 = st.columns(3)
-        c1.metric("Vadeleri Gelmeyen", f"{float(vadesi_gelmemis['Kalan Bakiye'].sum()):,.2f} USD", f"{len(vadesi_gelmemis)} Fatura")
-        c2.metric("Bugün Vadesi",   f"{float(bugun['Kalan Bakiye'].sum()):,.2f} USD", f"{len(bugun)} Fatura")
-        c3.metric("Gecikmiş Ödemeler",        f"{float(gecikmis['Kalan Bakiye'].sum()):,.2f} USD", f"{len(gecikmis)} Fatura")
+        c1.metric("Vadeleri Gelmeyen", f"{float(vadesi_gelmemis['Kalan_rapor'].sum()):,.2f} {RAPOR_PARA_BIRIMI}", f"{len(vadesi_gelmemis)} Fatura")
+        c2.metric("Bugün Vadesi",   f"{float(bugun['Kalan_rapor'].sum()):,.2f} {RAPOR_PARA_BIRIMI}", f"{len(bugun)} Fatura")
+        c3.metric("Gecikmiş Ödemeler",        f"{float(gecikmis['Kalan_rapor'].sum()):,.2f} {RAPOR_PARA_BIRIMI}", f"{len(gecikmis)} Fatura")
+
+        # ---- Yaşlandırma analizi ----
+        with st.expander("📊 Alacak Yaşlandırma ve DSO", expanded=False):
+            dso_text = "-" if pd.isna(yaslandirma["dso"]) else f"{yaslandirma['dso']:,.0f} gün"
+            m1, m2 = st.columns(2)
+            m1.metric("Toplam Açık Alacak", f"{yaslandirma['toplam_acik']:,.2f} {RAPOR_PARA_BIRIMI}")
+            m2.metric(f"DSO (son {DSO_PENCERE_GUN} gün)", dso_text)
+
+            kovalar = yaslandirma["kovalar"]
+            kova_cols = st.columns(len(kovalar))
+            for col, (kova, satir) in zip(kova_cols, kovalar.iterrows()):
+                col.metric(kova, f"{float(satir['Bakiye']):,.2f} {RAPOR_PARA_BIRIMI}", f"{int(satir['Fatura'])} Fatura")
+
+            para_kolonlari = yaslandirma["etiketler"] + ["Toplam"]
+            kirilim_format = {k: "{:,.2f}" for k in para_kolonlari}
+            kirilim_format.update({"Ağırlıklı Gecikme (gün)": "{:,.0f}", "DSO (gün)": "{:,.0f}"})
+            tab_musteri, tab_temsilci, tab_trend = st.tabs(["Müşteri", "Satış Temsilcisi", "Trend"])
+            with tab_musteri:
+                st.dataframe(yaslandirma["musteri"].style.format(kirilim_format, na_rep="-"), use_container_width=True)
+            with tab_temsilci:
+                st.dataframe(yaslandirma["temsilci"].style.format(kirilim_format, na_rep="-"), use_container_width=True)
+            with tab_trend:
+                trend = yaslandirma["trend"]
+                st.line_chart(trend[["Açık Alacak", "Gecikmiş"]], use_container_width=True)
+                st.line_chart(trend[["DSO (gün)"]], use_container_width=True)
+                st.caption("Ödeme tarihleri tutulmadığından, geçmiş aylarda ödenen kısımların vade tarihinde tahsil edildiği varsayılır.")
 
         st.markdown("---")
 
@@ -4004,6 +6944,43 @@ elif menu == "Tahsilat Planı":
         elif durum_f == "Sadece Ödenmiş":
             view = view[view["Kalan Bakiye"] <= 0.01]
 
+    # ---- Nakit giriş tahmini (vadeli fatura yoksa da sevkli siparişleri kapsar) ----
+    nakit_olaylari = get_cash_events(DATA_VERSION, today, df_evrak, df_proforma, df_musteri)
+    if not nakit_olaylari.empty:
+        with st.expander("💵 Nakit Giriş Tahmini", expanded=False):
+            if ulke_f:
+                nakit_olaylari = nakit_olaylari[nakit_olaylari["Ülke"].isin(ulke_f)]
+            if tem_f:
+                nakit_olaylari = nakit_olaylari[nakit_olaylari["Satış Temsilcisi"].isin(tem_f)]
+
+            s1, s2, s3, s4 = st.columns(4)
+            tahmin_frekans = {"Haftalık": "W", "Aylık": "M"}[s1.radio("Dönem", ["Haftalık", "Aylık"], horizontal=True, key="nakit_frekans")]
+            gecikme_gun = s2.select_slider("Gecikme varsayımı (gün)", options=[0, 7, 15, 30, 45, 60, 90], value=0, key="nakit_gecikme")
+            gecikmis_politika = "bugun" if s3.checkbox("Gecikmişler bugün tahsil edilir", value=True, key="nakit_gecikmis") else "haric"
+            siparis_orani = s4.slider("Faturasız sevkli sipariş tahsil oranı (%)", 0, 100, 100, step=10, key="nakit_siparis_orani") / 100
+
+            tahmin = forecast_cash_in(
+                nakit_olaylari,
+                today=today,
+                freq=tahmin_frekans,
+                gecikme_gun=gecikme_gun,
+                gecikmis_politika=gecikmis_politika,
+                siparis_orani=siparis_orani,
+            )
+            if tahmin.empty:
+                st.info("Tahmin için açık fatura veya faturası kesilmemiş sevkli sipariş bulunmuyor.")
+            else:
+                st.bar_chart(tahmin.set_index("Dönem")[list(NAKIT_KAYNAKLARI)], use_container_width=True)
+                tahmin_tablo = tahmin.copy()
+                tahmin_tablo["Dönem"] = tahmin_tablo["Dönem"].dt.strftime("%d/%m/%Y")
+                st.dataframe(
+                    tahmin_tablo.style.format({k: "{:,.2f}" for k in [*NAKIT_KAYNAKLARI, "Toplam", "Kümülatif"]}),
+                    use_container_width=True,
+                    hide_index=True,
+                )
+                st.caption("Faturası kesilmemiş sevkli siparişler sevk tarihi + müşterinin Vade (Gün) süresinde tahsil edilecek kabul edilir.")
+
+    if not vade_df.empty:
         # Düzenlenebilir tablo (Ödendi sütunu için)
         editor_view = view.reset_index(drop=False).rename(columns={"index": "_row"})
         editor = editor_view[[
@@ -4015,6 +6992,7 @@ elif menu == "Tahsilat Planı":
             "Fatura Tarihi",
             "Vade Tarihi",
             "Kalan Gün",
+            "Para Birimi",
             "Tutar_num",
             "Ödenen Tutar",
             "Kalan Bakiye",
@@ -4023,25 +7001,34 @@ elif menu == "Tahsilat Planı":
 
         editor["__fatura_order"] = pd.to_datetime(editor_view["Fatura Tarihi"], errors="coerce")
         editor["__vade_order"] = pd.to_datetime(editor_view["Vade Tarihi"], errors="coerce")
-
-        editor_display = editor.sort_values(["Kalan Gün", "__vade_order"])
-        editor_display["Fatura Tarihi"] = editor_display["__fatura_order"].dt.strftime("%d/%m/%Y").fillna("")
-        editor_display["Vade Tarihi"] = editor_display["__vade_order"].dt.strftime("%d/%m/%Y").fillna("")
-        editor_display["Tutar_num"] = pd.to_numeric(editor_display["Tutar_num"], errors="coerce").fillna(0.0)
-        editor_display["Ödenen Tutar"] = pd.to_numeric(editor_display["Ödenen Tutar"], errors="coerce").fillna(0.0)
-        editor_display["Kalan Bakiye"] = pd.to_numeric(editor_display["Kalan Bakiye"], errors="coerce").fillna(0.0)
-        editor_display["Ödendi"] = editor_display["Ödendi"].astype(bool)
-
-        edited = st.data_editor(
-            editor_display.drop(columns=["__fatura_order", "__vade_order"]),
+        editor = editor.sort_values(["Kalan Gün", "__vade_order"])
+
+        def _tahsilat_sayfa_bicimi(sayfa_df):
+            sayfa_df = sayfa_df.copy()
+            sayfa_df["Fatura Tarihi"] = sayfa_df["__fatura_order"].dt.strftime("%d/%m/%Y").fillna("")
+            sayfa_df["Vade Tarihi"] = sayfa_df["__vade_order"].dt.strftime("%d/%m/%Y").fillna("")
+            sayfa_df["Tutar_num"] = pd.to_numeric(sayfa_df["Tutar_num"], errors="coerce").fillna(0.0)
+            sayfa_df["Ödenen Tutar"] = pd.to_numeric(sayfa_df["Ödenen Tutar"], errors="coerce").fillna(0.0)
+            sayfa_df["Kalan Bakiye"] = pd.to_numeric(sayfa_df["Kalan Bakiye"], errors="coerce").fillna(0.0)
+            sayfa_df["Ödendi"] = sayfa_df["Ödendi"].astype(bool)
+            return sayfa_df.drop(columns=["__fatura_order", "__vade_order"])
+
+        # Yalnızca görünen sayfa düzenleyiciye gönderilir; değişiklikler _row ile ana tabloya yazılır
+        edited = paged_table(
+            editor,
+            key="tahsilat_editor",
+            siralama=["Kalan Gün", "Kalan Bakiye", "Müşteri Adı", "Fatura No"],
+            bicim=_tahsilat_sayfa_bicimi,
+            filtre=(tuple(ulke_f), tuple(tem_f), durum_f),
+            editor=True,
             hide_index=True,
             use_container_width=True,
             num_rows="fixed",
             column_config={
                 "_row": st.column_config.Column("Satır ID", disabled=True, width="small"),
-                "Tutar_num": st.column_config.NumberColumn("Fatura Tutarı (USD)", format="%.2f", disabled=True),
-                "Ödenen Tutar": st.column_config.NumberColumn("Ödenen Tutar (USD)", format="%.2f", disabled=True),
-                "Kalan Bakiye": st.column_config.NumberColumn("Kalan Bakiye (USD)", format="%.2f", disabled=True),
+                "Tutar_num": st.column_config.NumberColumn("Fatura Tutarı", format="%.2f", disabled=True),
+                "Ödenen Tutar": st.column_config.NumberColumn("Ödenen Tutar", format="%.2f", disabled=True),
+                "Kalan Bakiye": st.column_config.NumberColumn("Kalan Bakiye", format="%.2f", disabled=True),
                 "Ödendi": st.column_config.CheckboxColumn("Ödendi", help="Ödemesi tamamlandıysa işaretleyin."),
             },
             disabled=[
@@ -4053,11 +7040,11 @@ elif menu == "Tahsilat Planı":
                 "Fatura Tarihi",
                 "Vade Tarihi",
                 "Kalan Gün",
+                "Para Birimi",
                 "Tutar_num",
                 "Ödenen Tutar",
                 "Kalan Bakiye",
             ],
-            key="tahsilat_editor",
         )
 
         if not edited.empty:
@@ -4093,11 +7080,14 @@ elif menu == "Tahsilat Planı":
         if not view.empty:
             # ID yoksa güvenli seçim için bir satır anahtarı oluşturalım
             view = view.reset_index(drop=False).rename(columns={"index":"_row"})
-            sec = st.selectbox(
+            sec = id_picker(
                 "Kayıt Seç",
-                options=view["_row"].tolist(),
-                format_func=lambda i: f"{view.loc[view['_row']==i,'Müşteri Adı'].values[0]} | {view.loc[view['_row']==i,'Fatura No'].values[0]}"
+                view["_row"].tolist(),
+                build_label_map(view, "{Müşteri Adı} | {Fatura No}", id_kolon="_row"),
+                key="tahsilat_kayit_sec",
             )
+            if sec is None:
+                st.stop()
 
             secili = view.loc[view["_row"] == sec].iloc[0]
             toplam_tutar = float(secili.get("Tutar_num", 0.0) or 0.0)
@@ -4105,11 +7095,12 @@ elif menu == "Tahsilat Planı":
             if odenen_tutar < 0:
                 odenen_tutar = 0.0
             kalan_bakiye = max(toplam_tutar - odenen_tutar, 0.0)
+            para_birimi = secili.get("Para Birimi", RAPOR_PARA_BIRIMI)
 
             ozet_cols = st.columns(3)
-            ozet_cols[0].metric("Fatura Tutarı", f"{toplam_tutar:,.2f} USD")
-            ozet_cols[1].metric("Ödenen Tutar", f"{odenen_tutar:,.2f} USD")
-            ozet_cols[2].metric("Kalan Bakiye", f"{kalan_bakiye:,.2f} USD")
+            ozet_cols[0].metric("Fatura Tutarı", f"{toplam_tutar:,.2f} {para_birimi}")
+            ozet_cols[1].metric("Ödenen Tutar", f"{odenen_tutar:,.2f} {para_birimi}")
+            ozet_cols[2].metric("Kalan Bakiye", f"{kalan_bakiye:,.2f} {para_birimi}")
 
             min_ara_odeme = -odenen_tutar
             max_ara_odeme = max(toplam_tutar - odenen_tutar, 0.0)
@@ -4117,7 +7108,7 @@ elif menu == "Tahsilat Planı":
             with st.form(f"tahsilat_guncelle_{sec}"):
                 mevcut_odendi = bool(secili.get("Ödendi", False))
                 ara_odeme = st.number_input(
-                    "Ara ödeme tutarı (USD)",
+                    f"Ara ödeme tutarı ({para_birimi})",
                     min_value=float(min_ara_odeme),
                     max_value=float(max_ara_odeme),
                     value=0.0,
@@ -4182,24 +7173,10 @@ elif menu == "ETA İzleme":
     def get_or_create_folder_by_name(name: str, parent_id: str) -> str:
         """
         Parent altında isme göre klasör bulur; yoksa oluşturur.
-        (My Drive — Shared Drive kullanılmıyor)
+        (My Drive — Shared Drive kullanılmıyor; sonuç kalıcı klasör önbelleğinden gelir)
         """
-        q = (
-            f"title = '{name}' and mimeType = 'application/vnd.google-apps.folder' "
-            f"and '{parent_id}' in parents and trashed = false"
-        )
         try:
-            lst = drive.ListFile({'q': q}).GetList()
-            if lst:
-                return lst[0]['id']
-            meta = {
-                'title': name,
-                'mimeType': 'application/vnd.google-apps.folder',
-                'parents': [{'id': parent_id}],
-            }
-            f = drive.CreateFile(meta)
-            f.Upload()
-            return f['id']
+            return drive_folder(name, parent_id)
         except Exception as e:
             st.error(f"Klasör oluşturma/arama hatası: {e}")
             return ""
@@ -4212,12 +7189,14 @@ elif menu == "ETA İzleme":
         3) yoksa ilgili ETA kaydındaki 'ETA Tarihi',
         4) o da yoksa bugün.
         """
+        indeks = order_index()
+
         # Sevk Tarihi
-        pr_mask = (df_proforma["Müşteri Adı"] == musteri) & (df_proforma["Proforma No"] == proforma_no)
+        pr_idx = indeks.first("proforma", musteri, proforma_no)
         sevk_ts = None
-        if pr_mask.any():
+        if pr_idx is not None:
             try:
-                sevk_ts = pd.to_datetime(df_proforma.loc[pr_mask, "Sevk Tarihi"].values[0], errors="coerce")
+                sevk_ts = pd.to_datetime(df_proforma.at[pr_idx, "Sevk Tarihi"], errors="coerce")
             except Exception:
                 sevk_ts = None
         if pd.notnull(sevk_ts):
@@ -4227,11 +7206,11 @@ elif menu == "ETA İzleme":
                 pass
 
         # ETA Sevk Tarihi
-        eta_mask = (df_eta["Müşteri Adı"] == musteri) & (df_eta["Proforma No"] == proforma_no)
+        eta_idx = indeks.first("eta", musteri, proforma_no)
         eta_sevk_ts = None
-        if eta_mask.any():
+        if eta_idx is not None:
             try:
-                eta_sevk_ts = pd.to_datetime(df_eta.loc[eta_mask, "Sevk Tarihi"].values[0], errors="coerce")
+                eta_sevk_ts = pd.to_datetime(df_eta.at[eta_idx, "Sevk Tarihi"], errors="coerce")
             except Exception:
                 eta_sevk_ts = None
         if pd.notnull(eta_sevk_ts):
@@ -4242,9 +7221,9 @@ elif menu == "ETA İzleme":
 
         # ETA Tarihi        
         eta_ts = None
-        if eta_mask.any():
+        if eta_idx is not None:
             try:
-                eta_ts = pd.to_datetime(df_eta.loc[eta_mask, "ETA Tarihi"].values[0], errors="coerce")
+                eta_ts = pd.to_datetime(df_eta.at[eta_idx, "ETA Tarihi"], errors="coerce")
             except Exception:
                 eta_ts = None
         if pd.notnull(eta_ts):
@@ -4317,13 +7296,16 @@ elif menu == "ETA İzleme":
                     unsafe_allow_html=True
                 )
 
-            # 3) Mevcut dosyaları say ve özetle (ilk 10 isim)
+            # 3) Mevcut dosyaları say ve özetle (ilk 10 isim) — liste önbellekten gelir
+            if st.button("Dosya listesini yenile", key=f"eta_liste_yenile_{hedef_klasor}"):
+                get_drive_listing_cache().invalidate(hedef_klasor)
             try:
-                mevcut_dosyalar = drive.ListFile({
-                    'q': f"'{hedef_klasor}' in parents and trashed = false"
-                }).GetList()
+                mevcut_dosyalar = drive_listing(hedef_klasor)
             except Exception as e:
                 mevcut_dosyalar = []
+                # Klasör silinmiş olabilir; bir sonraki gösterimde yeniden doğrulansın
+                get_drive_folder_cache().forget(hedef_klasor)
+                get_drive_listing_cache().invalidate(hedef_klasor)
                 st.warning(f"Dosyalar listelenemedi: {e}")
 
             if mevcut_dosyalar:
@@ -4333,7 +7315,7 @@ elif menu == "ETA İzleme":
                 if len(mevcut_dosyalar) > 10:
                     st.write("…")
 
-            # 4) (OPSİYONEL) Dosya Ekle – duplike önleme (aynı isim SKIP)
+            # 4) (OPSİYONEL) Dosya Ekle – duplike önleme (aynı içerik MD5 ile SKIP)
             with st.expander("Dosya Ekle (opsiyonel, duplike önleme)"):
                 files = st.file_uploader(
                     "Yüklenecek dosyaları seçin",
@@ -4343,61 +7325,49 @@ elif menu == "ETA İzleme":
                 )
 
                 if files:
-                    var_olan_isimler = set(f["title"] for f in mevcut_dosyalar)
-                    yuklenen_say = 0
-                    atlanan_duplike = 0
-
-                    for up in files:
+                    yuklemeler = []
+                    for sira, up in enumerate(files):
                         suffix = os.path.splitext(up.name)[1].lower() or ""
                         base = os.path.splitext(up.name)[0]
-                        fname = safe_name(base) + suffix
-
-                        if fname in var_olan_isimler:
-                            atlanan_duplike += 1
-                            continue
-
-                        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as fp:
-                            fp.write(up.read())
-                            temp_path = fp.name
-
-                        meta = {'title': fname, 'parents': [{'id': hedef_klasor}]}
-                        gfile = drive.CreateFile(meta)
-                        gfile.SetContentFile(temp_path)
-                        try:
-                            gfile.Upload()
-                            yuklenen_say += 1
-                            var_olan_isimler.add(fname)
-                        except Exception as e:
-                            st.error(f"{up.name} yüklenemedi: {e}")
-                        finally:
-                            try: os.remove(temp_path)
-                            except: pass
+                        yuklemeler.append({
+                            "anahtar": sira,
+                            "ad": up.name,
+                            "parent_id": hedef_klasor,
+                            "filename": safe_name(base) + suffix,
+                            "data": up,
+                        })
+
+                    sonuclar = upload_with_progress(yuklemeler, "Fotoğraflar yükleniyor")
+                    yuklenen_say = sum(1 for sonuc in sonuclar.values() if sonuc["link"] and not sonuc["yeniden"])
+                    atlanan_duplike = sum(1 for sonuc in sonuclar.values() if sonuc["yeniden"])
 
                     if yuklenen_say:
                         update_excel()
                         st.success(f"{yuklenen_say} yeni dosya yüklendi.")
                         if atlanan_duplike:
-                            st.info(f"{atlanan_duplike} dosya aynı isimle bulunduğu için atlandı.")
+                            st.info(f"{atlanan_duplike} dosya aynı içerikle klasörde bulunduğu için tekrar yüklenmedi.")
                         st.rerun()
                     else:
                         if atlanan_duplike and not yuklenen_say:
-                            st.warning("Tüm dosyalar klasörde zaten mevcut (isimler aynı).")
+                            st.warning("Tüm dosyalar klasörde zaten mevcut (içerikler aynı).")
 
         st.markdown("---")
 
         # ========== ETA Düzenleme ==========
         # Önceden ETA girilmiş mi?
-        filtre = (df_eta["Müşteri Adı"] == sec_musteri) & (df_eta["Proforma No"] == sec_proforma)
-        if filtre.any():
-            mevcut_eta = df_eta.loc[filtre, "ETA Tarihi"].values[0]
-            mevcut_aciklama = df_eta.loc[filtre, "Açıklama"].values[0],
-            mevcut_sevk = df_eta.loc[filtre, "Sevk Tarihi"].values[0]            
+        siparis_indeksi = order_index()
+        filtre = siparis_indeksi.rows("eta", sec_musteri, sec_proforma)
+        if filtre:
+            mevcut_eta = df_eta.at[filtre[0], "ETA Tarihi"]
+            mevcut_aciklama = df_eta.at[filtre[0], "Açıklama"]
+            mevcut_aciklama = "" if pd.isna(mevcut_aciklama) else str(mevcut_aciklama)
+            mevcut_sevk = df_eta.at[filtre[0], "Sevk Tarihi"]
         else:
             mevcut_eta = ""
             mevcut_aciklama = ""
             mevcut_sevk = ""
-        proforma_mask = (df_proforma["Müşteri Adı"] == sec_musteri) & (df_proforma["Proforma No"] == sec_proforma)
-        mevcut_proforma_sevk = df_proforma.loc[proforma_mask, "Sevk Tarihi"].values[0] if proforma_mask.any() else ""
+        proforma_mask = siparis_indeksi.rows("proforma", sec_musteri, sec_proforma)
+        mevcut_proforma_sevk = df_proforma.at[proforma_mask[0], "Sevk Tarihi"] if proforma_mask else ""
 
         def _safe_date(value):
             if value is None:
@@ -4427,7 +7397,7 @@ elif menu == "ETA İzleme":
             geri_al = st.form_submit_button("Sevki Geri Al")
 
             if guncelle:
-                if filtre.any():
+                if filtre:
                     df_eta.loc[filtre, "Sevk Tarihi"] = sevk_tarih                    
                     df_eta.loc[filtre, "ETA Tarihi"] = eta_tarih
                     df_eta.loc[filtre, "Açıklama"] = aciklama
@@ -4440,7 +7410,7 @@ elif menu == "ETA İzleme":
                         "Açıklama": aciklama
                     }
                     df_eta = pd.concat([df_eta, pd.DataFrame([new_row])], ignore_index=True)
-                if proforma_mask.any():
+                if proforma_mask:
                     df_proforma.loc[proforma_mask, "Sevk Tarihi"] = sevk_tarih                 
                 update_excel()
                 st.success("ETA kaydedildi/güncellendi!")
@@ -4448,8 +7418,8 @@ elif menu == "ETA İzleme":
 
             if ulasti:
                 # Ulaşıldı: ETA listesinden çıkar, proforma'da Sevk Durumu "Ulaşıldı" ve bugünün tarihi "Ulaşma Tarihi" olarak kaydet
-                df_eta = df_eta[~((df_eta["Müşteri Adı"] == sec_musteri) & (df_eta["Proforma No"] == sec_proforma))]
-                idx = df_proforma[(df_proforma["Müşteri Adı"] == sec_musteri) & (df_proforma["Proforma No"] == sec_proforma)].index
+                df_eta = df_eta.drop(index=filtre)
+                idx = proforma_mask
                 if len(idx) > 0:
                     df_proforma.at[idx[0], "Sevk Durumu"] = "Ulaşıldı"
                     df_proforma.at[idx[0], "Ulaşma Tarihi"] = datetime.date.today()
@@ -4459,8 +7429,8 @@ elif menu == "ETA İzleme":
 
             if geri_al:
                 # Siparişi geri al: ETA'dan çıkar, proforma'da sevk durumunu boş yap (Sipariş Operasyonları'na döner)
-                df_eta = df_eta[~((df_eta["Müşteri Adı"] == sec_musteri) & (df_eta["Proforma No"] == sec_proforma))]
-                idx = df_proforma[(df_proforma["Müşteri Adı"] == sec_musteri) & (df_proforma["Proforma No"] == sec_proforma)].index
+                df_eta = df_eta.drop(index=filtre)
+                idx = proforma_mask
                 if len(idx) > 0:
                     df_proforma.at[idx[0], "Sevk Durumu"] = ""
                 update_excel()
@@ -4485,12 +7455,21 @@ elif menu == "ETA İzleme":
         today = pd.Timestamp.today().normalize()
         df_eta_display["Kalan Gün"] = (df_eta_display["ETA Tarihi"] - today).dt.days
         df_eta_display = df_eta_display.sort_values(["ETA Tarihi", "Müşteri Adı", "Proforma No"], ascending=[True, True, True])
-        tablo = df_eta_display[["Müşteri Adı", "Proforma No", "Sevk Tarihi", "ETA Tarihi", "Kalan Gün", "Açıklama"]].copy()
-        tablo["ETA Tarihi"] = tablo["ETA Tarihi"].dt.strftime("%d/%m/%Y")
-        tablo["Sevk Tarihi"] = tablo["Sevk Tarihi"].dt.strftime("%d/%m/%Y")
-        tablo["ETA Tarihi"] = tablo["ETA Tarihi"].fillna("").replace({"NaT": ""})
-        tablo["Sevk Tarihi"] = tablo["Sevk Tarihi"].fillna("").replace({"NaT": ""})
-        st.dataframe(tablo, use_container_width=True)
+        tablo = df_eta_display[["Müşteri Adı", "Proforma No", "Sevk Tarihi", "ETA Tarihi", "Kalan Gün", "Açıklama"]]
+
+        def _eta_tablo_bicimi(sayfa_df):
+            sayfa_df = sayfa_df.copy()
+            for kolon in ["ETA Tarihi", "Sevk Tarihi"]:
+                sayfa_df[kolon] = sayfa_df[kolon].dt.strftime("%d/%m/%Y").fillna("").replace({"NaT": ""})
+            return sayfa_df
+
+        paged_table(
+            tablo,
+            key="eta_tablo",
+            siralama=["ETA Tarihi", "Sevk Tarihi", "Kalan Gün", "Müşteri Adı", "Proforma No"],
+            bicim=_eta_tablo_bicimi,
+            use_container_width=True,
+        )
 
         st.markdown("##### ETA Kaydı Sil")
         silinecekler = df_eta.index.tolist()
@@ -4523,8 +7502,7 @@ elif menu == "ETA İzleme":
 
         new_ulasma_tarih = st.date_input("Ulaşma Tarihi", value=current_ulasma, key="ulasan_guncelle")
         if st.button("Ulaşma Tarihini Kaydet"):
-            idx = df_proforma[(df_proforma["Müşteri Adı"] == row["Müşteri Adı"]) & 
-                              (df_proforma["Proforma No"] == row["Proforma No"])].index
+            idx = order_index().rows("proforma", row["Müşteri Adı"], row["Proforma No"])
             if len(idx) > 0:
                 df_proforma.at[idx[0], "Ulaşma Tarihi"] = new_ulasma_tarih
                 update_excel()
@@ -4544,16 +7522,17 @@ elif menu == "ETA İzleme":
             pno = row["Proforma No"]
 
             # Proforma statüsü
-            idx = df_proforma[(df_proforma["Müşteri Adı"] == musteri) & (df_proforma["Proforma No"] == pno)].index
+            siparis_indeksi = order_index()
+            idx = siparis_indeksi.rows("proforma", musteri, pno)
             if len(idx) > 0:
                 df_proforma.at[idx[0], "Sevk Durumu"] = "Sevkedildi"
                 df_proforma.at[idx[0], "Ulaşma Tarihi"] = ""
 
             # ETA ekle/güncelle
-            filtre_eta = (df_eta["Müşteri Adı"] == musteri) & (df_eta["Proforma No"] == pno)
+            filtre_eta = siparis_indeksi.rows("eta", musteri, pno)
             eta_deger = pd.to_datetime(yeni_eta) if yeni_eta else ""
             sevk_kaydi = df_proforma.at[idx[0], "Sevk Tarihi"] if len(idx) > 0 and "Sevk Tarihi" in df_proforma.columns else ""            
-            if filtre_eta.any():
+            if filtre_eta:
                 if yeni_eta:
                     df_eta.loc[filtre_eta, "ETA Tarihi"] = eta_deger
                 if aciklama_geri:
@@ -4954,44 +7933,83 @@ if menu == "Fuar Kayıtları":
 
 elif menu == "İçerik Arşivi":
     st.markdown("<h2 style='color:#8e54e9; font-weight:bold;'>İçerik Arşivi</h2>", unsafe_allow_html=True)
-    st.info("Google Drive’daki medya, ürün görselleri ve kalite evraklarına aşağıdaki sekmelerden ulaşabilirsiniz.")
-
-    # --- Klasör ID'leri (kolayca değiştirilebilir) ---
-    DRIVE_FOLDER_IDS = {
-        "Genel Medya Klasörü": "1gFAaK-6v1e3346e-W0TsizOqSq43vHLY",
-        "Ürün Görselleri":      "18NNlmadm5NNFkI1Amzt_YMwB53j6AmbD",
-        "Kalite Evrakları":     "1pbArzYfA4Tp50zvdyTzSPF2ThrMWrGJc",
-    }
-
-    def embed_url(folder_id: str) -> str:
-        return f"https://drive.google.com/embeddedfolderview?id={folder_id}#list"
+    st.info("Google Drive’daki medya, ürün görselleri ve kalite evrakları yerel indeksten aranır; indeks arka planda güncellenir.")
 
     def open_url(folder_id: str) -> str:
         return f"https://drive.google.com/drive/folders/{folder_id}?usp=sharing"
 
-    # --- Gömülü görünüm yüksekliği ayarı (ekranına göre) ---
-    h = st.slider("Gömülü görünüm yüksekliği (px)", min_value=450, max_value=900, value=600, step=50)
+    arsiv = get_archive_indexer()
+    arsiv.ensure_fresh()
+
+    # --- İndeks durumu ---
+    # Tarama sürerken yalnızca bu kutu periyodik yenilenir; bitince galeri için sayfa baştan çizilir.
+    @st.fragment(run_every=ARSIV_YOKLAMA_SN if arsiv.durum["calisiyor"] else None)
+    def arsiv_durumu(taraniyordu: bool):
+        d1, d2, d3 = st.columns([3, 1, 1])
+        if arsiv.durum["calisiyor"]:
+            d1.info(f"Arşiv taranıyor… ({arsiv.durum['islenen']} dosya işlendi)")
+        elif taraniyordu:
+            st.rerun()
+        elif arsiv.son_guncelleme:
+            son = datetime.datetime.fromtimestamp(arsiv.son_guncelleme).strftime("%d/%m/%Y %H:%M")
+            d1.caption(f"Son güncelleme: {son} • {len(arsiv.dosyalar)} dosya")
+        else:
+            d1.caption("Arşiv henüz indekslenmedi.")
+        if arsiv.durum["hata"]:
+            d1.warning(f"Son tarama hatası: {arsiv.durum['hata']}")
+        if d2.button("Şimdi yenile", use_container_width=True, disabled=arsiv.durum["calisiyor"]):
+            arsiv.start()
+            st.rerun()
+        if d3.button("Tam tarama", use_container_width=True, disabled=arsiv.durum["calisiyor"],
+                     help="Klasör ağacını baştan tarar; Drive'dan silinen dosyaları indeksten düşürür."):
+            arsiv.start(tam=True)
+            st.rerun()
 
-    tabs = st.tabs(list(DRIVE_FOLDER_IDS.keys()))
-    for tab, tab_name in zip(tabs, DRIVE_FOLDER_IDS.keys()):
-        with tab:
-            fid = DRIVE_FOLDER_IDS[tab_name]
-            st.markdown(
-                f"""
-                <iframe src="{embed_url(fid)}"
-                        width="100%" height="{h}" frameborder="0"
-                        style="border:1px solid #eee; border-radius:12px; margin-top:10px;">
-                </iframe>
-                """,
-                unsafe_allow_html=True
-            )
-            col_a, col_b = st.columns([1, 2])
-            with col_a:
-                st.link_button("Klasörü yeni sekmede aç", open_url(fid))
-            with col_b:
-                st.info("Dosya/klasörlere çift tıklayarak yeni sekmede açabilir veya indirebilirsiniz.")
+    arsiv_durumu(arsiv.durum["calisiyor"])
+
+    # --- Arama / filtreler ---
+    arsiv_df = archive_frame(arsiv.surum, arsiv.son_guncelleme)
+    f1, f2, f3 = st.columns([2, 1.5, 1.2])
+    arsiv_ara = f1.text_input("Ara (dosya adı / klasör)", key="arsiv_ara")
+    arsiv_klasor = f2.multiselect("Klasör", list(DRIVE_FOLDER_IDS.keys()), key="arsiv_klasor")
+    arsiv_tur = f3.multiselect("Tür", [*ARSIV_TURLERI.values(), "Diğer"], key="arsiv_tur")
+
+    secim = pd.Series(True, index=arsiv_df.index)
+    if arsiv_klasor:
+        secim &= arsiv_df["kok"].isin(arsiv_klasor)
+    if arsiv_tur:
+        secim &= arsiv_df["Tür"].isin(arsiv_tur)
+    sorgu = tr_casefold(arsiv_ara).strip()
+    if sorgu:
+        secim &= arsiv_df["_arama"].str.contains(sorgu, regex=False)
+    sonuc = arsiv_df[secim]
+
+    # --- Galeri (yalnızca görünen sayfa çizilir) ---
+    GALERI_SUTUN, GALERI_SAYFA = 4, 24
+    sayfa_sayisi = max(1, -(-len(sonuc) // GALERI_SAYFA))
+    g1, g2 = st.columns([1, 3])
+    sayfa = int(g1.number_input(f"Sayfa (1-{sayfa_sayisi})", min_value=1, max_value=sayfa_sayisi, value=1, step=1,
+                                key=f"arsiv_sayfa_{sorgu}_{arsiv_klasor}_{arsiv_tur}"))
+    g2.caption(f"{len(sonuc)} dosya")
+    if sonuc.empty:
+        st.info("Filtrelere uyan dosya bulunamadı.")
+    else:
+        gorunen = sonuc.iloc[(sayfa - 1) * GALERI_SAYFA: sayfa * GALERI_SAYFA]
+        for bas in range(0, len(gorunen), GALERI_SUTUN):
+            for col, (_, dosya) in zip(st.columns(GALERI_SUTUN), gorunen.iloc[bas:bas + GALERI_SUTUN].iterrows()):
+                with col:
+                    if dosya["kucuk"] and os.path.exists(dosya["kucuk"]):
+                        st.image(dosya["kucuk"], use_container_width=True)
+                    else:
+                        st.markdown("<div style='font-size:2.2em; text-align:center;'>📄</div>", unsafe_allow_html=True)
+                    tarih = dosya["Tarih"].strftime("%d/%m/%Y") if pd.notna(dosya["Tarih"]) else ""
+                    st.markdown(f"[{_markdown_metni(dosya['title'])}]({dosya['link']})")
+                    st.caption(" / ".join(p for p in [dosya["kok"], dosya["yol"]] if p) + (f" • {tarih}" if tarih else ""))
 
-    st.warning("Not: Klasörlerin paylaşımı 'Bağlantıya sahip olan herkes görüntüleyebilir' olmalı; aksi halde gömülü görünüm boş kalır.")
+    st.markdown("---")
+    link_cols = st.columns(len(DRIVE_FOLDER_IDS))
+    for col, (ad, fid) in zip(link_cols, DRIVE_FOLDER_IDS.items()):
+        col.link_button(f"{ad} (Drive)", open_url(fid), use_container_width=True)
 
 
 ### ===========================
@@ -5001,224 +8019,262 @@ elif menu == "İçerik Arşivi":
 elif menu == "Satış Analitiği":
     st.markdown("<h2 style='color:#219A41; font-weight:bold;'>Satış Analitiği</h2>", unsafe_allow_html=True)
 
-    # ---- Kolon güvenliği ----
-    if "Tutar" not in df_evrak.columns:
-        df_evrak["Tutar"] = 0
-    date_col = "Fatura Tarihi" if "Fatura Tarihi" in df_evrak.columns else "Tarih"
-    if date_col not in df_evrak.columns:
-        df_evrak[date_col] = pd.NaT
-
-    # ---- Tip dönüşümleri ----
-    df_evrak = df_evrak.copy()
-    df_evrak["Tutar_num"] = df_evrak["Tutar"].apply(smart_to_num).fillna(0.0)
-    df_evrak[date_col] = pd.to_datetime(df_evrak[date_col], errors="coerce")
-    df_evrak = df_evrak[df_evrak[date_col].notna()]  # geçersiz tarihleri at
+    cube = build_sales_cube(DATA_VERSION, df_evrak, df_musteri)
+    date_col = cube["date_col"]
 
     # ---- Toplamlar ----
-    toplam_fatura = float(df_evrak["Tutar_num"].sum())
+    toplam_fatura = float(cube["aylik"]["Tutar"].sum())
     st.markdown(
         f"<div style='font-size:1.3em; color:#185a9d; font-weight:bold;'>Toplam Fatura Tutarı: {toplam_fatura:,.2f} USD</div>",
         unsafe_allow_html=True,
     )
-    # ---- Tarih aralığı filtresi (Timestamp ile) ----
-    min_ts = df_evrak[date_col].min()
-    max_ts = df_evrak[date_col].max()
-    d1, d2 = st.date_input("Tarih Aralığı", value=(min_ts.date(), max_ts.date()))
 
-    start_ts = pd.to_datetime(d1)  # 00:00
-    end_ts   = pd.to_datetime(d2) + pd.Timedelta(days=1) - pd.Timedelta(milliseconds=1)  # gün sonu
+    if cube["lines"].empty:
+        st.info("Analiz için geçerli tarihli fatura kaydı bulunamadı.")
+        st.stop()
 
-    mask = df_evrak[date_col].between(start_ts, end_ts, inclusive="both")
-    df_range = df_evrak[mask].copy()
+    gorunum = st.radio("Görünüm", ["Özet", "Zaman Serisi", "Satış Hunisi", "Kohort / LTV"], horizontal=True)
+
+    if gorunum == "Kohort / LTV":
+        kohortlar = get_customer_cohorts(DATA_VERSION, cube["lines"], df_proforma, df_musteri, df_fuar_musteri)
+        kh_c1, kh_c2, kh_c3 = st.columns(3)
+        kohort_boyut = kh_c1.selectbox("Dilim", ["Tümü"] + KOHORT_BOYUTLARI, key="kohort_boyut")
+        kohort_deger = None
+        if kohort_boyut != "Tümü":
+            secenekler = sorted(kohortlar["musteriler"][kohort_boyut].unique().tolist(), key=lambda x: x.lower())
+            kohort_deger = kh_c2.selectbox(kohort_boyut, secenekler, key="kohort_deger")
+        max_yas = kh_c3.slider("En fazla ay", min_value=3, max_value=36, value=12, key="kohort_max_yas")
+        matris_adi = st.radio("Matris", ["Elde Tutma (%)", "Ciro", "Kümülatif LTV"], horizontal=True, key="kohort_matris")
+
+        matrisler = get_cohort_matrices(
+            DATA_VERSION,
+            None if kohort_boyut == "Tümü" else kohort_boyut,
+            kohort_deger,
+            max_yas,
+            kohortlar,
+        )
+        if matrisler["ozet"].empty:
+            st.info("Seçilen dilimde kohort verisi bulunamadı.")
+        else:
+            ozet = matrisler["ozet"]
+            m1, m2, m3 = st.columns(3)
+            m1.metric("Müşteri", int(ozet["Müşteri"].sum()))
+            m2.metric("Toplam Ciro", f"{ozet['Toplam Ciro'].sum():,.0f} {RAPOR_PARA_BIRIMI}")
+            m3.metric("Ortalama LTV", f"{ozet['Toplam Ciro'].sum() / ozet['Müşteri'].sum():,.0f} {RAPOR_PARA_BIRIMI}")
+
+            anahtar = {"Elde Tutma (%)": "elde_tutma", "Ciro": "ciro", "Kümülatif LTV": "ltv"}[matris_adi]
+            bicim = "{:.0f}" if anahtar == "elde_tutma" else "{:,.0f}"
+            st.dataframe(
+                matrisler[anahtar].style.format(bicim, na_rep="").background_gradient(cmap="Greens", axis=None),
+                use_container_width=True,
+            )
+            st.markdown("##### Kohort Özeti")
+            st.dataframe(ozet.style.format("{:,.0f}", na_rep=""), use_container_width=True)
+
+            dosya_eki = f"_{kohort_boyut}_{kohort_deger}" if kohort_deger else ""
+            ex_c1, ex_c2 = st.columns(2)
+            ex_c1.download_button(
+                "Excel indir",
+                data=cohort_excel_bytes(matrisler),
+                file_name=f"kohort_ltv{dosya_eki}.xlsx",
+                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                use_container_width=True,
+            )
+            ex_c2.download_button(
+                "CSV indir",
+                data=matrisler[anahtar].to_csv().encode("utf-8"),
+                file_name=f"kohort_{anahtar}{dosya_eki}.csv",
+                mime="text/csv",
+                use_container_width=True,
+            )
 
-    aralik_toplam = float(df_range["Tutar_num"].sum())
-    st.markdown(
-        f"<div style='font-size:1.2em; color:#f7971e; font-weight:bold;'>{d1} - {d2} Arası Toplam: {aralik_toplam:,.2f} USD</div>",
-        unsafe_allow_html=True,
-    )
+    elif gorunum == "Satış Hunisi":
+        huni = get_sales_funnel(DATA_VERSION, df_teklif, df_proforma, df_evrak, df_musteri)
+        hn_c1, hn_c2 = st.columns(2)
+        huni_kirilim = {"Toplam": None, "Satış Temsilcisi": "Satış Temsilcisi", "Ülke": "Ülke"}
+        huni_boyut = huni_kirilim[hn_c1.selectbox("Kırılım", list(huni_kirilim), key="huni_kirilim")]
+        tum_tarihler = pd.concat([huni["teklifler"]["Tarih"], huni["proformalar"]["Tarih"]]).dropna()
+        if tum_tarihler.empty:
+            st.info("Huni analizi için tarihli teklif veya proforma kaydı bulunamadı.")
+            st.stop()
+        huni_aralik = hn_c2.date_input(
+            "Belge Tarihi Aralığı",
+            value=(tum_tarihler.min().date(), tum_tarihler.max().date()),
+            key="huni_aralik",
+        )
+        if isinstance(huni_aralik, (list, tuple)) and len(huni_aralik) == 2:
+            h1, h2 = huni_aralik
+        else:
+            h1 = h2 = huni_aralik[0] if isinstance(huni_aralik, (list, tuple)) else huni_aralik
 
-    # ---- Müşteri filtresi ----
-    df_analytics = df_range.copy()
-    customer_col = "Müşteri Adı" if "Müşteri Adı" in df_analytics.columns else None
-
-    selected_segment = None
-    segment_label = "Müşteri Segmenti"
-    if customer_col and "Kategori" in df_musteri.columns and not df_musteri.empty:
-        segment_df = df_musteri[["Müşteri Adı", "Kategori"]].dropna(subset=["Müşteri Adı"]).copy()
-        if not segment_df.empty:
-            segment_df["Müşteri Adı"] = segment_df["Müşteri Adı"].astype(str).str.strip()
-            segment_series = (
-                segment_df.drop_duplicates("Müşteri Adı").set_index("Müşteri Adı")["Kategori"]
+        ozet = sales_funnel_summary(huni, by=huni_boyut, baslangic=h1, bitis=h2)
+        if ozet.empty:
+            st.info("Seçilen aralıkta huni verisi yok.")
+        else:
+            toplam = ozet[["Teklif", "Proforma", "Sipariş", "Fatura"]].sum()
+            m1, m2, m3, m4 = st.columns(4)
+            m1.metric("Teklif", int(toplam["Teklif"]))
+            m2.metric("Proforma", int(toplam["Proforma"]))
+            m3.metric("Sipariş", int(toplam["Sipariş"]), f"%{toplam['Sipariş'] / toplam['Proforma'] * 100:.1f}" if toplam["Proforma"] else None)
+            m4.metric("Fatura", int(toplam["Fatura"]), f"%{toplam['Fatura'] / toplam['Sipariş'] * 100:.1f}" if toplam["Sipariş"] else None)
+            st.bar_chart(pd.Series(toplam.to_numpy(), index=HUNI_ASAMALARI, name="Adet"), use_container_width=True)
+
+            tablo = ozet.copy()
+            for kolon in ["Teklif→Proforma (%)", "Proforma→Sipariş (%)", "Sipariş→Fatura (%)"]:
+                tablo[kolon] = tablo[kolon].map(lambda x: "" if pd.isna(x) else f"%{x:.1f}")
+            for kolon in ["Teklif Tutarı", "Kaçak Teklif Tutarı", "Kaçak Proforma Tutarı", "Faturasız Sipariş Tutarı"]:
+                tablo[kolon] = tablo[kolon].map(lambda x: f"{x:,.2f} {RAPOR_PARA_BIRIMI}")
+            for kolon in ["Teklif→Proforma (gün)", "Proforma→Sevk (gün)", "Proforma→Fatura (gün)"]:
+                tablo[kolon] = tablo[kolon].map(lambda x: "" if pd.isna(x) else f"{x:.0f}")
+            st.dataframe(tablo, use_container_width=True)
+            st.caption(
+                f"Teklifler, aynı müşterinin {TEKLIF_ESLESME_GUN} gün içindeki ilk proformasıyla eşleştirilir; "
+                "süreler medyan gün, tutarlar raporlama para birimindedir."
             )
-            if not segment_series.empty:
-                df_analytics[segment_label] = (
-                    df_analytics[customer_col]
-                    .fillna("")
-                    .astype(str)
-                    .str.strip()
-                    .map(segment_series)
-                    .fillna("Belirtilmemiş")
-                )
-                segment_options = (
-                    ["Tüm Segmentler"]
-                    + sorted(
-                        df_analytics[segment_label]
-                        .dropna()
-                        .astype(str)
-                        .str.strip()
-                        .unique()
-                        .tolist(),
-                        key=lambda x: x.lower(),
-                    )
-                )
-                if len(segment_options) > 1:
-                    selected_segment = st.selectbox("Müşteri Segmenti", segment_options)
-                    if selected_segment != "Tüm Segmentler":
-                        df_analytics = df_analytics[df_analytics[segment_label] == selected_segment]
-
-    df_filtered = df_analytics.copy()
-    selected_customer = None
-    if customer_col:
-        musteri_listesi = sorted(
-            df_analytics[customer_col]
-            .dropna()
-            .astype(str)
-            .str.strip()
-            .replace("", np.nan)
-            .dropna()
-            .unique()
-        )
-        musteri_opsiyonlari = ["Tüm Müşteriler"] + musteri_listesi
-        selected_customer = st.selectbox("Müşteri Bazında Filtre", musteri_opsiyonlari)
-        if selected_customer != "Tüm Müşteriler":
-            df_filtered = df_filtered[
-                df_filtered[customer_col].fillna("").astype(str).str.strip() == selected_customer
-            ]
 
-    filtered_total = float(df_filtered["Tutar_num"].sum())
-    segment_text = (
-        f"{selected_segment} Segmenti - "
-        if selected_segment and selected_segment != "Tüm Segmentler"
-        else ""
-    )
-    if customer_col and selected_customer and selected_customer != "Tüm Müşteriler":
-        toplam_baslik = f"{segment_text}{selected_customer} Toplam"
-    elif customer_col:
-        toplam_baslik = f"{segment_text}Tüm Müşteriler Toplam"
-    else:
-        toplam_baslik = f"{segment_text}Seçili Aralık Toplam"
+    elif gorunum == "Zaman Serisi":
+        frekans_etiketleri = {"Haftalık": "W", "Aylık": "M", "Çeyreklik": "Q"}
+        boyut_etiketleri = {
+            "Toplam": None,
+            "Müşteri": "Müşteri Adı",
+            "Ülke": "Ülke",
+            "Satış Temsilcisi": "Satış Temsilcisi",
+        }
+        if cube["segment_var"]:
+            boyut_etiketleri["Segment"] = "Segment"
+
+        ts_c1, ts_c2 = st.columns(2)
+        frekans = frekans_etiketleri[ts_c1.selectbox("Dönem", list(frekans_etiketleri), index=1)]
+        boyut = boyut_etiketleri[ts_c2.selectbox("Kırılım", list(boyut_etiketleri))]
+
+        seri = get_revenue_timeseries(DATA_VERSION, frekans, boyut, cube["lines"])
+        if boyut:
+            toplamlar = seri.groupby(boyut)["Ciro"].sum().sort_values(ascending=False)
+            secilenler = st.multiselect(
+                "Gösterilecek kalemler",
+                toplamlar.index.tolist(),
+                default=toplamlar.index[:5].tolist(),
+            )
+            seri = seri[seri[boyut].isin(secilenler)]
+            grafik_df = seri.pivot(index="Dönem", columns=boyut, values="Ciro")
+        else:
+            grafik_df = seri.set_index("Dönem")[["Ciro", "Son 3 Ay", "Son 12 Ay"]]
 
-    st.markdown(
-        f"<div style='font-size:1.1em; color:#185a9d; font-weight:bold;'>{toplam_baslik}: {filtered_total:,.2f} USD</div>",
-        unsafe_allow_html=True,
-    )
-        # ---- En yüksek ciroya sahip müşteriler ----
-    # ---- En yüksek ciroya sahip müşteriler ----
-    if "Müşteri Adı" in df_analytics.columns and not df_analytics.empty:
-        df_musteri = df_analytics.copy()
-        df_musteri["Müşteri Adı"] = df_musteri["Müşteri Adı"].fillna("Bilinmeyen Müşteri")
-        top_musteriler = (
-            df_musteri.groupby("Müşteri Adı")["Tutar_num"]
-            .sum()
-            .sort_values(ascending=False)
-            .head(5)
-            .reset_index()
-        )
-        top_musteriler.rename(columns={"Tutar_num": "Toplam Ciro"}, inplace=True)
+        if seri.empty:
+            st.info("Seçilen kırılım için zaman serisi verisi bulunamadı.")
+        else:
+            st.line_chart(grafik_df, use_container_width=True)
+            tablo = seri.copy()
+            tablo["Dönem"] = tablo["Dönem"].dt.strftime("%d/%m/%Y")
+            for kolon in ["Ciro", "Son 3 Ay", "Son 12 Ay", "Geçen Yıl"]:
+                tablo[kolon] = tablo[kolon].map(lambda x: "" if pd.isna(x) else f"{x:,.2f}")
+            tablo["YoY (%)"] = tablo["YoY (%)"].map(lambda x: "" if pd.isna(x) else f"%{x:.1f}")
+            st.dataframe(tablo.iloc[::-1], use_container_width=True)
+
+    else:
+        # ---- Tarih aralığı filtresi ----
+        tarih_secimi = st.date_input("Tarih Aralığı", value=(cube["min"].date(), cube["max"].date()))
+        if isinstance(tarih_secimi, (list, tuple)) and len(tarih_secimi) == 2:
+            d1, d2 = tarih_secimi
+        else:
+            d1 = d2 = (tarih_secimi[0] if tarih_secimi else cube["max"].date()) if isinstance(tarih_secimi, (list, tuple)) else tarih_secimi
 
+        df_range = sales_cube_slice(cube, d1, d2)
+        aralik_toplam = float(df_range["Tutar"].sum())
         st.markdown(
-            "<h3 style='margin-top:20px; color:#185a9d;'>En Yüksek Ciroya Sahip İlk 5 Müşteri</h3>",
+            f"<div style='font-size:1.2em; color:#f7971e; font-weight:bold;'>{d1} - {d2} Arası Toplam: {aralik_toplam:,.2f} USD</div>",
             unsafe_allow_html=True,
         )
 
-        col_tab, col_chart = st.columns([1, 1])
-        with col_tab:
-            display_df = top_musteriler.copy()
-            display_df["Toplam Ciro"] = display_df["Toplam Ciro"].map(lambda x: f"{x:,.2f} USD")
-            st.dataframe(display_df, use_container_width=True)
-        with col_chart:
-            st.bar_chart(top_musteriler.set_index("Müşteri Adı")["Toplam Ciro"], use_container_width=True)
-    else:
-        st.info("Seçilen tarih aralığında müşteri bazlı ciro bilgisi bulunamadı.")
+        # ---- Segment / müşteri filtresi ----
+        selected_segment = None
+        if cube["segment_var"]:
+            segment_options = ["Tüm Segmentler"] + sorted(
+                df_range["Segment"].astype(str).unique().tolist(), key=lambda x: x.lower()
+            )
+            if len(segment_options) > 1:
+                selected_segment = st.selectbox("Müşteri Segmenti", segment_options)
+        segment_filtre = selected_segment if selected_segment and selected_segment != "Tüm Segmentler" else None
+        df_analytics = _kup_filtresi(df_range, segment=segment_filtre)
+
+        musteri_listesi = sorted(m for m in df_analytics["Müşteri Adı"].unique() if m and m != "Bilinmeyen Müşteri")
+        selected_customer = st.selectbox("Müşteri Bazında Filtre", ["Tüm Müşteriler"] + musteri_listesi)
+        musteri_filtre = selected_customer if selected_customer != "Tüm Müşteriler" else None
+        df_filtered = _kup_filtresi(df_analytics, musteri=musteri_filtre)
+
+        filtered_total = float(df_filtered["Tutar"].sum())
+        segment_text = f"{segment_filtre} Segmenti - " if segment_filtre else ""
+        if musteri_filtre:
+            toplam_baslik = f"{segment_text}{musteri_filtre} Toplam"
+        else:
+            toplam_baslik = f"{segment_text}Tüm Müşteriler Toplam"
 
-    if "Müşteri Adı" in df_analytics.columns and not df_analytics.empty:
         st.markdown(
-            "<h3 style='margin-top:20px; color:#185a9d;'>Müşteri Bazında Ciro Yüzdeleri</h3>",
+            f"<div style='font-size:1.1em; color:#185a9d; font-weight:bold;'>{toplam_baslik}: {filtered_total:,.2f} USD</div>",
             unsafe_allow_html=True,
         )
 
-        pie_df = df_analytics.copy()
-        pie_df["Müşteri Adı"] = pie_df["Müşteri Adı"].fillna("Bilinmeyen Müşteri")
-        pie_summary = (
-            pie_df.groupby("Müşteri Adı")["Tutar_num"]
+        musteri_ciro = (
+            df_analytics.groupby("Müşteri Adı")["Tutar"]
             .sum()
-            .reset_index()
-            .sort_values("Tutar_num", ascending=False)
+            .sort_values(ascending=False)
         )
 
-        if not pie_summary.empty:
-            total_value = float(pie_summary["Tutar_num"].sum())
+        # ---- En yüksek ciroya sahip müşteriler ----
+        if not musteri_ciro.empty:
+            top_musteriler = musteri_ciro.head(5).rename("Toplam Ciro").reset_index()
+
+            st.markdown(
+                "<h3 style='margin-top:20px; color:#185a9d;'>En Yüksek Ciroya Sahip İlk 5 Müşteri</h3>",
+                unsafe_allow_html=True,
+            )
+
+            col_tab, col_chart = st.columns([1, 1])
+            with col_tab:
+                display_df = top_musteriler.copy()
+                display_df["Toplam Ciro"] = display_df["Toplam Ciro"].map(lambda x: f"{x:,.2f} USD")
+                st.dataframe(display_df, use_container_width=True)
+            with col_chart:
+                st.bar_chart(top_musteriler.set_index("Müşteri Adı")["Toplam Ciro"], use_container_width=True)
+        else:
+            st.info("Seçilen tarih aralığında müşteri bazlı ciro bilgisi bulunamadı.")
+
+        if not musteri_ciro.empty:
+            st.markdown(
+                "<h3 style='margin-top:20px; color:#185a9d;'>Müşteri Bazında Ciro Yüzdeleri</h3>",
+                unsafe_allow_html=True,
+            )
 
+            pie_summary = musteri_ciro.rename("Tutar_num").reset_index()
+            total_value = float(pie_summary["Tutar_num"].sum())
 
             if total_value <= 0:
                 st.info("Müşteri bazında ciro yüzdesi hesaplanamadı.")
             else:
-                pie_summary["Yüzde"] = pie_summary["Tutar_num"].apply(
-                    lambda value: round((float(value) / total_value) * 100, 1) if total_value else 0.0
-                )
-
-                colors = plt.cm.tab20(np.linspace(0, 1, len(pie_summary)))
-                fig, ax = plt.subplots(figsize=(8, 6))
-                wedges, _, autotexts = ax.pie(
-                    pie_summary["Tutar_num"],
-                    autopct=lambda pct: f"%{pct:.1f}" if pct > 0 else "",
-                    startangle=0,
-                    colors=colors,
-                    textprops={"color": "white", "weight": "bold"},
-                )
-                for autotext in autotexts:
-                    autotext.set_fontsize(10)
-
-                legend_labels = [
-                    f"{label} (%{pct:.1f})" for label, pct in zip(pie_summary["Müşteri Adı"], pie_summary["Yüzde"])
-                ]
-
-                ax.legend(
-                    wedges,
-                    legend_labels,
-                    title="Müşteriler",
-                    loc="center left",
-                    bbox_to_anchor=(1, 0.5),
-                    fontsize=10,
-                    title_fontsize=11,
+                pie_summary["Yüzde"] = (pie_summary["Tutar_num"] / total_value * 100).round(1)
+                pasta_df = group_long_tail(pie_summary, "Müşteri Adı", "Tutar_num")
+                pasta_png = render_pie_chart(
+                    tuple(pasta_df["Müşteri Adı"].astype(str)),
+                    tuple(pasta_df["Tutar_num"].astype(float).round(2)),
+                    "Müşteri Bazında Ciro Dağılımı",
+                    "Müşteriler",
                 )
-                ax.set_title("Müşteri Bazında Ciro Dağılımı", color="#185a9d", fontsize=14)
-                ax.axis("equal")
-
-                st.pyplot(fig, use_container_width=True)
-                plt.close(fig)
+                st.image(pasta_png, use_container_width=True)
 
                 display_pie = pie_summary.copy()
                 display_pie["Tutar (USD)"] = display_pie["Tutar_num"].map(lambda x: f"{float(x):,.2f}")
                 display_pie["Yüzde (%)"] = display_pie["Yüzde"].map(lambda x: f"%{x:.1f}")
                 display_pie = display_pie[["Müşteri Adı", "Tutar (USD)", "Yüzde (%)"]]
                 st.dataframe(display_pie, use_container_width=True)
-        else:
-            st.info("Müşteri bazında ciro yüzdesi hesaplanamadı.")
 
-    # ---- Detay tablo ----
-    detail_cols = ["Müşteri Adı", "Fatura No", date_col, "Tutar"]
-    detail_cols = [c for c in detail_cols if c in df_filtered.columns]
-
-    if df_filtered.empty:
-        st.info("Seçilen kriterlere uygun satış kaydı bulunamadı.")
-    else:
-        detail_df = df_filtered.copy()
-        if date_col in detail_df.columns:
-            detail_df = detail_df.sort_values(by=date_col, ascending=False)
-        if detail_cols:
-            detail_df = detail_df[detail_cols]
-        st.dataframe(detail_df, use_container_width=True)
+        # ---- Detay tablo ----
+        detail_df = sales_cube_lines(cube, d1, d2, segment=segment_filtre, musteri=musteri_filtre)
+        if detail_df.empty:
+            st.info("Seçilen kriterlere uygun satış kaydı bulunamadı.")
+        else:
+            detail_df = detail_df.iloc[::-1][["Müşteri Adı", "_Fatura No", f"_{date_col}", "_Tutar"]]
+            detail_df.columns = ["Müşteri Adı", "Fatura No", date_col, "Tutar"]
+            st.dataframe(detail_df, use_container_width=True)
 
 elif menu == "Help & Support":
     st.markdown(
@@ -5236,3 +8292,38 @@ elif menu == "Help & Support":
 elif menu == "Settings":
     st.markdown("<h2 style='color:#38bdf8; font-weight:bold;'>Ayarlar</h2>", unsafe_allow_html=True)
     st.info("Profil ayarları ve tema seçenekleri üzerinde çalışıyoruz. Güncellemeler yakında burada olacak.")
+
+    # ---- Döviz kurları (raporlama para birimine çevrim) ----
+    st.markdown("### Döviz Kurları")
+    st.caption(
+        f"Her satır: 1 birim 'Para Birimi' = 'Kur' × {RAPOR_PARA_BIRIMI}. "
+        "Tutarlar kayıt tarihindeki (yoksa ilk) geçerli kurla çevrilir."
+    )
+    kur_duzenleme = _kur_tablosu(df_kurlar).copy()
+    kur_duzenleme["Tarih"] = kur_duzenleme["Tarih"].dt.date
+    kur_duzenlenen = st.data_editor(
+        kur_duzenleme,
+        num_rows="dynamic",
+        hide_index=True,
+        use_container_width=True,
+        column_config={
+            "Tarih": st.column_config.DateColumn("Tarih", format="DD/MM/YYYY", required=True),
+            "Para Birimi": st.column_config.SelectboxColumn(
+                "Para Birimi",
+                options=sorted(set(PARA_BIRIMI_KODLARI.values()) - {RAPOR_PARA_BIRIMI}),
+                required=True,
+            ),
+            "Kur": st.column_config.NumberColumn("Kur", min_value=0.0, format="%.6f", required=True),
+        },
+        key="kur_editor",
+    )
+    if st.button("Kurları Kaydet"):
+        df_kurlar = _kur_tablosu(kur_duzenlenen)
+        update_excel()
+        st.success("Döviz kurları kaydedildi.")
+        st.rerun()
+
+    kur_kontrol = df_evrak.reindex(columns=["Para Birimi", "Fatura Tarihi"])
+    eksik_kur = fx_factor(kur_kontrol["Para Birimi"], kur_kontrol["Fatura Tarihi"]).attrs["kur_eksik"]
+    if eksik_kur:
+        st.warning(f"{eksik_kur} fatura için kur bulunamadı; bu tutarlar çevrilmeden toplanıyor.")
@@ -0,0 +1,35 @@
+"""crm.py bir Streamlit betiği olduğu için içe aktarılamaz (açılışta Drive'a bağlanır).
+Testler gereken üst düzey tanımları kaynaktan ayıklayıp ayrı bir ad alanında çalıştırır."""
+import ast
+import pathlib
+
+import pytest
+
+CRM_KAYNAK = pathlib.Path(__file__).resolve().parent.parent / "crm.py"
+
+
+def _tanim_adlari(dugum) -> set:
+    if isinstance(dugum, (ast.FunctionDef, ast.ClassDef)):
+        return {dugum.name}
+    if isinstance(dugum, ast.Assign):
+        return {h.id for h in dugum.targets if isinstance(h, ast.Name)}
+    if isinstance(dugum, ast.AnnAssign) and isinstance(dugum.target, ast.Name):
+        return {dugum.target.id}
+    return set()
+
+
+def crm_tanimlari(*adlar) -> dict:
+    """crm.py'deki modül içe aktarmalarını ve adı verilen tanımları (kaynak sırasıyla) çalıştırır."""
+    agac = ast.parse(CRM_KAYNAK.read_text(encoding="utf-8"))
+    govde = [
+        dugum for dugum in agac.body
+        if isinstance(dugum, (ast.Import, ast.ImportFrom)) or _tanim_adlari(dugum) & set(adlar)
+    ]
+    ad_alani = {"__name__": "crm_test"}
+    exec(compile(ast.Module(body=govde, type_ignores=[]), str(CRM_KAYNAK), "exec"), ad_alani)
+    return ad_alani
+
+
+@pytest.fixture
+def crm():
+    return crm_tanimlari
@@ -0,0 +1,50 @@
+import pandas as pd
+import pytest
+
+ADLAR = (
+    "PARA_BIRIMI_KODLARI", "CURRENCY_SYMBOLS", "_CURRENCY_PATTERN", "smart_to_num", "smart_to_num_series",
+    "RAPOR_PARA_BIRIMI", "_para_sembol_deseni", "_PARA_SEMBOL_DESENLERI", "normalize_currency_codes",
+    "detect_currency_series",
+)
+
+
+@pytest.fixture
+def para(crm):
+    return crm(*ADLAR)
+
+
+def _ornekler(kodlar):
+    """Her sembol/kod için büyük, küçük ve baş harfi büyük yazımlarla önek/sonek örnekleri."""
+    return [
+        (metin, iso)
+        for sembol, iso in kodlar.items()
+        for yazim in sorted({sembol, sembol.lower(), sembol.title()})
+        for metin in (f"1000 {yazim}", f"{yazim}1000", f"1.000,00 {yazim}")
+    ]
+
+
+def test_tespit_edilen_her_para_birimi_ayristirilir(para):
+    ornekler = _ornekler(para["PARA_BIRIMI_KODLARI"])
+    seri = pd.Series([metin for metin, _ in ornekler], dtype=object)
+
+    tespit = para["detect_currency_series"](seri, varsayilan="")
+    vektorel = para["smart_to_num_series"](seri)
+
+    for i, (metin, iso) in enumerate(ornekler):
+        assert para["smart_to_num"](metin) == 1000.0, metin
+        assert vektorel.iat[i] == 1000.0, metin
+        assert tespit.iat[i] == iso, metin
+
+
+@pytest.mark.parametrize("metin, tutar, iso", [
+    ("1000 RUB", 1000.0, "RUB"),
+    ("₽500", 500.0, "RUB"),
+    ("100 TRY", 100.0, "TRY"),
+    ("5 EURO", 5.0, "EUR"),
+    ("1000 usd", 1000.0, "USD"),
+    ("1.234,50 TL", 1234.5, "TRY"),
+])
+def test_inceleme_ornekleri(para, metin, tutar, iso):
+    assert para["smart_to_num"](metin) == tutar
+    assert para["smart_to_num_series"](pd.Series([metin])).iat[0] == tutar
+    assert para["detect_currency_series"](pd.Series([metin])).iat[0] == iso
@@ -0,0 +1,66 @@
+import io
+import hashlib
+
+import pytest
+
+ADLAR = (
+    "drive_query_literal", "_rfc3339_simdi", "_YEREL_SORGU_DIZESI", "_YEREL_SORGU_KALIPLARI",
+    "_YEREL_SORGU_PARCASI", "_yerel_sorgu_parcalari", "_yerel_sorgu_kosullari", "LocalDriveError",
+    "LocalDriveFile", "LocalFileList", "_LocalHttp", "_LocalAuth", "LocalDrive",
+)
+
+
+@pytest.fixture
+def yerel(crm, tmp_path):
+    ad_alani = crm(*ADLAR)
+    return ad_alani, ad_alani["LocalDrive"](str(tmp_path), gecikme_ms="0", hata_orani=0, tohum=1)
+
+
+def _yukle(depo, metadata, veri=None):
+    dosya = depo.CreateFile(metadata)
+    if veri is not None:
+        dosya.content = io.BytesIO(veri)
+    dosya.Upload()
+    return dosya
+
+
+@pytest.mark.parametrize("ad", ["A and O'B", "Ali's and Veli's", "Düz Ad", "x\\y and 'z'"])
+def test_kacisli_klasor_adi_sorgusu(yerel, ad):
+    """drive_query_literal'in ürettiği sorgular (kesme işareti ve 'and' içeren adlar) ayrıştırılmalı."""
+    ad_alani, depo = yerel
+    kok = _yukle(depo, {"title": "kok", "mimeType": "application/vnd.google-apps.folder"})
+    hedef = _yukle(depo, {"title": ad, "mimeType": "application/vnd.google-apps.folder",
+                          "parents": [{"id": kok["id"]}]})
+    _yukle(depo, {"title": "A", "mimeType": "application/vnd.google-apps.folder", "parents": [{"id": kok["id"]}]})
+
+    q = (f"title = '{ad_alani['drive_query_literal'](ad)}' and '{kok['id']}' in parents "
+         f"and mimeType = 'application/vnd.google-apps.folder' and trashed = false")
+    assert [f["id"] for f in depo.ListFile({"q": q}).GetList()] == [hedef["id"]]
+
+
+def test_desteklenmeyen_sorgu_hata_verir(yerel):
+    ad_alani, depo = yerel
+    with pytest.raises(ad_alani["LocalDriveError"]):
+        depo.ListFile({"q": "fullText contains 'x'"}).GetList()
+
+
+def test_yukleme_md5_ve_sayfalama(yerel):
+    _, depo = yerel
+    kok = _yukle(depo, {"title": "kok"})
+    dosya = _yukle(depo, {"title": "a.png", "mimeType": "image/png", "parents": [{"id": kok["id"]}]}, b"merhaba")
+    assert dosya["md5Checksum"] == hashlib.md5(b"merhaba").hexdigest()
+    assert dosya["alternateLink"].startswith("file://")
+    for i in range(4):
+        _yukle(depo, {"title": f"{i}.txt", "parents": [{"id": kok["id"]}]}, b"x")
+    sayfalar = list(depo.ListFile({"q": f"'{kok['id']}' in parents", "maxResults": 2}))
+    assert [len(s) for s in sayfalar] == [2, 2, 1]
+    assert depo.ListFile({"q": f"modifiedDate > '{dosya['modifiedDate']}'"}).GetList()
+
+
+def test_enjeksiyonsuz_blok_hata_enjeksiyonunu_atlar(crm, tmp_path):
+    ad_alani = crm(*ADLAR)
+    depo = ad_alani["LocalDrive"](str(tmp_path), gecikme_ms="0", hata_orani=1.0)
+    with depo.enjeksiyonsuz():
+        dosya = _yukle(depo, {"title": "a.txt"}, b"x")
+    with pytest.raises(ad_alani["LocalDriveError"]):
+        depo.CreateFile({"id": dosya["id"]}).FetchMetadata()
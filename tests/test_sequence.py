@@ -0,0 +1,21 @@
+import pandas as pd
+import pytest
+
+
+@pytest.fixture
+def depo(crm, tmp_path):
+    ad_alani = crm("NUMARA_SERISI_DOSYASI", "NUMARA_SERILERI", "_seri_numarasi", "SequenceStore")
+    return ad_alani["SequenceStore"](str(tmp_path / "seriler.json"))
+
+
+def test_migrate_yalnizca_seri_onekli_numaralari_sayar(depo):
+    mevcut = pd.Series(["PI20240312", 123.0, "PRF-0042", "prf-0007", None, "PRF-0099 "], dtype=object)
+    assert depo.migrate("proforma", mevcut) == 99
+    assert depo.allocate("proforma") == 100
+
+
+def test_observe_oneksiz_numarayi_yok_sayar(depo):
+    depo.migrate("teklif", [])
+    depo.observe("teklif", "X-999")
+    depo.observe("teklif", "TKF-0012")
+    assert depo.son["teklif"] == 12